@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from clients.cache import get_auth_user_key
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Аутентификация по JWT-токену с загрузкой пользователя вместе
+    с профилем одним запросом.
+
+    Найденный пользователь кэшируется на AUTH_USER_CACHE_TIMEOUT секунд,
+    поэтому запросы одного пользователя подряд не обращаются к БД.
+    Кэш сбрасывается сигналами при изменении или удалении пользователя
+    и профиля, а после QuerySet.update - явным вызовом
+    clients.cache.invalidate_auth_users.
+
+    Ключ кэша зависит только от идентификатора пользователя, без iat
+    или jti токена: токен проверяется до обращения к кэшу, а из его
+    полей берется только идентификатор, как и в JWTAuthentication.
+    Поэтому любой действительный токен пользователя получил бы того же
+    пользователя и без кэша, а отключение пользователя или смена
+    пароля сохраняют его и сбрасывают кэш сигналом.
+    """
+
+    def get_user(self, validated_token: Token) -> User:
+        """Метод получения пользователя по проверенному токену"""
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification')
+            )
+
+        cache_key = get_auth_user_key(user_id)
+        user = cache.get(cache_key)
+        if user is None:
+            try:
+                user = self.user_model.objects.select_related('profile') \
+                    .get(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'),
+                                           code='user_not_found')
+            cache.set(cache_key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'),
+                                       code='user_inactive')
+
+        return user
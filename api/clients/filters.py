@@ -1,13 +1,66 @@
+from typing import Optional
+
 from django.contrib.auth.models import User
 from django.db.models import QuerySet
-from django.db.models.functions import (
-    Sin, Cos, ATan2,
-    Abs, Sqrt, Power,
-    Radians,
-)
-from django.db.models import F
+from django.db.models import Q
+from django import forms
 from django_filters import rest_framework as filters
-from clients.models import Profile
+from clients import geo_engine
+from clients.models import (
+    FeedEntry,
+    Profile,
+)
+from clients.geo import (
+    bounding_boxes,
+    choose_covering_geohashes,
+    haversine_expression,
+)
+
+
+# Максимальное количество ближайших пользователей в одном запросе.
+MAX_NEAREST_USERS = 1000
+
+
+def filter_within_distance(queryset: QuerySet, profile: Profile,
+                           max_distance: float,
+                           gender: Optional[str] = None) -> QuerySet:
+    """
+    Функция отбора пользователей не дальше заданного расстояния.
+
+    Каждому пользователю добавляется поле distance_to_user с расстоянием
+    в километрах до владельца профиля. Используется фильтром списка
+    пользователей и заполнением лент рекомендаций.
+
+    :param queryset: Набор пользователей.
+    :param profile: Профиль, от которого считается расстояние.
+    :param max_distance: Максимальное расстояние в километрах.
+    :param gender:
+        Гендер, по которому уже отфильтрован набор. Позволяет поиску
+        в памяти процесса сразу отбросить профили другого гендера.
+    """
+
+    lat, lon = profile.latitude, profile.longitude
+
+    profile_ids = geo_engine.find_profiles_within(
+        lat, lon, float(max_distance), gender=gender,
+    )
+    if profile_ids is not None:
+        queryset = queryset.filter(profile__pk__in=profile_ids)
+    else:
+        queryset = UserFilter.filter_candidates(queryset, lat, lon,
+                                                float(max_distance))
+
+    # С помощью функций СУБД вычисляем для каждой
+    # записи расстояния до текущего пользователя.
+    return queryset.select_related('profile').annotate(
+        distance_to_user=haversine_expression(lat, lon, 'profile__'),
+    ).filter(distance_to_user__lte=max_distance)
+
+
+class IntegerFilter(filters.NumberFilter):
+    """Фильтр по целому числу"""
+
+    field_class = forms.IntegerField
 
 
 class UserFilter(filters.FilterSet):
@@ -21,13 +74,19 @@ class UserFilter(filters.FilterSet):
         label='Максимальная дистанция',
         method='filter_distance',
     )
+    nearest = IntegerFilter(
+        label='Количество ближайших пользователей',
+        method='filter_nearest',
+        min_value=1,
+        max_value=MAX_NEAREST_USERS,
+    )
 
     class Meta:
         """Класс настроект фильтра"""
 
         model = User
         fields = ('first_name', 'last_name',
-                  'gender', 'distance_to_user')
+                  'gender', 'distance_to_user', 'nearest')
 
     def filter_distance(self, queryset: QuerySet,
                         name: str, max_distance: int) -> QuerySet:
@@ -36,44 +95,114 @@ class UserFilter(filters.FilterSet):
 
         Каждому пользователю генерируем поле, обозначающее его
         расстояние до текущего пользователя в километрах.
+
+        Перед точным вычислением расстояния отсекаем пользователей,
+        не попадающих в прямоугольник координат вокруг текущего
+        пользователя. Это условие использует индекс по координатам,
+        поэтому тяжелая формула считается только для ближайших записей.
+        Если прямоугольник покрывается небольшим числом ячеек геохеша,
+        дополнительно отбираем пользователей по ячейкам с помощью
+        индексируемого условия IN.
+
+        Если включен поиск в памяти процесса (GEO_ENGINE = 'numpy'),
+        подходящие профили отбираются по снимку координат, а в СУБД
+        расстояние вычисляется только для них.
+        """
+
+        return filter_within_distance(
+            queryset, self.request.user.profile, max_distance,
+            gender=self.form.cleaned_data.get('gender') or None,
+        )
+
+    def filter_nearest(self, queryset: QuerySet,
+                       name: str, count: int) -> QuerySet:
+        """
+        Метод отбора заданного количества ближайших пользователей.
+
+        Текущий пользователь в результат не входит. Если задано
+        максимальное расстояние, ближайшие пользователи ищутся среди
+        находящихся не дальше него.
+
+        Если включен поиск в памяти процесса и установлен пакет scipy,
+        ближайшие профили находятся по k-d дереву точек единичной сферы.
+        Дерево не учитывает фильтры по имени и фамилии, поэтому с ними,
+        как и без поиска в памяти, ближайшие пользователи отбираются
+        сортировкой по расстоянию в СУБД.
+        """
+
+        profile = self.request.user.profile
+        lat, lon = profile.latitude, profile.longitude
+
+        # Расстояние нужно для сортировки и выдачи.
+        if 'distance_to_user' not in queryset.query.annotations:
+            queryset = queryset.select_related('profile').annotate(
+                distance_to_user=haversine_expression(lat, lon, 'profile__'),
+            )
+
+        profile_ids = None
+        data = self.form.cleaned_data
+        if not data.get('first_name') and not data.get('last_name'):
+            max_distance = data.get('distance_to_user')
+            profile_ids = geo_engine.find_nearest_profiles(
+                lat, lon, count,
+                gender=data.get('gender') or None,
+                exclude=profile.pk,
+                max_distance=None if max_distance is None
+                else float(max_distance),
+            )
+        if profile_ids is None:
+            profile_ids = list(
+                queryset.exclude(pk=self.request.user.pk)
+                .order_by('distance_to_user', 'pk')
+                .values_list('profile__pk', flat=True)[:count]
+            )
+
+        return queryset.filter(profile__pk__in=profile_ids)
+
+    @staticmethod
+    def filter_candidates(queryset: QuerySet, lat: float, lon: float,
+                          max_distance: float) -> QuerySet:
+        """
+        Метод предварительного отбора пользователей, которые могут
+        находиться не дальше заданного расстояния, по индексам.
         """
 
-        # Широта и долгота текущего пользователя.
-        lat = self.request.user.profile.latitude
-        lon = self.request.user.profile.longitude
-
-        # Радиус Земли.
-        EARTH_RADIUS = 6372
-
-        # С помощью функций СУБД вычисляем для каждой
-        # записи расстояния до текущего пользователя.
-        # Т.к. сферическая теорема косинусов имеет проблемы
-        # с маленькими расстояниями, было принято решение
-        # использовать формулу гаверсинусов с модификацией для антиподов.
-        # А еще я никогда столько страшных слов не слышал.
-        queryset = User.objects.select_related('profile').annotate(
-            distance_to_user=ATan2(
-                Sqrt(
-                    Power(
-                        Cos(Radians(F('profile__latitude'))) *
-                        Sin(Abs(Radians(lon) - Radians(F('profile__longitude')))), 2
-                    ) +
-                    Power(
-                        Cos(Radians(lat)) * Sin(Radians(F('profile__latitude'))) -
-                        Sin(Radians(lat)) * Cos(Radians(F('profile__latitude'))) *
-                        Cos(Abs(Radians(lon) - Radians(F('profile__longitude')))), 2
-                    )
-                )
-                ,
-                (
-                    Sin(Radians(lat)) * Sin(Radians(F('profile__latitude'))) +
-                    Cos(Radians(lat)) * Cos(Radians(F('profile__latitude'))) *
-                    Cos(Abs(
-                        Radians(lon) -
-                        Radians(F('profile__longitude'))
-                    ))
-                )
-            ) * EARTH_RADIUS
-        ).filter(distance_to_user__lte=max_distance)
+        # Предварительный фильтр по прямоугольникам координат.
+        boxes = bounding_boxes(lat, lon, max_distance)
+        if boxes is None:
+            return queryset
+
+        in_boxes = Q()
+        for lat_min, lat_max, lon_min, lon_max in boxes:
+            in_boxes |= Q(
+                profile__latitude__range=(lat_min, lat_max),
+                profile__longitude__range=(lon_min, lon_max),
+            )
+        if not in_boxes:
+            return queryset.none()
+        queryset = queryset.filter(in_boxes)
+
+        # Предварительный фильтр по ячейкам геохеша.
+        covering = choose_covering_geohashes(boxes)
+        if covering is not None:
+            precision, cells = covering
+            queryset = queryset.filter(**{
+                f'profile__geohash_{precision}__in': cells,
+            })
 
         return queryset
+
+
+class FeedFilter(filters.FilterSet):
+    """Фильтр для ленты рекомендаций"""
+
+    gender = filters.ChoiceFilter(
+        field_name='candidate__gender',
+        choices=Profile.Gender.choices,
+    )
+
+    class Meta:
+        """Класс настроек фильтра"""
+
+        model = FeedEntry
+        fields = ('gender', )
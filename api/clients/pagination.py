@@ -0,0 +1,236 @@
+import datetime
+import json
+from base64 import (
+    urlsafe_b64decode,
+    urlsafe_b64encode,
+)
+from collections import OrderedDict
+from typing import (
+    Any,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import coreapi
+import coreschema
+from django.core.exceptions import (
+    FieldError,
+    ValidationError,
+)
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import (
+    Model,
+    Q,
+    QuerySet,
+)
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    JSON-кодировщик значений ключей сортировки.
+
+    В отличие от DjangoJSONEncoder, сохраняет микросекунды,
+    иначе записи с близким временем пропускались бы между страницами.
+    """
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по ключам сортировки.
+
+    Вместо OFFSET каждая следующая страница отбирается условием
+    "ключ сортировки больше последнего ключа предыдущей страницы",
+    поэтому глубокие страницы стоят столько же, сколько первая.
+    Последним ключом сортировки всегда должен быть уникальный ключ.
+
+    Ключи сортировки берутся из метода get_keyset_ordering
+    контроллера. Если метода нет, записи сортируются по pk.
+    Ключ с префиксом '-' сортируется по убыванию.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    cursor_query_description = _('Значение курсора страницы.')
+    page_size_query_description = _('Количество записей на странице.')
+    invalid_cursor_message = _('Неверный курсор.')
+    default_ordering = ('pk', )
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request,
+                          view=None) -> Optional[List[Union[Model, dict]]]:
+        """Метод получения страницы записей"""
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        self.next_cursor = None
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position))
+
+        # Берем на одну запись больше, чтобы узнать,
+        # есть ли следующая страница.
+        page = list(queryset[:self.page_size + 1])
+        if len(page) > self.page_size:
+            page = page[:self.page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+
+        return page
+
+    def get_paginated_response(self, data: Any) -> Response:
+        """Метод формирования ответа со страницей записей"""
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_fields(self, view) -> List[coreapi.Field]:
+        return [
+            coreapi.Field(
+                name=self.cursor_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.String(
+                    title='Cursor',
+                    description=str(self.cursor_query_description),
+                ),
+            ),
+            coreapi.Field(
+                name=self.page_size_query_param,
+                required=False,
+                location='query',
+                schema=coreschema.Integer(
+                    title='Page size',
+                    description=str(self.page_size_query_description),
+                ),
+            ),
+        ]
+
+    def get_page_size(self, request: Request) -> int:
+        """Метод получения размера страницы из параметров запроса"""
+
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset: QuerySet, view=None) -> Tuple[str, ...]:
+        """Метод получения ключей сортировки"""
+
+        if view is not None and hasattr(view, 'get_keyset_ordering'):
+            return tuple(view.get_keyset_ordering(queryset))
+        return self.default_ordering
+
+    def get_next_link(self) -> Optional[str]:
+        """Метод получения ссылки на следующую страницу"""
+
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.next_cursor)
+
+    def get_position_filter(self, position: List[Any]) -> Q:
+        """
+        Метод построения условия отбора записей,
+        идущих после заданной позиции.
+
+        Для ключей (a, b) условие имеет вид
+        a > a0 OR (a = a0 AND b > b0).
+        """
+
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f'{name}__{lookup}': position[index]})
+            for prev_field, prev_value in zip(self.ordering[:index],
+                                              position[:index]):
+                term &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= term
+
+        return condition
+
+    def encode_cursor(self, instance: Union[Model, dict]) -> str:
+        """
+        Метод кодирования позиции записи в непрозрачный курсор.
+
+        Запись может быть как моделью, так и словарем из QuerySet.values().
+        """
+
+        names = [field.lstrip('-') for field in self.ordering]
+        if isinstance(instance, dict):
+            position = [instance[name] for name in names]
+        else:
+            position = [getattr(instance, name) for name in names]
+        data = json.dumps({'o': self.ordering, 'p': position},
+                          cls=CursorJSONEncoder)
+        return urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request: Request,
+                      queryset: QuerySet) -> Optional[List[Any]]:
+        """
+        Метод декодирования курсора из параметров запроса.
+
+        Значения ключей приводятся к python-типам
+        по полям модели или аннотациям запроса.
+        """
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            data = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            if tuple(data['o']) != self.ordering:
+                raise ValueError
+            position = [
+                queryset.query.resolve_ref(field.lstrip('-'))
+                .output_field.to_python(value)
+                for field, value in zip(self.ordering, data['p'])
+            ]
+            if len(position) != len(self.ordering):
+                raise ValueError
+            # Ключи сортировки не бывают пустыми, а сравнение с NULL
+            # в фильтре по курсору вызвало бы ошибку.
+            if any(value is None for value in position):
+                raise ValueError
+        except (TypeError, ValueError, KeyError,
+                FieldError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position
@@ -1,18 +1,30 @@
-from pathlib import Path
+from operator import itemgetter
+from typing import (
+    Iterable,
+    List,
+    Optional,
+)
 
 from rest_framework import serializers
-from rest_framework import validators
-from rest_framework_simplejwt.tokens import (
-    RefreshToken,
-    TokenError,
-)
+from rest_framework.request import Request
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import TokenError
+from django.conf import settings
+from django.contrib.auth.hashers import identify_hasher
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from django.core.files.storage import FileSystemStorage
+from django.db import (
+    IntegrityError,
+    transaction,
+)
+from django.db.models import QuerySet
+from django.utils.encoding import filepath_to_uri
 from django.utils.translation import gettext_lazy as _
 
+from clients.avatars import get_variant_name
 from clients.models import Profile
-from date_me_please.settings import BASE_DIR
-from clients.watermark import set_watermark
+from .tokens import CachedRefreshToken
 
 
 class LogoutSerializer(serializers.Serializer):
@@ -29,29 +41,87 @@ class LogoutSerializer(serializers.Serializer):
 
     def save(self, **kwargs):
         try:
-            RefreshToken(self.token).blacklist()
+            CachedRefreshToken(self.token).blacklist()
         except TokenError:
             self.fail('bad_token')
 
 
+class TokenRefreshSerializer(serializers.Serializer):
+    """
+    Сериализатор для обновления токенов.
+
+    В отличие от сериализатора simplejwt, проверяет черный список
+    рефреш-токенов через кэш.
+    """
+
+    refresh = serializers.CharField()
+    access = serializers.ReadOnlyField()
+
+    def validate(self, attrs):
+        refresh = CachedRefreshToken(attrs['refresh'])
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+
+            refresh.set_jti()
+            refresh.set_exp()
+            data['refresh'] = str(refresh)
+
+        return data
+
+
 class ProfileSerializer(serializers.ModelSerializer):
     """Сериализатор для модели профиля пользователя"""
 
+    avatar_variants = serializers.SerializerMethodField(
+        label=_('Миниатюры аватара'),
+    )
+
     class Meta:
         """Класс настроек сериализатора"""
 
         model = Profile
-        fields = ('avatar', 'gender', 'longitude', 'latitude')
+        fields = ('avatar', 'avatar_status', 'avatar_variants', 'gender',
+                  'longitude', 'latitude')
+        read_only_fields = ('avatar_status', )
+
+    def get_avatar_variants(self, profile: Profile) -> Optional[dict]:
+        """
+        Метод получения ссылок на миниатюры аватара.
+
+        Ссылки отдаются только для уже обработанных аватаров.
+        Ключами служат размеры миниатюр в пикселях.
+        """
+
+        if profile.avatar_status != Profile.AvatarStatus.READY:
+            return None
+
+        request = self.context.get('request', None)
+        variants = {}
+        for size in settings.AVATAR_VARIANT_SIZES:
+            url = profile.avatar.storage.url(
+                get_variant_name(profile.avatar.name, size)
+            )
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            variants[str(size)] = url
+
+        return variants
 
 
 class RegisterSerializer(serializers.ModelSerializer):
-    """Сериализатор для API регистрации"""
+    """
+    Сериализатор для API регистрации.
+
+    Уникальность имени и почты не проверяется отдельными запросами:
+    ее обеспечивают уникальные индексы, а нарушение индекса при
+    создании пользователя превращается в ошибку валидации.
+    """
 
     email = serializers.EmailField(
         required=True,
-        validators=[
-            validators.UniqueValidator(queryset=User.objects.all()),
-        ],
         label=_('Эл. почта'),
     )
     password = serializers.CharField(
@@ -81,6 +151,9 @@ class RegisterSerializer(serializers.ModelSerializer):
         model = User
         fields = ('username', 'password', 'confirm_password',
                   'email', 'first_name', 'last_name', 'profile')
+        extra_kwargs = {
+            'username': {'validators': [User.username_validator]},
+        }
 
     def validate(self, attrs: dict) -> dict:
         """Метод валидации данных"""
@@ -94,9 +167,12 @@ class RegisterSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data: dict) -> User:
-        """Метод записи данных в БД"""
+        """
+        Метод записи данных в БД.
+
+        Пользователь и профиль создаются в одной транзакции.
+        """
 
-        # Сначала создаем пользователя в БД.
         new_user = User(
             username=validated_data['username'],
             first_name=validated_data['first_name'],
@@ -104,31 +180,101 @@ class RegisterSerializer(serializers.ModelSerializer):
             email=validated_data['email'],
         )
         new_user.set_password(validated_data['password'])
-        new_user.save()
 
-        # Затем создаем и связываем профиль пользователя.
         profile_data = validated_data['profile']
         new_profile = Profile(
-            user=new_user,
             gender=profile_data['gender'],
             longitude=profile_data['longitude'],
             latitude=profile_data['latitude'],
         )
         # Если было загружено изображение для аватар, сохраняем его.
+        # Миниатюры с водяным знаком создаст фоновая команда process_avatars.
         if profile_data.get('avatar', None) is not None:
             new_profile.avatar = profile_data['avatar']
-        new_profile.save()
+            new_profile.avatar_status = Profile.AvatarStatus.PENDING
 
-        # Если пользователь загрузил аватарку, обработаем ее после сохранения.
-        if profile_data.get('avatar', None) is not None:
-            set_watermark(
-                str(BASE_DIR) + str(new_profile.avatar.url),
-                BASE_DIR / 'staticfiles/clients/img/watermark.png',
-                (0, 0),
-            )
+        try:
+            with transaction.atomic():
+                new_user.save()
+                new_profile.user = new_user
+                new_profile.save()
+        except IntegrityError:
+            errors = self.get_unique_errors(validated_data)
+            # Нарушение других ограничений - не ошибка пользователя.
+            if not errors:
+                raise
+            raise serializers.ValidationError(errors)
 
         return new_user
 
+    @staticmethod
+    def get_unique_errors(validated_data: dict) -> Optional[dict]:
+        """
+        Метод получения ошибок уникальности после нарушения индекса.
+
+        Выполняет запрос к БД только в случае ошибки.
+
+        :return: ошибки или None, если имя и почта свободны
+        """
+
+        if User.objects.filter(username=validated_data['username']).exists():
+            return {'username': [
+                _('Пользователь с таким именем уже существует.'),
+            ]}
+        email = validated_data['email']
+        if email and User.objects.filter(email__iexact=email).exists():
+            return {'email': [
+                _('Пользователь с такой почтой уже существует.'),
+            ]}
+        return None
+
+
+class ImportUserSerializer(RegisterSerializer):
+    """
+    Сериализатор строки импорта пользователей.
+
+    Проверяет данные так же, как сериализатор регистрации.
+    Уникальность имен и почт команда import_users проверяет сразу
+    для пачки строк. Вместо пароля можно передать готовый хэш
+    пароля в формате Django.
+    """
+
+    password = serializers.CharField(
+        write_only=True,
+        required=False,
+        validators=[validate_password],
+        label=_('Пароль'),
+    )
+    password_hash = serializers.CharField(
+        write_only=True,
+        required=False,
+        label=_('Хэш пароля'),
+    )
+    confirm_password = None
+
+    class Meta(RegisterSerializer.Meta):
+        """Класс настроек сериализатора"""
+
+        fields = ('username', 'password', 'password_hash',
+                  'email', 'first_name', 'last_name', 'profile')
+
+    def validate(self, attrs: dict) -> dict:
+        """Метод валидации данных"""
+
+        if ('password' in attrs) == ('password_hash' in attrs):
+            raise serializers.ValidationError({
+                'password': 'Нужно передать либо пароль, либо его хэш.'
+            })
+        if 'password_hash' in attrs:
+            try:
+                identify_hasher(attrs['password_hash'])
+            except ValueError:
+                raise serializers.ValidationError({
+                    'password_hash': 'Неизвестный формат хэша пароля.'
+                })
+
+        return attrs
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для пользовательских данных"""
@@ -143,3 +289,131 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('pk', 'username', 'first_name',
                   'last_name', 'email', 'profile',
                   'distance_to_user')
+
+
+class UserRowSerializer:
+    """
+    Быстрый сериализатор списков пользователей.
+
+    Колонки пользователя и профиля читаются одним запросом через
+    QuerySet.values(), а словари собираются без полей DRF. Результат
+    совпадает с результатом UserSerializer вплоть до порядка ключей,
+    поэтому ответы списков не меняются.
+    """
+
+    user_fields = ('pk', 'username', 'first_name', 'last_name', 'email')
+    profile_fields = ('id', 'avatar', 'avatar_status', 'gender',
+                      'longitude', 'latitude')
+
+    def __init__(self, prefix: str = '',
+                 request: Optional[Request] = None) -> None:
+        """
+        Инициализатор класса.
+
+        :param prefix:
+            Путь до пользователя от модели набора записей,
+            например 'lover__user__' для оценок.
+        :param request:
+            Запрос для построения абсолютных ссылок на аватары.
+            Без него ссылки относительные, как у UserSerializer без контекста.
+        """
+
+        self.prefix = prefix
+        self.request = request
+        self.storage = Profile._meta.get_field('avatar').storage
+        # Для локального хранилища ссылка собирается без urljoin,
+        # который занимает большую часть времени сериализации.
+        # Хранилище по умолчанию - ленивый объект, поэтому его
+        # класс проверяется через __class__.
+        self.base_url = self.storage.base_url \
+            if self.storage.__class__ is FileSystemStorage else None
+        self.variant_sizes = [(str(size), size)
+                              for size in settings.AVATAR_VARIANT_SIZES]
+        self.user_columns = [f'{prefix}{name}' for name in self.user_fields]
+        self.profile_columns = [f'{prefix}profile__{name}'
+                                for name in self.profile_fields]
+        self.get_user = itemgetter(*self.user_columns)
+        self.get_profile = itemgetter(*self.profile_columns)
+
+    def get_values(self, queryset: QuerySet, *extra: str) -> QuerySet:
+        """
+        Метод получения набора словарей с нужными колонками.
+
+        :param queryset: Набор записей после фильтрации.
+        :param extra: Дополнительные колонки, например ключи пагинации.
+        """
+
+        columns = [*self.user_columns, *self.profile_columns, *extra]
+        if 'distance_to_user' in queryset.query.annotations:
+            columns.append('distance_to_user')
+        return queryset.values(*dict.fromkeys(columns))
+
+    def to_representation(self, row: dict) -> dict:
+        """Метод преобразования строки набора словарей в данные ответа"""
+
+        pk, username, first_name, last_name, email = self.get_user(row)
+        profile_id, avatar, avatar_status, gender, longitude, latitude = \
+            self.get_profile(row)
+
+        profile = None
+        if profile_id is not None:
+            profile = {
+                'avatar': self.get_url(avatar) if avatar else None,
+                'avatar_status': avatar_status,
+                'avatar_variants': self.get_avatar_variants(avatar)
+                if avatar_status == Profile.AvatarStatus.READY else None,
+                'gender': gender,
+                'longitude': float(longitude),
+                'latitude': float(latitude),
+            }
+
+        data = {
+            'pk': pk,
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': email,
+            'profile': profile,
+        }
+        if 'distance_to_user' in row:
+            distance = row['distance_to_user']
+            data['distance_to_user'] = float(distance) \
+                if distance is not None else None
+
+        return data
+
+    def serialize(self, rows: Iterable[dict]) -> List[dict]:
+        """Метод преобразования строк набора словарей в список данных"""
+
+        return [self.to_representation(row) for row in rows]
+
+    def get_url(self, name: str) -> str:
+        """Метод получения ссылки на файл в хранилище аватаров"""
+
+        path = filepath_to_uri(name).lstrip('/')
+        # urljoin нормализует сегменты '.' и '..', такие пути
+        # отдаются хранилищу, чтобы ссылки не отличались.
+        if self.base_url is not None and '/.' not in f'/{path}':
+            url = self.base_url + path
+        else:
+            url = self.storage.url(name)
+        if self.request is not None:
+            url = self.request.build_absolute_uri(url)
+        return url
+
+    def get_avatar_variants(self, avatar: str) -> dict:
+        """Метод получения ссылок на миниатюры аватара"""
+
+        return {key: self.get_url(get_variant_name(avatar, size))
+                for key, size in self.variant_sizes}
+
+
+class BatchLikeSerializer(serializers.Serializer):
+    """Сериализатор для пакетной оценки пользователей"""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+        label=_('Оцениваемые пользователи'),
+    )
@@ -0,0 +1,43 @@
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+)
+
+from django.db.models import QuerySet
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def stream_json_list(queryset: QuerySet,
+                     serialize: Callable[[Any], Any],
+                     chunk_size: int = 500) -> Iterator[bytes]:
+    """
+    Генератор JSON-массива сериализованных записей.
+
+    Записи читаются из БД пачками через QuerySet.iterator, а JSON
+    отдается по частям после каждой пачки, поэтому потребление памяти
+    не зависит от количества записей.
+
+    :param queryset: Набор записей для сериализации.
+    :param serialize: Функция сериализации одной записи.
+    :param chunk_size: Количество записей, читаемых из БД за раз.
+    :return: Части JSON-документа в кодировке UTF-8.
+    """
+
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    yield b'['
+    chunk = []
+    # Перед каждой пачкой, кроме первой, нужна запятая.
+    separator = ''
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(encoder.encode(serialize(instance)))
+        if len(chunk) >= chunk_size:
+            yield (separator + ','.join(chunk)).encode('utf-8')
+            chunk = []
+            separator = ','
+
+    if chunk:
+        yield (separator + ','.join(chunk)).encode('utf-8')
+    yield b']'
+
@@ -1,6 +1,14 @@
+import gzip
+import json
+import os
 import random
+import tempfile
+from base64 import urlsafe_b64encode
+from io import StringIO
 from typing import List
+from urllib.parse import urlparse
 
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.test import (
     APITestCase,
@@ -8,12 +16,43 @@ from rest_framework.test import (
     force_authenticate,
 )
 from rest_framework import status
+from rest_framework_simplejwt.tokens import (
+    AccessToken,
+    RefreshToken,
+)
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import (
+    IntegrityError,
+    connection,
+    transaction,
+)
+from django.db.models import F
+from django.http import QueryDict
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from unittest import (
+    mock,
+    skipIf,
+)
 
 from api.clients import views
 from api.clients import serializers
-from clients.models import Profile
+from clients import compression
+from clients import geo_engine
+from clients.geo import haversine_expression
+from clients import metrics
+from clients.models import (
+    FeedEntry,
+    Like,
+    Profile,
+    MatchNotification,
+)
+from clients.testing import make_test_image
 
 
 class ClientTests(APITestCase):
@@ -96,6 +135,139 @@ class ClientTests(APITestCase):
         self.assertEqual(User.objects.filter(username=username)
                          .first().username, username)
 
+    def test_user_registration_unique(self) -> None:
+        """Тест регистрации с занятыми именем и почтой"""
+
+        url = reverse('api_registration')
+        data = {
+            'username': 'unique_user',
+            'password': 'my_VERY_safe_pass_1',
+            'confirm_password': 'my_VERY_safe_pass_1',
+            'email': 'unique_user@user.com',
+            'first_name': 'unique',
+            'last_name': 'user',
+            'profile': {
+                'gender': 'F',
+                'longitude': 10,
+                'latitude': 10,
+            },
+        }
+
+        # Регистрация не проверяет уникальность отдельными
+        # запросами: пользователь и профиль создаются в транзакции,
+        # а лента пользователя ставится в очередь на пополнение.
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [query['sql'].split()[0] for query in context.captured_queries
+             if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))],
+            ['INSERT', 'INSERT', 'INSERT'],
+        )
+
+        response = self.client.post(url, dict(
+            data, email='UNIQUE_USER@user.com', username='other_user',
+        ), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+
+        response = self.client.post(url, dict(
+            data, email='other_user@user.com',
+        ), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('username', response.data)
+        self.assertFalse(User.objects.filter(
+            email='other_user@user.com',
+        ).exists())
+
+        # Нарушение другого ограничения не выдается за занятую почту.
+        with mock.patch.object(Profile, 'save',
+                               side_effect=IntegrityError), \
+                self.assertRaises(IntegrityError):
+            self.client.post(url, dict(
+                data, email='free_user@user.com', username='free_user',
+            ), format='json')
+
+    def test_user_registration_with_avatar(self) -> None:
+        """Тест регистрации пользователя с аватаром"""
+
+        url = reverse('api_registration')
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(url, {
+                'username': 'avatar_user',
+                'password': 'my_VERY_safe_pass_1',
+                'confirm_password': 'my_VERY_safe_pass_1',
+                'email': 'avatar_user@user.com',
+                'first_name': 'avatar',
+                'last_name': 'user',
+                'profile.gender': 'F',
+                'profile.longitude': 10,
+                'profile.latitude': 10,
+                'profile.avatar': make_test_image(),
+            }, format='multipart')
+
+        # Аватар не обрабатывается в запросе, а ждет фоновой обработки.
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['profile']['avatar_status'],
+                         Profile.AvatarStatus.PENDING)
+        self.assertEqual(Profile.objects.get(user__username='avatar_user')
+                         .avatar_status, Profile.AvatarStatus.PENDING)
+
+    def test_user_avatar_variants(self) -> None:
+        """Тест ссылок на миниатюры аватара"""
+
+        profile = self.users[0].profile
+        profile.avatar = 'user_avatars/photo.png'
+        profile.avatar_status = Profile.AvatarStatus.READY
+        profile.save()
+
+        data = serializers.ProfileSerializer(profile).data
+
+        self.assertEqual(data['avatar_variants']['64'],
+                         '/media/user_avatars/variants/photo.png_64.webp')
+        self.assertEqual(len(data['avatar_variants']), 3)
+
+        # Миниатюры файлов с одним именем и разными
+        # расширениями не перезаписывают друг друга.
+        profile.avatar = 'user_avatars/photo.jpg'
+        self.assertNotEqual(
+            serializers.ProfileSerializer(profile).data['avatar_variants'],
+            data['avatar_variants'],
+        )
+
+    def test_user_row_serializer(self) -> None:
+        """Тест совпадения быстрого сериализатора с UserSerializer"""
+
+        ready, pending = self.users[0].profile, self.users[1].profile
+        ready.avatar = 'user_avatars/photo.png'
+        ready.avatar_status = Profile.AvatarStatus.READY
+        ready.save()
+        pending.avatar = 'user_avatars/new.png'
+        pending.save()
+        User.objects.create(username='without_profile')
+
+        queryset = User.objects.select_related('profile').order_by('pk')
+        annotated = queryset.annotate(
+            distance_to_user=haversine_expression(10, 20, 'profile__'),
+        )
+        request = self.factory.get('/')
+        renderer = JSONRenderer()
+        for users, context in ((queryset, {}), (annotated, {}),
+                               (annotated, {'request': request})):
+            with self.subTest(context=context):
+                expected = serializers.UserSerializer(
+                    users, many=True, context=context,
+                ).data
+                row_serializer = serializers.UserRowSerializer(
+                    request=context.get('request'),
+                )
+                rows = row_serializer.serialize(
+                    row_serializer.get_values(users),
+                )
+                self.assertEqual(renderer.render(rows),
+                                 renderer.render(expected))
+
     def test_user_detail_view(self) -> None:
         """Тест получения информации о пользователе"""
 
@@ -126,9 +298,560 @@ class ClientTests(APITestCase):
 
         response = view(request)
 
-        users = serializers.UserSerializer(response.data, many=True)
+        users = serializers.UserSerializer(User.objects.order_by('pk'),
+                                           many=True)
+
+        self.assertEqual(users.data, response.data['results'])
+
+    def test_user_list_pagination(self) -> None:
+        """Тест постраничного получения списка пользователей"""
+
+        current_user = self.users[0]
+        for user in self.users:
+            user.profile.latitude = 0
+            user.profile.longitude = user.pk % 3
+            user.profile.save()
+        current_user.profile.refresh_from_db()
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        # Проходим по всем страницам, используя курсор из ссылки next.
+        params = {'distance_to_user': 1000, 'page_size': 2}
+        distances = []
+        found_pks = []
+        while True:
+            request = self.factory.get(url, params)
+            force_authenticate(request, current_user)
+            response = view(request)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            for user in response.data['results']:
+                distances.append(user['distance_to_user'])
+                found_pks.append(user['pk'])
+
+            if response.data['next'] is None:
+                break
+            params['cursor'] = QueryDict(urlparse(response.data['next'])
+                                         .query)['cursor']
+
+        self.assertEqual(sorted(found_pks),
+                         sorted(user.pk for user in self.users))
+        self.assertEqual(distances, sorted(distances))
+
+    def test_user_list_cache(self) -> None:
+        """Тест кэширования списка пользователей и сброса кэша"""
+
+        current_user = User.objects.select_related('profile') \
+            .get(pk=self.users[0].pk)
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        def get_user_list() -> Response:
+            request = self.factory.get(url, {'distance_to_user': 50000})
+            force_authenticate(request, current_user)
+            return view(request)
+
+        first_response = get_user_list()
+
+        # Повторный запрос с теми же параметрами не обращается к БД.
+        with self.assertNumQueries(0):
+            second_response = get_user_list()
+        self.assertEqual(first_response.data, second_response.data)
+
+        # Изменение профиля сбрасывает кэш.
+        changed_user = self.users[1]
+        changed_user.first_name = 'changed'
+        changed_user.save()
+        third_response = get_user_list()
+
+        changed_data = next(user for user in third_response.data['results']
+                            if user['pk'] == changed_user.pk)
+        self.assertEqual(changed_data['first_name'], 'changed')
+
+    def test_user_list_cache_regions(self) -> None:
+        """Тест сброса кэша списка с фильтром только по его регионам"""
+
+        current_user, near_user, far_user = self.users[:3]
+        for user, (latitude, longitude) in (
+            (current_user, (55.75, 37.62)),
+            (near_user, (55.76, 37.63)),
+            (far_user, (-33.87, 151.21)),
+        ):
+            user.profile.latitude, user.profile.longitude = latitude, longitude
+            user.profile.save()
+        current_user = User.objects.select_related('profile') \
+            .get(pk=current_user.pk)
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        def get_user_list() -> Response:
+            request = self.factory.get(url, {'distance_to_user': 50})
+            force_authenticate(request, current_user)
+            return view(request)
+
+        def get_pks(response: Response) -> List[int]:
+            return [user['pk'] for user in response.data['results']]
 
-        self.assertEqual(users.data, response.data)
+        self.assertIn(near_user.pk, get_pks(get_user_list()))
+
+        # Изменения в другом регионе и изменения полей,
+        # которых нет в списке, не сбрасывают кэш.
+        far_user.first_name = 'changed'
+        far_user.save()
+        near_user.set_password('new_VERY_safe_pass')
+        near_user.save(update_fields=['password'])
+        with self.assertNumQueries(0):
+            get_user_list()
+
+        # Изменение пользователя в регионе списка сбрасывает кэш.
+        near_user.first_name = 'changed'
+        near_user.save()
+        response = get_user_list()
+        self.assertEqual(next(user for user in response.data['results']
+                              if user['pk'] == near_user.pk)['first_name'],
+                         'changed')
+
+        # Пользователь, переместившийся в другой регион, пропадает из списка.
+        profile = Profile.objects.get(user=near_user)
+        profile.latitude, profile.longitude = -33.87, 151.21
+        profile.save(update_fields=['latitude', 'longitude'])
+        self.assertNotIn(near_user.pk, get_pks(get_user_list()))
+
+        # Изменения в обход сигналов сбрасывают кэш вручную.
+        Profile.objects.filter(user=far_user).update(latitude=55.75,
+                                                     longitude=37.62)
+        call_command('backfill_geohash', all=True, stdout=StringIO())
+        self.assertIn(far_user.pk, get_pks(get_user_list()))
+
+    def test_user_list_streaming(self) -> None:
+        """Тест потоковой выдачи списка пользователей"""
+
+        current_user = self.users[0]
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        request = self.factory.get(url, {'stream': 'true'})
+        force_authenticate(request, current_user)
+
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        users = serializers.UserSerializer(User.objects.order_by('pk'),
+                                           many=True)
+        self.assertEqual(data, json.loads(json.dumps(users.data)))
+
+    @override_settings(USER_LIST_STREAMING_ENABLED=False)
+    def test_user_list_streaming_disabled(self) -> None:
+        """Тест запроса потоковой выдачи, когда она отключена"""
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        request = self.factory.get(url, {'stream': 'true'})
+        force_authenticate(request, self.users[0])
+
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.streaming)
+
+    def test_user_list_invalid_cursor(self) -> None:
+        """Тест получения списка пользователей с неверным курсором"""
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        null_cursor = urlsafe_b64encode(json.dumps({
+            'o': ['pk'], 'p': [None],
+        }).encode('utf-8')).decode('ascii')
+
+        for cursor in ('not-a-cursor', null_cursor):
+            request = self.factory.get(url, {'cursor': cursor})
+            force_authenticate(request, self.users[0])
+
+            response = view(request)
+
+            self.assertEqual(response.status_code,
+                             status.HTTP_404_NOT_FOUND)
+
+    def test_user_list_distance_filter(self) -> None:
+        """Тест фильтрации списка пользователей по расстоянию"""
+
+        current_user = self.users[0]
+        current_user.profile.latitude = 0
+        current_user.profile.longitude = 179.9
+        current_user.profile.save()
+        current_user.profile.refresh_from_db()
+
+        # Ближайший пользователь находится по другую сторону
+        # линии смены дат, дальний - на другом конце планеты.
+        near_user, far_user = self.users[1], self.users[2]
+        near_user.profile.latitude = 0
+        near_user.profile.longitude = -179.9
+        near_user.profile.save()
+        far_user.profile.latitude = 0
+        far_user.profile.longitude = 0
+        far_user.profile.save()
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        request = self.factory.get(url, {'distance_to_user': 100})
+        force_authenticate(request, current_user)
+
+        response = view(request)
+
+        found_pks = {user['pk'] for user in response.data['results']}
+        self.assertIn(current_user.pk, found_pks)
+        self.assertIn(near_user.pk, found_pks)
+        self.assertNotIn(far_user.pk, found_pks)
+
+    @skipIf(geo_engine.snapshot is None, 'numpy не установлен')
+    def test_user_list_distance_filter_numpy_engine(self) -> None:
+        """Тест совпадения поиска по расстоянию в памяти и в СУБД"""
+
+        # Прямоугольники координат в СУБД не учитывают
+        # широты за пределами [-90, 90].
+        for profile in Profile.objects.all():
+            profile.latitude = random.uniform(-90, 90)
+            profile.save()
+        current_user = User.objects.select_related('profile') \
+            .get(pk=self.users[0].pk)
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        def get_user_list(distance: int) -> list:
+            cache.clear()
+            request = self.factory.get(url, {'distance_to_user': distance,
+                                             'page_size': 100})
+            force_authenticate(request, current_user)
+            return view(request).data['results']
+
+        geo_engine.snapshot.load()
+        for distance in (1000, 5000, 10000, 20000):
+            with self.subTest(distance=distance):
+                expected = get_user_list(distance)
+                with override_settings(GEO_ENGINE='numpy'):
+                    self.assertEqual(get_user_list(distance), expected)
+
+    def test_user_list_nearest(self) -> None:
+        """Тест получения ближайших пользователей"""
+
+        current_user = self.users[0]
+        for i, profile in enumerate(Profile.objects.order_by('pk')):
+            profile.latitude = 0
+            profile.longitude = 179 + i * 0.6
+            if profile.longitude > 180:
+                profile.longitude -= 360
+            profile.gender = 'M' if i % 2 else 'F'
+            profile.save()
+        current_user = User.objects.select_related('profile') \
+            .get(pk=current_user.pk)
+        pks = [user.pk for user in self.users]
+
+        url = reverse('api_user_list')
+        view = views.UserListView.as_view()
+
+        def get_nearest(**params) -> list:
+            cache.clear()
+            request = self.factory.get(url, params)
+            force_authenticate(request, current_user)
+            return view(request).data['results']
+
+        engines = ['sql']
+        if geo_engine.snapshot is not None \
+                and geo_engine.cKDTree is not None:
+            engines.append('numpy')
+        for engine in engines:
+            with self.subTest(engine=engine), \
+                    override_settings(GEO_ENGINE=engine):
+                if engine == 'numpy':
+                    geo_engine.snapshot.load()
+
+                results = get_nearest(nearest=2)
+                self.assertEqual([user['pk'] for user in results], pks[1:3])
+                self.assertAlmostEqual(results[0]['distance_to_user'],
+                                       66.7, places=1)
+
+                results = get_nearest(nearest=2, gender='M')
+                self.assertEqual([user['pk'] for user in results],
+                                 [pks[1], pks[3]])
+
+                results = get_nearest(nearest=3, distance_to_user=100)
+                self.assertEqual([user['pk'] for user in results], [pks[1]])
+
+    def test_token_refresh_blacklist(self) -> None:
+        """Тест отклонения рефреш-токена после его обновления"""
+
+        refresh = str(RefreshToken.for_user(self.users[0]))
+        url = reverse('token_refresh')
+
+        response = self.client.post(url, {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('refresh', response.data)
+
+        # Токен из черного списка отклоняется без обращения к БД.
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'refresh': refresh})
+        self.assertEqual(response.status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+        # Если кэш очищен, черный список проверяется по БД.
+        cache.clear()
+        response = self.client.post(url, {'refresh': refresh})
+        self.assertEqual(response.status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_jwt_authentication_query_count(self) -> None:
+        """Тест кэширования пользователя, найденного по JWT-токену"""
+
+        user = self.users[0]
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}',
+        )
+        url = reverse('api_lovers')
+
+        # Пользователь загружается вместе с профилем одним запросом.
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Повторный запрос берет пользователя из кэша.
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        # Изменение профиля сбрасывает кэш.
+        user.profile.save()
+        with self.assertNumQueries(2):
+            self.client.get(url)
+
+        # Отключенный пользователь сразу теряет доступ
+        # по уже выданному токену.
+        user.is_active = False
+        user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metrics_middleware(self) -> None:
+        """Тест сбора метрик запросов и их вывода"""
+
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        user = self.users[0]
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}',
+        )
+
+        with override_settings(MIDDLEWARE=[
+            'clients.metrics.MetricsMiddleware', *settings.MIDDLEWARE,
+        ]):
+            self.client.get(reverse('api_lovers'))
+            self.client.get(reverse('api_lovers'))
+            self.client.get('/api/no-such-page/')
+            response = self.client.get(reverse('api_user_list'),
+                                       {'stream': 'true'})
+
+        # Потоковый ответ учитывается только после чтения, вместе
+        # с запросами к БД, выполненными во время чтения.
+        stream_labels = 'route="api/list/",method="GET"'
+        self.assertNotIn(f'http_request_duration_seconds_count'
+                         f'{{{stream_labels}}} 1',
+                         metrics.registry.render().splitlines())
+        with CaptureQueriesContext(connection) as context:
+            b''.join(response.streaming_content)
+        response.close()
+
+        request = self.factory.get('/api/metrics/')
+        with override_settings(METRICS_TOKEN='secret'):
+            response = metrics.metrics_view(request)
+            self.assertEqual(response.status_code,
+                             status.HTTP_401_UNAUTHORIZED)
+
+            request = self.factory.get('/api/metrics/',
+                                       HTTP_AUTHORIZATION='Bearer secret')
+            response = metrics.metrics_view(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Пользователь загружается из БД только при первом запросе,
+        # дальше берется из кэша: всего три запроса к БД.
+        labels = 'route="api/clients/me/lovers/",method="GET"'
+        lines = response.content.decode().splitlines()
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 2',
+                      lines)
+        self.assertIn(f'http_responses_total{{{labels},status="200"}} 2',
+                      lines)
+        self.assertIn(f'db_queries_per_request_sum{{{labels}}} 3.0', lines)
+        self.assertIn(f'db_queries_per_request_bucket{{{labels},le="1"}} 1',
+                      lines)
+        self.assertIn('http_responses_total{route="<unmatched>",'
+                      'method="GET",status="404"} 1', lines)
+        self.assertIn(f'http_request_duration_seconds_count'
+                      f'{{{stream_labels}}} 1', lines)
+        self.assertIn(f'db_queries_per_request_sum{{{stream_labels}}} '
+                      f'{float(len(context))}', lines)
+
+    def test_profiling_middleware(self) -> None:
+        """Тест профилирования запросов сотрудников и сводки профилей"""
+
+        staff_user, other_user = self.users[0], self.users[1]
+        staff_user.is_staff = True
+        staff_user.save()
+        url = reverse('api_user_list')
+
+        def get_profiled(user: User, **extra) -> None:
+            self.client.credentials(
+                HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}',
+            )
+            response = self.client.get(url, {'distance_to_user': 100},
+                                       **extra)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with tempfile.TemporaryDirectory() as profiling_dir, \
+                override_settings(PROFILING_DIR=profiling_dir, MIDDLEWARE=[
+                    *settings.MIDDLEWARE,
+                    'clients.profiling.ProfilingMiddleware',
+                ]):
+            # Запрос не сотрудника и анонимный запрос не профилируются.
+            with mock.patch('cProfile.Profile') as profile:
+                get_profiled(other_user, HTTP_X_PROFILE='1')
+                self.client.credentials()
+                self.client.get(url, HTTP_X_PROFILE='1')
+            profile.assert_not_called()
+            self.assertEqual(os.listdir(profiling_dir), [])
+
+            get_profiled(staff_user, HTTP_X_PROFILE='1')
+            names = sorted(os.listdir(profiling_dir))
+            self.assertEqual([os.path.splitext(name)[1] for name in names],
+                             ['.json', '.prof'])
+            with open(os.path.join(profiling_dir, names[0])) as file:
+                info = json.load(file)
+            self.assertEqual(info['route'], 'api/list/')
+            self.assertEqual(info['trigger'], 'request')
+            self.assertEqual(info['user_id'], staff_user.pk)
+            self.assertTrue(any(query.get('explain')
+                                for query in info['queries']))
+            self.assertFalse(any('params' in query
+                                 for query in info['queries']))
+
+            with override_settings(PROFILING_SAMPLE_RATE=1):
+                get_profiled(other_user)
+            self.assertEqual(len(os.listdir(profiling_dir)), 4)
+
+            output = StringIO()
+            call_command('summarize_profiles', stdout=output)
+        output = output.getvalue()
+        self.assertIn('GET api/list/', output)
+        self.assertIn('Профилей: 2', output)
+        self.assertIn('Самые долгие запросы к БД:', output)
+
+    def test_conditional_get(self) -> None:
+        """Тест ответов 304 по ETag для пользователя и списка"""
+
+        current_user, other_user = self.users[0], self.users[1]
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(current_user)}',
+        )
+
+        for url in (reverse('api_user_detail', args=(other_user.pk, )),
+                    reverse('api_user_list')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                etag = response['ETag']
+
+                # Проверка ETag не затрагивает сериализатор: для списка
+                # нет ни одного запроса к БД, для пользователя - один.
+                with self.assertNumQueries(0 if 'list' in url else 1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code,
+                                 status.HTTP_304_NOT_MODIFIED)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+                # Изменение пользователя меняет ETag.
+                other_user.first_name = f'changed {url}'
+                other_user.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotEqual(response['ETag'], etag)
+
+        # ETag списка зависит только от данных, поэтому не меняется
+        # при потере кэша (например, в другом процессе), но меняется
+        # при изменении профиля без сигналов.
+        url = reverse('api_user_list')
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+        Profile.objects.filter(user=other_user) \
+            .update(version=F('version') + 1)
+        cache.clear()
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+        # Изменение профиля тоже меняет ETag пользователя.
+        url = reverse('api_user_detail', args=(other_user.pk, ))
+        etag = self.client.get(url)['ETag']
+        other_user.profile.gender = 'F' if other_user.profile.gender == 'M' \
+            else 'M'
+        other_user.profile.save(update_fields=['gender'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['profile']['gender'],
+                         other_user.profile.gender)
+
+    def test_response_compression(self) -> None:
+        """Тест сжатия списка пользователей"""
+
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.users[0])}',
+        )
+        url = reverse('api_user_list')
+        expected = self.client.get(url).content
+
+        encodings = {'gzip': gzip.decompress}
+        if compression.brotli is not None:
+            encodings['br'] = compression.brotli.decompress
+        for encoding, decompress in encodings.items():
+            with self.subTest(encoding=encoding):
+                response = self.client.get(
+                    url, HTTP_ACCEPT_ENCODING=f'{encoding}, deflate',
+                )
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertEqual(decompress(response.content), expected)
+                self.assertTrue(response['ETag'].startswith('W/'))
+
+                # Слабый ETag сжатого ответа тоже подходит для 304.
+                response = self.client.get(
+                    url, HTTP_ACCEPT_ENCODING=encoding,
+                    HTTP_IF_NONE_MATCH=response['ETag'],
+                )
+                self.assertEqual(response.status_code,
+                                 status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(
+            url, {'stream': 'true'}, HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)),
+                         self.client.get(url, {'stream': 'true'})
+                         .getvalue())
+
+        # Ответы с токенами не сжимаются из-за атаки BREACH.
+        self.client.credentials()
+        self.users[0].set_password('my_VERY_safe_pass_0')
+        self.users[0].save()
+        response = self.client.post(reverse('token_obtain_pair'), {
+            'username': self.users[0].username,
+            'password': 'my_VERY_safe_pass_0',
+        }, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Content-Encoding'))
 
     def test_lover_list_view(self) -> None:
         """Тест получения списка влюбленных"""
@@ -143,9 +866,147 @@ class ClientTests(APITestCase):
 
         response = view(request)
 
-        users = serializers.UserSerializer(response.data, many=True)
+        users = serializers.UserSerializer(response.data['results'],
+                                           many=True)
+
+        self.assertEqual(users.data, response.data['results'])
+
+    def test_lover_list_order_and_pagination(self) -> None:
+        """Тест постраничного получения влюбленных от новых к старым"""
+
+        current_user = self.users[0]
+        lovers = list(self.users[1:])
+        self.__generate_likes(current_user, lovers)
+
+        url = reverse('api_lovers')
+        view = views.LoverListView.as_view()
+
+        params = {'page_size': 3}
+        found_pks = []
+        while True:
+            request = self.factory.get(url, params)
+            force_authenticate(request, current_user)
+            response = view(request)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            found_pks += [user['pk'] for user in response.data['results']]
+            if response.data['next'] is None:
+                break
+            params['cursor'] = QueryDict(urlparse(response.data['next'])
+                                         .query)['cursor']
+
+        # Оценки созданы в порядке следования пользователей.
+        self.assertEqual(found_pks, [lover.pk for lover in reversed(lovers)])
+
+    def test_lover_list_query_count(self) -> None:
+        """Тест независимости количества запросов от числа влюбленных"""
+
+        current_user = self.users[0]
+        User.objects.bulk_create([User(username=f'lover_{i}')
+                                  for i in range(30)])
+        lovers = User.objects.filter(username__startswith='lover_')
+        Profile.objects.bulk_create([
+            Profile(user=lover, gender='F', latitude=0, longitude=0)
+            for lover in lovers
+        ])
+        self.__generate_likes(current_user, lovers)
+
+        url = reverse('api_lovers')
+        view = views.LoverListView.as_view()
+
+        request = self.factory.get(url, {'page_size': 100})
+        force_authenticate(request, current_user)
+
+        with self.assertNumQueries(1):
+            response = view(request)
+            response.render()
 
-        self.assertEqual(users.data, response.data)
+        self.assertEqual(len(response.data['results']), 30)
+
+    def test_feed(self) -> None:
+        """Тест ленты рекомендаций"""
+
+        current_user = self.users[0]
+        # Пользователи по порядку удаляются от текущего на ~11 км,
+        # последний находится дальше максимального расстояния.
+        for i, user in enumerate(self.users):
+            user.profile.latitude = 0
+            user.profile.longitude = 0.1 * i if i < 4 else 10
+            user.profile.gender = 'M' if i % 2 else 'F'
+            user.profile.save()
+        current_user = User.objects.select_related('profile') \
+            .get(pk=current_user.pk)
+        near_users = list(self.users[1:4])
+        self.__generate_likes(near_users[0], [current_user])
+
+        url = reverse('api_feed')
+        view = views.FeedView.as_view()
+
+        def get_feed(**params) -> list:
+            request = self.factory.get(url, params)
+            force_authenticate(request, current_user)
+            response = view(request)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response.data
+
+        def get_feed_pks(**params) -> List[int]:
+            return [user['pk'] for user in get_feed(**params)['results']]
+
+        self.assertEqual(get_feed()['results'], [])
+
+        # Ленты новых пользователей уже стоят в очереди на пополнение.
+        with override_settings(FEED_SIZE=1, FEED_REFILL_THRESHOLD=1,
+                               FEED_MAX_DISTANCE=2000):
+            call_command('refill_feeds', stdout=StringIO())
+            # Лента пополняется для каждого гендера отдельно,
+            # уже оцененный пользователь в нее не попадает.
+            results = get_feed()['results']
+            self.assertEqual([user['pk'] for user in results],
+                             [near_users[1].pk, near_users[2].pk])
+            self.assertAlmostEqual(results[0]['distance_to_user'],
+                                   22.2, places=1)
+            self.assertEqual(get_feed_pks(gender='F'), [near_users[1].pk])
+
+            # После оценки профиль пропадает из ленты, а лента
+            # пополняется следующим профилем того же гендера.
+            self.__user_rated_user(current_user, near_users[1])
+            self.assertEqual(get_feed_pks(gender='F'), [])
+            call_command('refill_feeds', stdout=StringIO())
+            self.assertEqual(get_feed_pks(gender='F'), [self.users[4].pk])
+
+            # При изменении гендера профиль пропадает из чужих лент.
+            changed_profile = near_users[2].profile
+            changed_profile.gender = 'F'
+            changed_profile.save(update_fields=['gender'])
+            self.assertEqual(get_feed_pks(), [self.users[4].pk])
+            call_command('refill_feeds', stdout=StringIO())
+            self.assertEqual(get_feed_pks(), [self.users[4].pk])
+
+        with override_settings(FEED_SIZE=10, FEED_REFILL_THRESHOLD=10,
+                               FEED_MAX_DISTANCE=100):
+            call_command('refill_feeds', '--rebuild', stdout=StringIO())
+        self.assertFalse(FeedEntry.objects.filter(
+            owner=current_user.profile, candidate=self.users[4].profile,
+        ).exists())
+
+        # Страница ленты читается одним запросом.
+        request = self.factory.get(url, {'page_size': 1})
+        force_authenticate(request, current_user)
+        with self.assertNumQueries(1):
+            data = view(request).data
+        self.assertEqual([user['pk'] for user in data['results']],
+                         [near_users[2].pk])
+        self.assertIsNone(data['next'])
+
+        # Лента фильтруется по гендеру рекомендуемых профилей.
+        for gender, expected in (('M', [self.users[1]]),
+                                 ('F', [self.users[3], self.users[0]])):
+            request = self.factory.get(url, {'gender': gender})
+            force_authenticate(request, self.users[2])
+            self.assertEqual(
+                [user['pk'] for user in view(request).data['results']],
+                [user.pk for user in expected],
+            )
 
     def test_like_user_view(self) -> None:
         """Тест оценивания юзера другим юзером"""
@@ -182,10 +1043,120 @@ class ClientTests(APITestCase):
         # а счетчики влюбленных обнуляются.
         response_2 = self.__user_rated_user(user_2, user_1)
 
-        self.assertEqual(response_1.status_code, status.HTTP_200_OK)
+        self.assertEqual(response_2.status_code, status.HTTP_200_OK)
         self.assertEqual(user_1.profile.lovers.count(), 0)
         self.assertEqual(user_2.profile.lovers.count(), 0)
 
+        # Письма не отправляются в запросе, а ставятся в очередь.
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(MatchNotification.objects.filter(
+            recipient_email__in=(user_1.email, user_2.email),
+        ).count(), 2)
+
+    def test_like_query_count(self) -> None:
+        """Тест независимости количества запросов от числа оценок"""
+
+        popular_user = self.users[0]
+        User.objects.bulk_create([User(username=f'lover_{i}')
+                                  for i in range(30)])
+        lovers = User.objects.filter(username__startswith='lover_')
+        Profile.objects.bulk_create([
+            Profile(user=lover, gender='F', latitude=0, longitude=0)
+            for lover in lovers
+        ])
+        self.__generate_likes(popular_user, lovers)
+
+        # Количество запросов при оценке популярного и непопулярного
+        # пользователя, а также при взаимной симпатии, одинаково.
+        with CaptureQueriesContext(connection) as like_popular:
+            self.__user_rated_user(self.users[1], popular_user)
+        with CaptureQueriesContext(connection) as like_unpopular:
+            self.__user_rated_user(self.users[1], self.users[2])
+        with CaptureQueriesContext(connection) as match_popular:
+            self.__user_rated_user(popular_user, self.users[1])
+
+        self.assertEqual(len(like_popular), len(like_unpopular))
+        self.assertLessEqual(len(match_popular), len(like_popular) + 1)
+
+    def test_like_unique_pair(self) -> None:
+        """Тест уникальности оценки пары пользователей"""
+
+        lover, beloved = self.users[0].profile, self.users[1].profile
+        Like.objects.create(lover=lover, beloved=beloved)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Like.objects.create(lover=lover, beloved=beloved)
+
+        response = self.__user_rated_user(self.users[0], self.users[1])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_batch_like_view(self) -> None:
+        """Тест пакетной оценки пользователей"""
+
+        current_user = self.users[0]
+        liked_user, already_liked_user, lover = self.users[1:4]
+        self.__generate_likes(already_liked_user, [current_user])
+        self.__generate_likes(current_user, [lover])
+
+        url = reverse('api_like_users')
+        view = views.BatchLikeUsersView.as_view()
+
+        ids = [liked_user.pk, already_liked_user.pk, lover.pk,
+               current_user.pk, 100500, liked_user.pk]
+        request = self.factory.post(url, {'ids': ids}, format='json')
+        force_authenticate(request, current_user)
+
+        response = view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['pk'], item['result'])
+             for item in response.data['results']],
+            [(liked_user.pk, 'liked'),
+             (already_liked_user.pk, 'already_liked'),
+             (lover.pk, 'match'),
+             (current_user.pk, 'self'),
+             (100500, 'not_found')],
+        )
+        self.assertEqual(response.data['results'][2]['lovers_email'],
+                         lover.email)
+        self.assertTrue(Like.objects.filter(
+            lover=current_user.profile, beloved=liked_user.profile,
+        ).exists())
+        self.assertEqual(current_user.profile.lovers.count(), 0)
+        self.assertEqual(MatchNotification.objects.count(), 2)
+
+    def test_batch_like_query_count(self) -> None:
+        """Тест независимости количества запросов от размера пачки"""
+
+        url = reverse('api_like_users')
+        view = views.BatchLikeUsersView.as_view()
+        # В обеих пачках есть взаимные симпатии.
+        self.__generate_likes(self.users[0], self.users[1:2])
+        self.__generate_likes(self.users[1], self.users[2:])
+
+        query_counts = []
+        for lover, beloveds in ((self.users[0], self.users[1:2]),
+                                (self.users[1], self.users[2:])):
+            request = self.factory.post(url, {
+                'ids': [beloved.pk for beloved in beloveds],
+            }, format='json')
+            force_authenticate(request, lover)
+            with CaptureQueriesContext(connection) as queries:
+                view(request)
+            query_counts.append(len(queries))
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    @staticmethod
+    def __generate_likes(beloved: User, lovers: List[User]) -> None:
+        """Метод генерации оценок пользователя другими пользователями"""
+
+        Like.objects.bulk_create([
+            Like(lover=lover.profile, beloved=beloved.profile)
+            for lover in lovers
+        ])
+
     def __user_rated_user(self, lover: User, beloved: User) -> Response:
         """Метод имитации оценки одного пользователя другим"""
 
@@ -0,0 +1,38 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import (
+    RefreshToken,
+    TokenError,
+)
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from clients.cache import (
+    is_token_blacklisted_cached,
+    remember_blacklisted_token,
+)
+
+
+class CachedRefreshToken(RefreshToken):
+    """
+    Рефреш-токен с проверкой черного списка через кэш.
+
+    Токены из черного списка хранятся в кэше до истечения их срока
+    действия, поэтому повторное использование такого токена
+    отклоняется без обращения к БД. Токены, которых нет в кэше,
+    проверяются по БД, т.к. кэш может вытеснить любую запись.
+    """
+
+    def check_blacklist(self) -> None:
+        """Метод проверки наличия токена в черном списке"""
+
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if is_token_blacklisted_cached(jti):
+            raise TokenError(_('Token is blacklisted'))
+
+        try:
+            super().check_blacklist()
+        except TokenError:
+            remember_blacklisted_token(
+                jti, datetime_from_epoch(self.payload['exp']),
+            )
+            raise
@@ -3,6 +3,8 @@ from . import views
 
 urlpatterns = [
     path('me/lovers/', views.LoverListView.as_view(), name='api_lovers'),
+    path('me/feed/', views.FeedView.as_view(), name='api_feed'),
+    path('match/', views.BatchLikeUsersView.as_view(), name='api_like_users'),
     path('<int:pk>/match/', views.LikeUserView.as_view(), name='api_like_user'),
     path('<int:pk>/', views.UserDetailView.as_view(), name='api_user_detail'),
     path('create/', views.RegisterView.as_view(), name='api_registration'),
@@ -1,9 +1,28 @@
-import smtplib
-from decouple import config
+import hashlib
+from math import isfinite
+from typing import (
+    Optional,
+    Tuple,
+)
 
 from django.conf import settings
+from django.core.cache import cache
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import User
+from django.db.models import (
+    F,
+    QuerySet,
+)
+from django.http import (
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    quote_etag,
+)
+from django.utils.decorators import method_decorator
 
 from rest_framework import generics
 from rest_framework import views
@@ -14,13 +33,39 @@ from rest_framework.permissions import (
 )
 from rest_framework.response import Response
 from rest_framework.request import Request
+from rest_framework_simplejwt import views as jwt_views
 
+from clients.cache import (
+    get_user_list_regions,
+    make_user_list_cache_key,
+)
+from clients.compression import compress_page
+from clients.models import (
+    FeedEntry,
+    Like,
+    Profile,
+)
+from clients.matching import (
+    LikeResult,
+    like_user,
+    like_users,
+)
 from .serializers import (
+    BatchLikeSerializer,
     RegisterSerializer,
     LogoutSerializer,
+    TokenRefreshSerializer,
+    UserRowSerializer,
     UserSerializer,
 )
-from .filters import UserFilter
+from .filters import (
+    FeedFilter,
+    UserFilter,
+)
+from .pagination import KeysetPagination
+from .streaming import (
+    stream_json_list,
+)
 
 
 class RegisterView(generics.CreateAPIView):
@@ -47,86 +92,320 @@ class LogoutView(generics.GenericAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class UserDetailView(generics.RetrieveAPIView):
+class TokenRefreshView(jwt_views.TokenRefreshView):
     """
-    Класс-контроллер для предоставления информации о пользователе
+    Класс-контроллер для обновления токенов
+    с проверкой черного списка через кэш
     """
 
-    queryset = User.objects.all()
+    serializer_class = TokenRefreshSerializer
+
+
+class ConditionalGetMixin:
+    """
+    Класс-примесь для условных GET-запросов.
+
+    Ответ получает ETag из метода get_etag контроллера. Если клиент
+    прислал тот же ETag в If-None-Match, возвращается 304 без
+    обращения к сериализатору. По умолчанию ETag нет.
+    """
+
+    def get_etag(self, request: Request, *args, **kwargs) -> Optional[str]:
+        """Метод получения ETag ответа или None, если его нет"""
+
+        return None
+
+    def get(self, request: Request, *args, **kwargs) -> HttpResponse:
+        """Метод обработки условного GET-запроса"""
+
+        etag = self.get_etag(request, *args, **kwargs)
+        if etag is not None:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return self.set_etag(not_modified, etag)
+
+        response = super().get(request, *args, **kwargs)
+        if etag is not None and response.status_code == status.HTTP_200_OK:
+            self.set_etag(response, etag)
+        return response
+
+    @staticmethod
+    def set_etag(response: HttpResponse, etag: str) -> HttpResponse:
+        """Метод добавления ETag к ответу"""
+
+        response['ETag'] = etag
+        # Клиент может хранить ответ, но должен проверять его актуальность.
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    @staticmethod
+    def make_etag(*parts) -> str:
+        """Метод построения сильного ETag из частей ключа"""
+
+        key = ':'.join(map(str, parts))
+        return quote_etag(hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+@method_decorator(compress_page, name='dispatch')
+class UserDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
+    """
+    Класс-контроллер для предоставления информации о пользователе.
+
+    ETag строится по версии профиля, которая увеличивается
+    при каждом изменении пользователя и профиля.
+    """
+
+    queryset = User.objects.select_related('profile')
     permission_classes = (IsAuthenticated, )
     serializer_class = UserSerializer
 
+    def get_etag(self, request: Request, *args, **kwargs) -> Optional[str]:
+        """Метод получения ETag по версии профиля пользователя"""
 
-class UserListView(generics.ListAPIView):
-    """Класс-контроллер списка пользователей"""
+        version = Profile.objects.filter(user_id=kwargs['pk']) \
+            .values_list('version', flat=True).first()
+        if version is None:
+            return None
+        # Ссылки на аватары в ответе абсолютные и зависят от хоста.
+        return self.make_etag(kwargs['pk'], version,
+                              request.build_absolute_uri('/'))
 
-    queryset = User.objects.all()
+
+@method_decorator(compress_page, name='dispatch')
+class UserListView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Класс-контроллер списка пользователей.
+
+    Схема ответа описывается UserSerializer, а сами списки
+    сериализуются быстрым UserRowSerializer с тем же результатом.
+    ETag строится по версиям профилей пользователей на странице
+    и кэшируется вместе с ней, поэтому проверка ETag закэшированной
+    страницы не обращается к БД.
+    """
+
+    queryset = User.objects.select_related('profile')
     permission_classes = (IsAuthenticated, )
     serializer_class = UserSerializer
+    row_serializer_class = UserRowSerializer
     filterset_class = UserFilter
-
-    def get(self, request: Request, *args, **kwargs) -> Response:
+    pagination_class = KeysetPagination
+    # Параметр запроса, включающий потоковую выдачу всего списка.
+    stream_query_param = 'stream'
+    # Количество записей, читаемых из БД за раз при потоковой выдаче.
+    stream_chunk_size = 500
+    # Страница и ее ETag, полученные при проверке ETag.
+    cached_page: Optional[dict] = None
+
+    def get_keyset_ordering(self, queryset: QuerySet) -> Tuple[str, ...]:
+        """
+        Метод получения ключей сортировки для пагинации.
+
+        При фильтрации по расстоянию пользователи
+        отдаются от ближайших к дальним.
+        """
+
+        if 'distance_to_user' in queryset.query.annotations:
+            return 'distance_to_user', 'pk'
+        return 'pk',
+
+    def is_streaming(self, request: Request) -> bool:
+        """Метод проверки, запрошена ли потоковая выдача списка"""
+
+        return request.query_params.get(self.stream_query_param) \
+            in ('1', 'true')
+
+    def get_etag(self, request: Request, *args, **kwargs) -> Optional[str]:
+        """Метод получения ETag по версиям пользователей на странице"""
+
+        if self.is_streaming(request):
+            return None
+        return self.get_page(request)['etag']
+
+    def get_page(self, request: Request) -> dict:
+        """
+        Метод получения страницы списка и ее ETag.
+
+        Пользователи листают один и тот же список много раз подряд,
+        поэтому страницы кэшируются. Кэш сбрасывается при изменении
+        пользователей или их профилей, которые могут попасть в список.
+        ETag считается по первичным ключам и версиям профилей строк
+        страницы, а не по версиям кэша, поэтому одинаковый ETag
+        означает одинаковые данные в любом процессе.
+        """
+
+        if self.cached_page is not None:
+            return self.cached_page
+
+        cache_key = self.get_cache_key(request)
+        page = cache.get(cache_key)
+        if page is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            serializer = self.row_serializer_class()
+            rows = self.paginate_queryset(
+                serializer.get_values(queryset, 'profile__version'),
+            )
+            # Расстояния и ссылка на следующую страницу зависят
+            # от адреса запроса и положения пользователя.
+            etag = self.make_etag(request.build_absolute_uri(), *(
+                (row['pk'], row['profile__version'],
+                 row.get('distance_to_user'))
+                for row in rows
+            ))
+            page = {
+                'data': self.get_paginated_response(
+                    serializer.serialize(rows),
+                ).data,
+                'etag': etag,
+            }
+            cache.set(cache_key, page, settings.USER_LIST_CACHE_TIMEOUT)
+
+        self.cached_page = page
+        return page
+
+    def list(self, request: Request, *args, **kwargs) -> Response:
         """Метод для отправки отфильтрованного списка пользователей"""
 
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.serializer_class(queryset, many=True)
-        return Response(serializer.data)
+        # Потоковая выдача всего списка без пагинации для интеграций,
+        # которым нужны все пользователи сразу.
+        if self.is_streaming(request):
+            if not settings.USER_LIST_STREAMING_ENABLED:
+                return Response(
+                    data={'msg': 'Потоковая выдача списка отключена.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            queryset = self.filter_queryset(self.get_queryset())
+            serializer = self.row_serializer_class()
+            rows = serializer.get_values(queryset).order_by(
+                *self.get_keyset_ordering(queryset)
+            )
+            content = stream_json_list(rows, serializer.to_representation,
+                                       self.stream_chunk_size)
+            return StreamingHttpResponse(content,
+                                         content_type='application/json')
+
+        return Response(self.get_page(request)['data'])
+
+    @staticmethod
+    def get_cache_key(request: Request) -> str:
+        """
+        Метод получения ключа кэша для страницы списка.
+
+        Ключ зависит от пользователя, ячейки, в которой он находится,
+        и нормализованных параметров запроса. Список с фильтром
+        по расстоянию зависит только от версий покрывающих его регионов.
+        """
+
+        profile = getattr(request.user, 'profile', None)
+        location_bucket = profile.geohash_5 if profile is not None else ''
+        params = [(name, value)
+                  for name, values in request.query_params.lists()
+                  for value in values]
+        params.append(('host', request.get_host()))
+
+        regions = None
+        try:
+            max_distance = float(request.query_params['distance_to_user'])
+        except (KeyError, ValueError):
+            max_distance = None
+        if profile is not None and max_distance is not None \
+                and isfinite(max_distance):
+            regions = get_user_list_regions(profile.latitude,
+                                            profile.longitude, max_distance)
+
+        return make_user_list_cache_key(request.user.pk, location_bucket,
+                                        params, regions)
 
 
 class LoverListView(generics.ListAPIView):
-    """Класс-контроллер списка оценивших пользователей"""
+    """
+    Класс-контроллер списка оценивших пользователей.
+
+    Оценившие пользователи отдаются постранично от новых оценок
+    к старым. Страница вместе с профилями загружается одним запросом,
+    независимо от количества оценивших.
+    """
 
-    queryset = User.objects.all()
     permission_classes = (IsAuthenticated, )
     serializer_class = UserSerializer
+    row_serializer_class = UserRowSerializer
+    pagination_class = KeysetPagination
+
+    def get_queryset(self) -> QuerySet:
+        """Метод получения оценок текущего пользователя"""
+
+        return Like.objects.filter(beloved__user=self.request.user) \
+            .select_related('lover__user')
+
+    def get_keyset_ordering(self, queryset: QuerySet) -> Tuple[str, ...]:
+        """Метод получения ключей сортировки для пагинации"""
+
+        return '-created_at', '-pk'
 
     def get(self, request: Request, *args, **kwargs) -> Response:
         """Метод для полуения списка оценивших пользователей"""
 
-        lovers = [lover_profile.user for lover_profile in
-                  request.user.profile.lovers.all()]
-        serializer = self.serializer_class(lovers, many=True)
-        return Response(serializer.data)
+        serializer = self.row_serializer_class(prefix='lover__user__')
+        page = self.paginate_queryset(serializer.get_values(
+            self.get_queryset(), 'created_at', 'pk',
+        ))
+        return self.get_paginated_response(serializer.serialize(page))
 
 
-class LikeUserView(views.APIView):
-    """Класс-контроллер оценки пользователя"""
+class FeedView(generics.ListAPIView):
+    """
+    Класс-контроллер ленты рекомендаций.
+
+    Отдает постранично от ближних к дальним профили, которые заранее
+    отобрала в ленту команда refill_feeds и которые пользователь
+    еще не оценил. Страница читается по индексу ленты, поэтому
+    ее получение не зависит ни от количества пользователей,
+    ни от длины ленты.
+    """
 
     permission_classes = (IsAuthenticated, )
+    serializer_class = UserSerializer
+    row_serializer_class = UserRowSerializer
+    filterset_class = FeedFilter
+    pagination_class = KeysetPagination
 
-    @staticmethod
-    def __send_love(beloved: User, lover: User) -> None:
-        """Метод отправки письма со взаимной симпатией"""
+    def get_queryset(self) -> QuerySet:
+        """Метод получения неоцененных записей ленты пользователя"""
 
-        # FIXME:
-        #  Этот способ отправки сообщения, как по-мне, - костыль, хоть и
-        #  рабочий. Необходимо разобраться, почему не работает стандартный
-        #  способ отправки сообщений.
-        server = smtplib.SMTP('smtp.gmail.com', 25)
-        server.connect("smtp.gmail.com", 587)
-        server.ehlo()
-        server.starttls()
-        server.ehlo()
+        profile = getattr(self.request.user, 'profile', None)
+        if profile is None:
+            return FeedEntry.objects.none()
+        return FeedEntry.objects.filter(
+            owner=profile, liked_at__isnull=True,
+        ).annotate(distance_to_user=F('distance'))
 
-        EMAIL_HOST_USER = config('EMAIL_HOST_USER')
-        EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
+    def get_keyset_ordering(self, queryset: QuerySet) -> Tuple[str, ...]:
+        """Метод получения ключей сортировки для пагинации"""
 
-        server.login(EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)
+        return 'distance', 'pk'
 
-        text = f'From: my_apptrix_test@test.com\n' \
-               f'Subject: Есть взаимная симпатия!\n' \
-               f'Вы понравились {lover.username}!\n' \
-               f'Почта участника: {lover.email}.'.encode('utf-8')
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        """Метод для получения страницы ленты рекомендаций"""
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.row_serializer_class(prefix='candidate__user__')
+        page = self.paginate_queryset(serializer.get_values(
+            queryset, 'distance', 'pk',
+        ))
+        return self.get_paginated_response(serializer.serialize(page))
+
+
+class LikeUserView(views.APIView):
+    """Класс-контроллер оценки пользователя"""
 
-        server.sendmail(EMAIL_HOST_USER, beloved.email, text)
-        server.quit()
+    permission_classes = (IsAuthenticated, )
 
     def post(self, request: Request, *args, **kwargs) -> Response:
         """Метод для оценки пользователя другим пользователем"""
 
         # Текущий пользователь и пользователь, которого оценили.
         current_user = request.user
-        liked_user = User.objects.filter(pk=kwargs['pk']).first()
+        liked_user = User.objects.select_related('profile') \
+            .filter(pk=kwargs['pk']).first()
 
         # Если пользователя не существует, возвращаем ошибку.
         if liked_user is None:
@@ -138,30 +417,56 @@ class LikeUserView(views.APIView):
             return Response(data={'msg': 'Вы не можете оценить себя.'},
                             status=status.HTTP_400_BAD_REQUEST)
 
+        result = like_user(current_user, liked_user)
+
         # Если пользователь уже оценивал этого пользователя, сообщаем об этом.
-        if current_user.profile in liked_user.profile.lovers.all():
+        if result == LikeResult.ALREADY_LIKED:
             return Response(data={'msg': 'Вы уже оценили этого пользователя.'},
                             status=status.HTTP_403_FORBIDDEN)
 
         # Совпадение симпатий.
         # Эта ситуация возникает, когда текущий пользователь оценил
         # пользователя, который уже есть в списке тех, кто оценил
-        # текущего пользователя.
-        if liked_user.profile in current_user.profile.lovers.all():
-            # Отправляем пользователям письма.
-            self.__send_love(current_user, liked_user)
-            self.__send_love(liked_user, current_user)
-
-            # Т.к. взаимная симпатия достигнута, можно больше не отслеживать,
-            # кто кого оценил. Удаляем связь пользователей.
-            current_user.profile.lovers.remove(liked_user.profile)
-
+        # текущего пользователя. Письма пользователям ставятся в очередь
+        # и будут отправлены командой send_match_notifications.
+        if result == LikeResult.MATCH:
             return Response(data={
                 'msg': _('Есть взаимная симпатия!'),
                 'lovers_email': liked_user.email
             })
 
-        # Добавляем текущего пользователя в список оценивших.
-        liked_user.profile.lovers.add(current_user.profile)
-
         return Response(data={'msg': f'Вы оценили {liked_user.username}.'},)
+
+
+class BatchLikeUsersView(generics.GenericAPIView):
+    """
+    Класс-контроллер пакетной оценки пользователей.
+
+    Позволяет оценить сразу нескольких пользователей одним запросом.
+    Для каждого пользователя возвращается результат оценки:
+    liked, already_liked, match, not_found или self.
+    """
+
+    permission_classes = (IsAuthenticated, )
+    serializer_class = BatchLikeSerializer
+
+    def post(self, request: Request, *args, **kwargs) -> Response:
+        """Метод для оценки нескольких пользователей"""
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Порядок результатов совпадает с порядком переданных ключей.
+        pks = list(dict.fromkeys(serializer.validated_data['ids']))
+
+        # Почты возвращаются только для пользователей
+        # с взаимной симпатией.
+        results, emails = like_users(request.user, pks)
+
+        data = []
+        for pk in pks:
+            item = {'pk': pk, 'result': results[pk].value}
+            if pk in emails:
+                item['lovers_email'] = emails[pk]
+            data.append(item)
+
+        return Response(data={'results': data})
@@ -1,9 +1,39 @@
 from django.contrib import admin
 
-from .models import Profile
+from .models import (
+    FeedEntry,
+    Like,
+    Profile,
+    MatchNotification,
+    StaleFeed,
+)
 
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('gender', 'user')
     list_display_links = ('gender', 'user')
+
+
+@admin.register(MatchNotification)
+class MatchNotificationAdmin(admin.ModelAdmin):
+    list_display = ('recipient_email', 'status', 'attempts', 'created_at')
+    list_filter = ('status', )
+
+
+@admin.register(Like)
+class LikeAdmin(admin.ModelAdmin):
+    list_display = ('lover', 'beloved', 'created_at')
+    raw_id_fields = ('lover', 'beloved')
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'candidate', 'distance', 'liked_at')
+    raw_id_fields = ('owner', 'candidate')
+
+
+@admin.register(StaleFeed)
+class StaleFeedAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'created_at')
+    raw_id_fields = ('owner', )
@@ -6,3 +6,8 @@ class ClientsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'clients'
     verbose_name = _('Аккаунты пользователей')
+
+    def ready(self) -> None:
+        # Подключаем обработчики сигналов и проверки настроек.
+        from . import checks  # noqa: F401
+        from . import signals  # noqa: F401
@@ -0,0 +1,186 @@
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+from django.conf import settings
+from django.db import (
+    connection,
+    transaction,
+)
+from django.db.models import F
+
+from .cache import (
+    invalidate_auth_users,
+    invalidate_user_lists,
+)
+from .models import Profile
+from .watermark import render_variants
+
+# Расширения файлов миниатюр для поддерживаемых форматов.
+VARIANT_EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+    'PNG': 'png',
+}
+
+
+def get_variant_name(avatar_name: str, size: int) -> str:
+    """
+    Функция получения имени файла миниатюры аватара в хранилище.
+
+    Миниатюры лежат в подкаталоге variants рядом с исходным файлом:
+    user_avatars/photo.png -> user_avatars/variants/photo.png_256.webp.
+    Имя исходного файла сохраняется вместе с расширением: хранилище
+    не дает одинаковых имен, а у photo.png и photo.jpg разных
+    пользователей должны быть разные миниатюры.
+
+    :param avatar_name: Имя исходного файла аватара в хранилище.
+    :param size: Сторона миниатюры в пикселях.
+    :return: Имя файла миниатюры в хранилище.
+    """
+
+    directory, filename = posixpath.split(avatar_name)
+    extension = VARIANT_EXTENSIONS[settings.AVATAR_VARIANT_FORMAT]
+    return posixpath.join(directory, 'variants',
+                          f'{filename}_{size}.{extension}')
+
+
+def get_variant_paths(profile: Profile) -> Dict[int, str]:
+    """
+    Функция получения путей до файлов миниатюр аватара.
+
+    Каталог для миниатюр создается, если его еще нет.
+
+    :param profile: Профиль с загруженным аватаром.
+    :return: Пути до файлов миниатюр по их размерам.
+    """
+
+    storage = profile.avatar.storage
+    variant_paths = {
+        size: storage.path(get_variant_name(profile.avatar.name, size))
+        for size in settings.AVATAR_VARIANT_SIZES
+    }
+    for path in variant_paths.values():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    return variant_paths
+
+
+def process_avatar(image_path: str, watermark_path: str,
+                   variant_paths: Dict[int, str],
+                   image_format: str, quality: int) -> None:
+    """
+    Функция обработки загруженного аватара.
+
+    Создает миниатюры изображения с водяным знаком. Исходное
+    изображение не изменяется. Выполняется в отдельном процессе,
+    поэтому не должна обращаться к БД и принимает только простые
+    аргументы.
+
+    :param image_path: Путь до изображения аватара.
+    :param watermark_path: Путь до водяного знака.
+    :param variant_paths: Пути до файлов миниатюр по их размерам.
+    :param image_format: Формат миниатюр.
+    :param quality: Качество сжатия миниатюр.
+    """
+
+    render_variants(image_path, watermark_path, variant_paths,
+                    image_format, quality)
+
+
+def claim_pending_avatars(batch_size: int) -> List[Profile]:
+    """
+    Функция захвата пачки аватаров, ожидающих обработки.
+
+    Захваченные профили переводятся в статус обработки в отдельной
+    короткой транзакции, поэтому несколько обработчиков
+    не возьмут в работу один и тот же аватар.
+
+    :param batch_size: Максимальное количество аватаров в пачке.
+    :return: Список захваченных профилей.
+    """
+
+    with transaction.atomic():
+        queryset = Profile.objects.filter(
+            avatar_status=Profile.AvatarStatus.PENDING,
+        ).only('id', 'user_id', 'avatar', 'geohash_3').order_by('pk')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        profiles = list(queryset[:batch_size])
+
+        Profile.objects.filter(pk__in=[profile.pk for profile in profiles]) \
+            .update(avatar_status=Profile.AvatarStatus.PROCESSING,
+                    version=F('version') + 1)
+
+    # update не отправляет сигналы, поэтому кэш списков, их ETag
+    # и закэшированные для аутентификации пользователи
+    # сбрасываются вручную.
+    if profiles:
+        invalidate_user_lists(profile.geohash_3 for profile in profiles)
+        invalidate_auth_users(profile.user_id for profile in profiles)
+
+    return profiles
+
+
+def process_pending_avatars(batch_size: int = 50,
+                            pool: ProcessPoolExecutor = None
+                            ) -> Tuple[int, int]:
+    """
+    Функция обработки пачки аватаров, ожидающих обработки.
+
+    :param batch_size: Максимальное количество аватаров в пачке.
+    :param pool:
+        Пул процессов для обработки изображений.
+        Если не передан, изображения обрабатываются
+        в текущем процессе.
+    :return: Количество обработанных аватаров и аватаров с ошибкой.
+    """
+
+    profiles = claim_pending_avatars(batch_size)
+    if not profiles:
+        return 0, 0
+
+    tasks = [
+        (profile.pk, (
+            profile.avatar.path,
+            str(settings.AVATAR_WATERMARK_PATH),
+            get_variant_paths(profile),
+            settings.AVATAR_VARIANT_FORMAT,
+            settings.AVATAR_VARIANT_QUALITY,
+        )) for profile in profiles
+    ]
+    ready_pks, failed_pks = [], []
+    if pool is None:
+        for pk, arguments in tasks:
+            # Как и в пуле процессов, любая ошибка одного аватара
+            # не должна прерывать обработку остальных.
+            try:
+                process_avatar(*arguments)
+            except Exception:
+                failed_pks.append(pk)
+            else:
+                ready_pks.append(pk)
+    else:
+        futures = [(pk, pool.submit(process_avatar, *arguments))
+                   for pk, arguments in tasks]
+        for pk, future in futures:
+            if future.exception() is None:
+                ready_pks.append(pk)
+            else:
+                failed_pks.append(pk)
+
+    Profile.objects.filter(pk__in=ready_pks) \
+        .update(avatar_status=Profile.AvatarStatus.READY,
+                version=F('version') + 1)
+    Profile.objects.filter(pk__in=failed_pks) \
+        .update(avatar_status=Profile.AvatarStatus.FAILED,
+                version=F('version') + 1)
+    invalidate_user_lists(profile.geohash_3 for profile in profiles)
+    invalidate_auth_users(profile.user_id for profile in profiles)
+
+    return len(ready_pks), len(failed_pks)
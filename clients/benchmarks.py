@@ -0,0 +1,40 @@
+import statistics
+from typing import (
+    Iterable,
+    Optional,
+)
+
+
+def summarize_latencies(latencies: Iterable[Optional[float]],
+                        elapsed: float) -> dict:
+    """
+    Функция подсчета статистики времени ответа для отчетов бенчмарков.
+
+    :param latencies:
+        Время выполнения каждого запроса в секундах
+        или None для запросов, завершившихся ошибкой.
+    :param elapsed: Общее время выполнения всех запросов в секундах.
+    :return: Количество запросов и ошибок, пропускная способность
+        и перцентили времени ответа в миллисекундах.
+    """
+
+    latencies = list(latencies)
+    succeeded = sorted(latency for latency in latencies
+                       if latency is not None)
+    summary = {
+        'requests': len(latencies),
+        'errors': len(latencies) - len(succeeded),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(succeeded) / elapsed, 1)
+        if elapsed > 0 else None,
+    }
+    if len(succeeded) > 1:
+        quantiles = statistics.quantiles(succeeded, n=100)
+        summary.update({
+            'mean_ms': round(statistics.fmean(succeeded) * 1000, 3),
+            'p50_ms': round(quantiles[49] * 1000, 3),
+            'p95_ms': round(quantiles[94] * 1000, 3),
+            'p99_ms': round(quantiles[98] * 1000, 3),
+        })
+
+    return summary
@@ -0,0 +1,228 @@
+import hashlib
+import time
+from datetime import datetime
+from typing import (
+    Iterable,
+    List,
+    Optional,
+)
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .geo import (
+    bounding_boxes,
+    covering_geohashes,
+)
+
+
+# Ключ кэша с текущей версией закэшированных списков пользователей.
+USER_LIST_VERSION_KEY = 'user_list:version'
+# Ключ кэша с версией всех регионов списков с фильтром по расстоянию.
+USER_LIST_REGIONS_VERSION_KEY = 'user_list:regions:version'
+# Точность геохеша регионов, по которым сбрасываются
+# списки с фильтром по расстоянию (ячейка ~156 км).
+USER_LIST_REGION_PRECISION = 3
+# Ключ кэша с версией снимка координат профилей.
+GEO_SNAPSHOT_VERSION_KEY = 'geo_snapshot:version'
+
+
+def get_version(key: str) -> int:
+    """
+    Функция получения текущей версии данных по ключу кэша.
+
+    Если версия была вытеснена из кэша, она начинается с текущего
+    времени, чтобы не совпасть ни с одной из прежних версий.
+    """
+
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+
+    return version
+
+
+def increment_version(key: str) -> int:
+    """
+    Функция увеличения версии данных по ключу кэша.
+
+    :return: Новая версия.
+    """
+
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_versions(keys: List[str]) -> List[int]:
+    """
+    Функция получения текущих версий данных по нескольким ключам кэша
+    одним обращением к кэшу.
+    """
+
+    versions = cache.get_many(keys)
+    return [versions[key] if key in versions else get_version(key)
+            for key in keys]
+
+
+def get_user_list_version() -> int:
+    """
+    Функция получения текущей версии закэшированных списков.
+
+    Версия входит в ключ каждого закэшированного списка без фильтра
+    по расстоянию, поэтому ее увеличение делает недействительными
+    сразу все такие списки.
+    """
+
+    return get_version(USER_LIST_VERSION_KEY)
+
+
+def get_region_version_key(geohash: str) -> str:
+    """Функция построения ключа кэша с версией региона списков"""
+
+    return f'user_list:region:{geohash}'
+
+
+def get_user_list_regions(latitude: float, longitude: float,
+                          max_distance: float) -> Optional[List[str]]:
+    """
+    Функция получения регионов, покрывающих окружность поиска.
+
+    Список с фильтром по расстоянию содержит только пользователей
+    из этих регионов, поэтому его достаточно сбрасывать при изменении
+    пользователей в них.
+
+    :param latitude: Широта центра в градусах.
+    :param longitude: Долгота центра в градусах.
+    :param max_distance: Радиус окружности в километрах.
+    :return:
+        Геохеши регионов или None, если окружность
+        покрывается слишком большим количеством регионов.
+    """
+
+    boxes = bounding_boxes(latitude, longitude, max_distance)
+    if boxes is None:
+        return None
+    return covering_geohashes(boxes, USER_LIST_REGION_PRECISION)
+
+
+def invalidate_user_lists(geohashes: Optional[Iterable[str]] = None
+                          ) -> None:
+    """
+    Функция сброса закэшированных списков пользователей.
+
+    Списки без фильтра по расстоянию сбрасываются всегда, а списки
+    с фильтром по расстоянию - только покрывающие переданные регионы.
+
+    :param geohashes:
+        Геохеши точности USER_LIST_REGION_PRECISION, в которых
+        изменились пользователи. Если не переданы, сбрасываются
+        списки всех регионов.
+    """
+
+    increment_version(USER_LIST_VERSION_KEY)
+    if geohashes is None:
+        increment_version(USER_LIST_REGIONS_VERSION_KEY)
+        return
+
+    for geohash in set(geohashes):
+        if geohash:
+            increment_version(get_region_version_key(geohash))
+
+
+def make_user_list_cache_key(user_pk: int, location_bucket: str,
+                             params: Iterable[tuple],
+                             regions: Optional[List[str]] = None) -> str:
+    """
+    Функция построения ключа кэша для списка пользователей.
+
+    :param user_pk: Первичный ключ запрашивающего пользователя.
+    :param location_bucket: Ячейка, в которой находится пользователь.
+    :param params: Пары (параметр, значение) запроса.
+    :param regions:
+        Регионы, которыми ограничен список. Если не переданы,
+        список сбрасывается при любом изменении пользователей.
+    :return: Ключ кэша.
+    """
+
+    # Порядок параметров в запросе не должен влиять на ключ.
+    normalized = '&'.join(f'{name}={value}'
+                          for name, value in sorted(params))
+    digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    if regions is None:
+        version = get_user_list_version()
+    else:
+        versions = get_versions([
+            USER_LIST_REGIONS_VERSION_KEY,
+            *map(get_region_version_key, regions),
+        ])
+        # Версий может быть много, а длина ключа ограничена.
+        version = 'r' + hashlib.sha1(
+            ':'.join(map(str, versions)).encode('utf-8'),
+        ).hexdigest()
+
+    # Страница кэшируется вместе со своим ETag.
+    return f'user_list:page:{version}:{user_pk}:{location_bucket}:{digest}'
+
+
+def get_blacklisted_token_key(jti: str) -> str:
+    """Функция построения ключа кэша для токена из черного списка"""
+
+    return f'jwt_blacklist:{jti}'
+
+
+def remember_blacklisted_token(jti: str, expires_at: datetime) -> None:
+    """
+    Функция сохранения токена из черного списка в кэш.
+
+    Запись хранится до истечения срока действия токена: после него
+    токен отклоняется и без проверки черного списка.
+
+    :param jti: Идентификатор токена.
+    :param expires_at: Время истечения срока действия токена.
+    """
+
+    timeout = (expires_at - timezone.now()).total_seconds()
+    if timeout > 0:
+        cache.set(get_blacklisted_token_key(jti), True, timeout=timeout)
+
+
+def is_token_blacklisted_cached(jti: str) -> bool:
+    """Функция проверки наличия токена в закэшированном черном списке"""
+
+    return cache.get(get_blacklisted_token_key(jti), False)
+
+
+def get_auth_user_key(user_pk: int) -> str:
+    """
+    Функция построения ключа кэша для пользователя, найденного по токену.
+
+    Ключ не зависит от токена, чтобы кэш можно было сбросить
+    по идентификатору пользователя, не зная выданных ему токенов.
+    """
+
+    return f'auth_user:{user_pk}'
+
+
+def invalidate_auth_user(user_pk: int) -> None:
+    """Функция сброса закэшированного пользователя, найденного по токену"""
+
+    cache.delete(get_auth_user_key(user_pk))
+
+
+def invalidate_auth_users(user_pks: Iterable[int]) -> None:
+    """
+    Функция сброса закэшированных пользователей, найденных по токену.
+
+    Сигналы сбрасывают кэш только при сохранении отдельных записей,
+    поэтому после QuerySet.update пользователей или их профилей
+    функцию необходимо вызывать вручную.
+    """
+
+    cache.delete_many([get_auth_user_key(pk) for pk in user_pks])
@@ -0,0 +1,37 @@
+from typing import List
+
+from django.conf import settings
+from django.core.checks import (
+    Tags,
+    Warning,
+    register,
+)
+
+
+# Кэши, данные которых видны только текущему процессу.
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs=None, **kwargs) -> List[Warning]:
+    """
+    Проверка того, что кэш по умолчанию общий для всех процессов.
+
+    Версии закэшированных списков, черный список токенов и версия
+    снимка координат хранятся в кэше. Если кэш у каждого процесса свой,
+    изменения из фоновых команд и других процессов в нем не видны.
+    """
+
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_CACHE_BACKENDS:
+        return []
+
+    return [Warning(
+        f'Кэш по умолчанию ({backend}) не общий для процессов.',
+        hint='Укажите общий кэш (например, Redis или Memcached) '
+             'в переменных окружения CACHE_BACKEND и CACHE_LOCATION.',
+        id='clients.W001',
+    )]
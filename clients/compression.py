@@ -0,0 +1,96 @@
+import re
+from typing import (
+    Iterable,
+    Iterator,
+)
+
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+)
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import decorator_from_middleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Степень сжатия brotli. Максимальная (11) слишком медленна
+# для ответов, которые сжимаются при каждом запросе.
+BROTLI_QUALITY = 5
+
+# Ответы короче этого размера не сжимаются, как и в GZipMiddleware.
+MIN_COMPRESSED_LENGTH = 200
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+def compress_brotli_sequence(sequence: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Генератор сжатия потокового ответа в brotli.
+
+    После каждой части ответа сжатые данные сбрасываются,
+    чтобы клиент получал их сразу, а не в конце потока.
+    """
+
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Класс промежуточного слоя сжатия ответов.
+
+    Если клиент принимает brotli и установлен пакет brotli, ответ
+    сжимается в brotli, иначе - в gzip, как в GZipMiddleware.
+
+    Сжатие ответов с секретами и данными из запроса открывает атаку
+    BREACH, поэтому слой подключается не глобально, а декоратором
+    compress_page к контроллерам без секретов.
+    """
+
+    def process_response(self, request: HttpRequest,
+                         response: HttpResponse) -> HttpResponse:
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or not re_accepts_brotli.search(accept_encoding):
+            return super().process_response(request, response)
+
+        if not response.streaming \
+                and len(response.content) < MIN_COMPRESSED_LENGTH:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding', ))
+        if response.streaming:
+            response.streaming_content = compress_brotli_sequence(
+                response.streaming_content,
+            )
+            del response.headers['Content-Length']
+        else:
+            compressed_content = brotli.compress(response.content,
+                                                 quality=BROTLI_QUALITY)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # Сжатый ответ отличается от исходного побайтно,
+        # поэтому сильный ETag становится слабым.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+
+        return response
+
+
+# Декоратор сжатия ответов контроллера, аналог gzip_page.
+compress_page = decorator_from_middleware(CompressionMiddleware)
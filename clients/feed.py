@@ -0,0 +1,212 @@
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import (
+    connection,
+    transaction,
+)
+from django.db.models import (
+    Count,
+    Q,
+)
+
+from api.clients.filters import filter_within_distance
+from .models import (
+    FeedEntry,
+    Like,
+    Profile,
+    StaleFeed,
+)
+
+
+def count_active_entries(profile: Profile) -> Dict[str, int]:
+    """Функция подсчета неоцененных записей ленты по гендерам"""
+
+    return dict(FeedEntry.objects.filter(
+        owner=profile, liked_at__isnull=True,
+    ).values_list('candidate__gender').annotate(count=Count('pk'))
+        .order_by())
+
+
+def refill_feed(profile: Profile,
+                counts_active: Optional[Dict[str, int]] = None) -> int:
+    """
+    Функция пополнения ленты рекомендаций пользователя.
+
+    Лента пополняется отдельно для каждого гендера: если неоцененных
+    записей с профилями этого гендера осталось меньше
+    FEED_REFILL_THRESHOLD, добавляются ближайшие профили не дальше
+    FEED_MAX_DISTANCE километров, которых еще нет в ленте и которые
+    пользователь еще не оценил, пока их не наберется FEED_SIZE.
+
+    :param profile: Профиль владельца ленты.
+    :param counts_active:
+        Количество неоцененных записей ленты по гендерам,
+        если оно уже известно.
+    :return: Количество добавленных записей.
+    """
+
+    if counts_active is None:
+        counts_active = count_active_entries(profile)
+
+    # Оцененные записи ленты остаются в ней, поэтому профиль, с которым
+    # случилась взаимная симпатия, не вернется в ленту, хотя обе
+    # оценки при этом удаляются.
+    queryset = User.objects.exclude(pk=profile.user_id).exclude(
+        profile__pk__in=FeedEntry.objects.filter(owner=profile)
+        .values('candidate_id'),
+    ).exclude(
+        profile__pk__in=Like.objects.filter(lover=profile)
+        .values('beloved_id'),
+    )
+
+    entries = []
+    for gender in Profile.Gender.values:
+        count_active = counts_active.get(gender, 0)
+        if count_active >= settings.FEED_REFILL_THRESHOLD:
+            continue
+        candidates = filter_within_distance(
+            queryset.filter(profile__gender=gender), profile,
+            settings.FEED_MAX_DISTANCE,
+        ).order_by('distance_to_user', 'pk').values_list(
+            'profile__pk', 'distance_to_user',
+        )[:settings.FEED_SIZE - count_active]
+        entries += [FeedEntry(owner=profile, candidate_id=candidate_pk,
+                              distance=distance)
+                    for candidate_pk, distance in candidates]
+
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def mark_feeds_stale(owner_pks: Iterable[int]) -> None:
+    """Функция постановки лент в очередь на пополнение"""
+
+    StaleFeed.objects.bulk_create(
+        [StaleFeed(owner_id=owner_pk) for owner_pk in set(owner_pks)],
+        ignore_conflicts=True,
+    )
+
+
+def expire_feed_entries(profile: Profile) -> None:
+    """
+    Функция удаления записей лент, устаревших после изменения профиля.
+
+    Удаляются неоцененные записи ленты самого профиля и записи с ним
+    в чужих лентах: расстояния в них больше не верны, а профиль мог
+    перестать подходить под фильтр по гендеру. Затронутые ленты
+    ставятся в очередь на пополнение.
+    """
+
+    stale_entries = FeedEntry.objects.filter(
+        Q(owner=profile) | Q(candidate=profile), liked_at__isnull=True,
+    )
+    owner_pks = set(stale_entries.values_list('owner_id', flat=True))
+    stale_entries.delete()
+    mark_feeds_stale(owner_pks | {profile.pk})
+
+
+def claim_stale_feeds(batch_size: int) -> List[int]:
+    """
+    Функция захвата пачки лент из очереди на пополнение.
+
+    Захваченные ленты удаляются из очереди в короткой транзакции.
+    Если лента снова попадет в очередь во время пополнения,
+    она будет пополнена еще раз.
+
+    :param batch_size: Максимальное количество лент в пачке.
+    :return: Первичные ключи профилей владельцев лент.
+    """
+
+    with transaction.atomic():
+        queryset = StaleFeed.objects.order_by('created_at', 'owner_id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        owner_pks = list(queryset.values_list('owner_id', flat=True)
+                         [:batch_size])
+        StaleFeed.objects.filter(owner_id__in=owner_pks).delete()
+
+    return owner_pks
+
+
+def refill_stale_feeds(batch_size: int = 500) -> Tuple[int, int]:
+    """
+    Функция пополнения лент из очереди.
+
+    :param batch_size: Количество лент, захватываемых за раз.
+    :return: Количество пополненных лент и добавленных записей.
+    """
+
+    count_feeds = count_entries = 0
+    while True:
+        owner_pks = claim_stale_feeds(batch_size)
+        if not owner_pks:
+            break
+
+        for profile in Profile.objects.filter(pk__in=owner_pks) \
+                .order_by('pk'):
+            count_added = refill_feed(profile)
+            if count_added:
+                count_feeds += 1
+                count_entries += count_added
+
+    return count_feeds, count_entries
+
+
+def refill_feeds(batch_size: int = 500,
+                 rebuild: bool = False) -> Tuple[int, int]:
+    """
+    Функция пополнения лент рекомендаций всех пользователей.
+
+    Профили обходятся пачками по первичному ключу. Нужна для первого
+    заполнения лент и после загрузки пользователей в обход сигналов,
+    в остальное время ленты пополняются из очереди.
+
+    :param batch_size: Количество профилей, загружаемых за раз.
+    :param rebuild:
+        Удалить неоцененные записи перед пополнением, чтобы
+        учесть изменившиеся координаты пользователей.
+    :return: Количество пополненных лент и добавленных записей.
+    """
+
+    counts_by_gender = {
+        f'count_active_{gender}': Count(
+            'feed_entries',
+            filter=Q(feed_entries__liked_at__isnull=True,
+                     feed_entries__candidate__gender=gender),
+        )
+        for gender in Profile.Gender.values
+    }
+
+    count_feeds = count_entries = 0
+    last_pk = 0
+    while True:
+        profiles = list(
+            Profile.objects.filter(pk__gt=last_pk).order_by('pk')
+            .annotate(**counts_by_gender)[:batch_size]
+        )
+        if not profiles:
+            break
+        last_pk = profiles[-1].pk
+
+        if rebuild:
+            FeedEntry.objects.filter(owner__in=profiles,
+                                     liked_at__isnull=True).delete()
+        for profile in profiles:
+            counts_active = {} if rebuild else {
+                gender: getattr(profile, f'count_active_{gender}')
+                for gender in Profile.Gender.values
+            }
+            count_added = refill_feed(profile, counts_active)
+            if count_added:
+                count_feeds += 1
+                count_entries += count_added
+
+    return count_feeds, count_entries
@@ -0,0 +1,310 @@
+from math import (
+    radians, degrees,
+    asin, sin, cos,
+    atan2, sqrt,
+    pi,
+)
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.db.models import (
+    Expression,
+    F,
+)
+from django.db.models.functions import (
+    ATan2,
+    Sin, Cos,
+    Sqrt, Power,
+)
+
+
+# Радиус Земли в километрах.
+EARTH_RADIUS = 6372
+
+# Прямоугольник координат: (мин. широта, макс. широта,
+# мин. долгота, макс. долгота) в градусах.
+BoundingBox = Tuple[float, float, float, float]
+
+
+def great_circle_distance(latitude_1: float, longitude_1: float,
+                          latitude_2: float, longitude_2: float) -> float:
+    """
+    Функция вычисления расстояния между двумя точками на поверхности Земли.
+
+    Используется та же формула, что и в haversine_expression.
+
+    :return: Расстояние в километрах.
+    """
+
+    lat_1, lat_2 = radians(latitude_1), radians(latitude_2)
+    delta_lon = radians(longitude_2) - radians(longitude_1)
+
+    return atan2(
+        sqrt(
+            (cos(lat_2) * sin(delta_lon)) ** 2 +
+            (cos(lat_1) * sin(lat_2) -
+             sin(lat_1) * cos(lat_2) * cos(delta_lon)) ** 2
+        ),
+        sin(lat_1) * sin(lat_2) +
+        cos(lat_1) * cos(lat_2) * cos(delta_lon)
+    ) * EARTH_RADIUS
+
+
+def chord_length(distance: float) -> Optional[float]:
+    """
+    Функция перевода расстояния по поверхности Земли в длину хорды
+    единичной сферы между теми же точками.
+
+    :param distance: Расстояние в километрах.
+    :return:
+        Длина хорды или None, если расстояние не меньше
+        половины окружности Земли и под него попадает вся сфера.
+    """
+
+    angle = max(distance, 0) / EARTH_RADIUS
+    if angle >= pi:
+        return None
+    return 2 * sin(angle / 2)
+
+
+def haversine_expression(latitude: float, longitude: float,
+                         prefix: str = '') -> Expression:
+    """
+    Функция построения выражения СУБД для расстояния до точки.
+
+    Т.к. сферическая теорема косинусов имеет проблемы с маленькими
+    расстояниями, используется формула гаверсинусов с модификацией
+    для антиподов. Синус и косинус широты и долгота в радианах
+    хранятся в профиле, а функции координат заданной точки
+    вычисляются один раз в python, поэтому для каждой записи СУБД
+    вычисляет только синус и косинус разницы долгот.
+
+    :param latitude: Широта точки в градусах.
+    :param longitude: Долгота точки в градусах.
+    :param prefix: Путь до профиля в запросе, например 'profile__'.
+    :return: Выражение для расстояния в километрах.
+    """
+
+    lat = radians(latitude)
+    lat_sin, lat_cos = sin(lat), cos(lat)
+
+    row_lat_sin = F(f'{prefix}lat_sin')
+    row_lat_cos = F(f'{prefix}lat_cos')
+    delta_lon = F(f'{prefix}lon_rad') - radians(longitude)
+
+    return ATan2(
+        Sqrt(
+            Power(row_lat_cos * Sin(delta_lon), 2) +
+            Power(lat_cos * row_lat_sin -
+                  lat_sin * row_lat_cos * Cos(delta_lon), 2)
+        ),
+        lat_sin * row_lat_sin +
+        lat_cos * row_lat_cos * Cos(delta_lon)
+    ) * EARTH_RADIUS
+
+
+def bounding_boxes(latitude: float, longitude: float,
+                   max_distance: float) -> Optional[List[BoundingBox]]:
+    """
+    Функция вычисления прямоугольников, покрывающих окружность
+    заданного радиуса на поверхности Земли.
+
+    Любая точка, удаленная от центра не больше, чем на max_distance,
+    гарантированно попадает хотя бы в один из прямоугольников, поэтому
+    их можно использовать как индексируемый предварительный фильтр
+    перед точным вычислением расстояния.
+
+    Если окружность пересекает линию смены дат, она покрывается двумя
+    прямоугольниками. Если окружность накрывает полюс, прямоугольник
+    захватывает все долготы.
+
+    :param latitude: Широта центра в градусах.
+    :param longitude: Долгота центра в градусах.
+    :param max_distance: Радиус окружности в километрах.
+    :return:
+        Список прямоугольников или None, если ограничить область
+        поиска невозможно (окружность покрывает всю планету
+        или координаты центра некорректны).
+    """
+
+    if max_distance < 0:
+        return []
+    if not -90 <= latitude <= 90:
+        return None
+
+    # Угловой радиус окружности.
+    angular_distance = max_distance / EARTH_RADIUS
+    if angular_distance >= pi:
+        return None
+
+    lat = radians(latitude)
+    lon = radians(longitude)
+    lat_min = lat - angular_distance
+    lat_max = lat + angular_distance
+
+    # Окружность накрывает один из полюсов - подходят все долготы.
+    if lat_min <= -pi / 2 or lat_max >= pi / 2:
+        return [(
+            degrees(max(lat_min, -pi / 2)),
+            degrees(min(lat_max, pi / 2)),
+            -180.0,
+            180.0,
+        )]
+
+    delta_lon = asin(sin(angular_distance) / cos(lat))
+    lat_min, lat_max = degrees(lat_min), degrees(lat_max)
+    lon_min = degrees(lon - delta_lon)
+    lon_max = degrees(lon + delta_lon)
+
+    # Разбиваем прямоугольник на два, если он пересекает линию смены дат.
+    if lon_min < -180:
+        return [
+            (lat_min, lat_max, lon_min + 360, 180.0),
+            (lat_min, lat_max, -180.0, lon_max),
+        ]
+    if lon_max > 180:
+        return [
+            (lat_min, lat_max, lon_min, 180.0),
+            (lat_min, lat_max, -180.0, lon_max - 360),
+        ]
+
+    return [(lat_min, lat_max, lon_min, lon_max)]
+
+
+# Алфавит base32, используемый в геохешах.
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Точности геохешей, хранящихся в профиле пользователя.
+# Размеры ячеек на экваторе: 3 - ~156x156 км, 4 - ~39x20 км, 5 - ~5x5 км.
+GEOHASH_PRECISIONS = (3, 4, 5)
+
+# Максимальное количество ячеек, которым может быть
+# покрыта окружность при поиске пользователей.
+MAX_COVERING_CELLS = 32
+
+
+def geohash_encode(latitude: float, longitude: float,
+                   precision: int) -> str:
+    """
+    Функция вычисления геохеша точки.
+
+    :param latitude: Широта точки в градусах.
+    :param longitude: Долгота точки в градусах.
+    :param precision: Количество символов геохеша.
+    :return: Строка геохеша заданной длины.
+    """
+
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    # Биты долготы и широты чередуются, начиная с долготы.
+    is_lon = True
+    bit = 0
+    char_index = 0
+
+    while len(geohash) < precision:
+        if is_lon:
+            value, value_range = longitude, lon_range
+        else:
+            value, value_range = latitude, lat_range
+
+        middle = (value_range[0] + value_range[1]) / 2
+        char_index <<= 1
+        if value >= middle:
+            char_index |= 1
+            value_range[0] = middle
+        else:
+            value_range[1] = middle
+
+        is_lon = not is_lon
+        bit += 1
+        if bit == 5:
+            geohash.append(GEOHASH_ALPHABET[char_index])
+            bit = 0
+            char_index = 0
+
+    return ''.join(geohash)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """
+    Функция вычисления размеров ячейки геохеша.
+
+    :param precision: Количество символов геохеша.
+    :return: Высота и ширина ячейки в градусах.
+    """
+
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+
+    return 180 / 2 ** lat_bits, 360 / 2 ** lon_bits
+
+
+def covering_geohashes(boxes: List[BoundingBox], precision: int,
+                       max_cells: int = MAX_COVERING_CELLS
+                       ) -> Optional[List[str]]:
+    """
+    Функция вычисления ячеек геохеша, покрывающих прямоугольники.
+
+    :param boxes: Прямоугольники координат.
+    :param precision: Точность геохешей.
+    :param max_cells: Максимально допустимое количество ячеек.
+    :return:
+        Список геохешей или None, если для покрытия
+        понадобилось бы больше max_cells ячеек.
+    """
+
+    cell_height, cell_width = geohash_cell_size(precision)
+    lat_cells = round(180 / cell_height)
+    lon_cells = round(360 / cell_width)
+
+    # Сначала считаем диапазоны индексов ячеек,
+    # чтобы не перебирать их при слишком большом покрытии.
+    ranges = []
+    count_cells = 0
+    for lat_min, lat_max, lon_min, lon_max in boxes:
+        lat_from = max(int((lat_min + 90) // cell_height), 0)
+        lat_to = min(int((lat_max + 90) // cell_height), lat_cells - 1)
+        lon_from = max(int((lon_min + 180) // cell_width), 0)
+        lon_to = min(int((lon_max + 180) // cell_width), lon_cells - 1)
+        ranges.append((lat_from, lat_to, lon_from, lon_to))
+        count_cells += (lat_to - lat_from + 1) * (lon_to - lon_from + 1)
+        if count_cells > max_cells:
+            return None
+
+    # Геохеш ячейки вычисляем по координатам ее центра.
+    cells = set()
+    for lat_from, lat_to, lon_from, lon_to in ranges:
+        for lat_index in range(lat_from, lat_to + 1):
+            for lon_index in range(lon_from, lon_to + 1):
+                cells.add(geohash_encode(
+                    (lat_index + 0.5) * cell_height - 90,
+                    (lon_index + 0.5) * cell_width - 180,
+                    precision,
+                ))
+
+    return sorted(cells)
+
+
+def choose_covering_geohashes(boxes: List[BoundingBox]
+                              ) -> Optional[Tuple[int, List[str]]]:
+    """
+    Функция выбора наиболее точного покрытия прямоугольников
+    ячейками геохеша среди хранящихся в профиле точностей.
+
+    :param boxes: Прямоугольники координат.
+    :return:
+        Точность и список геохешей или None, если прямоугольники
+        слишком велики для покрытия ячейками.
+    """
+
+    for precision in sorted(GEOHASH_PRECISIONS, reverse=True):
+        cells = covering_geohashes(boxes, precision)
+        if cells is not None:
+            return precision, cells
+
+    return None
@@ -0,0 +1,390 @@
+"""
+Поиск профилей по расстоянию в памяти процесса.
+
+Каждый процесс держит компактный снимок координат всех профилей
+в массивах NumPy и вычисляет расстояния до всех профилей за один
+векторный проход. Снимок обновляется по сигналам сохранения и удаления
+профилей в текущем процессе, а изменения из других процессов
+обнаруживаются периодической проверкой версии снимка в общем кэше.
+
+Расстояния считаются по той же формуле, что и haversine_expression,
+но их значения могут отличаться от вычисленных в СУБД на единицы
+последнего разряда. Поэтому отбираются профили с расстоянием не больше
+max_distance + DISTANCE_TOLERANCE, а точное условие затем проверяется
+в СУБД только для отобранных профилей. Так результат совпадает
+с поиском в СУБД.
+
+Для поиска ближайших профилей по снимку строятся k-d деревья
+(нужен пакет scipy) над точками единичной сферы. Деревья строятся
+при первом поиске после изменения снимка.
+"""
+
+import threading
+import time
+from math import (
+    cos,
+    radians,
+    sin,
+)
+from typing import (
+    List,
+    Optional,
+)
+
+from django.conf import settings
+
+from .cache import (
+    GEO_SNAPSHOT_VERSION_KEY,
+    get_version,
+    increment_version,
+)
+from .geo import (
+    EARTH_RADIUS,
+    chord_length,
+)
+from .models import Profile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+# Допустимое расхождение расстояний со значениями СУБД в километрах.
+DISTANCE_TOLERANCE = 1e-6
+
+# Коды гендеров в снимке.
+GENDER_CODES = {value: code for code, value
+                in enumerate(Profile.Gender.values)}
+
+# Поля профиля, от которых зависит снимок.
+SNAPSHOT_FIELDS = frozenset(('gender', 'latitude', 'longitude'))
+
+
+class GeoSnapshot:
+    """
+    Класс снимка координат профилей.
+
+    Для каждого профиля хранятся id, код гендера, синус и косинус
+    широты и долгота в радианах. Массивы хранятся плотно: при удалении
+    профиля на его место переносится последняя строка.
+    """
+
+    # Начальная емкость массивов.
+    initial_capacity = 1024
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._checked_at = 0.0
+        self._size = 0
+        self._rows = {}
+        self._trees = {}
+        self._allocate(self.initial_capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        """Метод выделения массивов заданной емкости"""
+
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._genders = np.zeros(capacity, dtype=np.int8)
+        self._lat_sin = np.zeros(capacity, dtype=np.float64)
+        self._lat_cos = np.ones(capacity, dtype=np.float64)
+        self._lon_rad = np.zeros(capacity, dtype=np.float64)
+
+    def _grow(self) -> None:
+        """Метод увеличения емкости массивов вдвое"""
+
+        arrays = (self._ids, self._genders, self._lat_sin,
+                  self._lat_cos, self._lon_rad)
+        self._allocate(len(self._ids) * 2)
+        for old, new in zip(arrays, (self._ids, self._genders, self._lat_sin,
+                                     self._lat_cos, self._lon_rad)):
+            new[:self._size] = old[:self._size]
+
+    def load(self) -> None:
+        """Метод полной загрузки снимка из БД"""
+
+        with self._lock:
+            # Версия читается до загрузки, чтобы изменения, сделанные
+            # во время загрузки, привели к повторной загрузке.
+            version = get_version(GEO_SNAPSHOT_VERSION_KEY)
+            rows = list(Profile.objects.values_list(
+                'pk', 'gender', 'lat_sin', 'lat_cos', 'lon_rad',
+            ).iterator(chunk_size=10000))
+
+            self._allocate(max(len(rows), self.initial_capacity))
+            self._size = len(rows)
+            self._rows = {}
+            for row, (pk, gender, lat_sin, lat_cos, lon_rad) \
+                    in enumerate(rows):
+                self._rows[pk] = row
+                self._ids[row] = pk
+                self._genders[row] = GENDER_CODES[gender]
+                self._lat_sin[row] = lat_sin
+                self._lat_cos[row] = lat_cos
+                self._lon_rad[row] = lon_rad
+
+            self._trees = {}
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._loaded = True
+
+    def ensure_fresh(self) -> None:
+        """
+        Метод проверки актуальности снимка.
+
+        Снимок загружается при первом обращении, а затем перезагружается,
+        если версия в кэше изменилась в другом процессе. Версия
+        проверяется не чаще, чем раз в GEO_ENGINE_REFRESH_INTERVAL секунд.
+        """
+
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return
+
+            now = time.monotonic()
+            if now - self._checked_at < settings.GEO_ENGINE_REFRESH_INTERVAL:
+                return
+            self._checked_at = now
+            if get_version(GEO_SNAPSHOT_VERSION_KEY) != self._version:
+                self.load()
+
+    def _bump_version(self) -> None:
+        """
+        Метод увеличения версии снимка после изменения в текущем процессе.
+
+        Если до изменения снимок был актуален, он остается актуальным
+        и после него, поэтому перезагрузка не нужна.
+        """
+
+        version = increment_version(GEO_SNAPSHOT_VERSION_KEY)
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+
+    def update(self, profile: Profile) -> None:
+        """Метод добавления или обновления профиля в снимке"""
+
+        with self._lock:
+            if self._loaded:
+                row = self._rows.get(profile.pk)
+                if row is None:
+                    if self._size == len(self._ids):
+                        self._grow()
+                    row = self._size
+                    self._size += 1
+                    self._rows[profile.pk] = row
+                    self._ids[row] = profile.pk
+                self._genders[row] = GENDER_CODES[profile.gender]
+                self._lat_sin[row] = profile.lat_sin
+                self._lat_cos[row] = profile.lat_cos
+                self._lon_rad[row] = profile.lon_rad
+                self._trees = {}
+            self._bump_version()
+
+    def remove(self, profile_pk: int) -> None:
+        """Метод удаления профиля из снимка"""
+
+        with self._lock:
+            row = self._rows.pop(profile_pk, None) \
+                if self._loaded else None
+            if row is not None:
+                last = self._size - 1
+                if row != last:
+                    for array in (self._ids, self._genders, self._lat_sin,
+                                  self._lat_cos, self._lon_rad):
+                        array[row] = array[last]
+                    self._rows[int(self._ids[row])] = row
+                self._size = last
+                self._trees = {}
+            self._bump_version()
+
+    def find_within(self, latitude: float, longitude: float,
+                    max_distance: float, gender: Optional[str] = None,
+                    limit: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Метод поиска профилей в пределах заданного расстояния.
+
+        :param latitude: Широта точки отсчета в градусах.
+        :param longitude: Долгота точки отсчета в градусах.
+        :param max_distance: Максимальное расстояние в километрах.
+        :param gender: Гендер, если нужны профили только этого гендера.
+        :param limit: Максимальное количество найденных профилей.
+        :return:
+            Id профилей, отсортированные по расстоянию и id,
+            или None, если профилей найдено больше limit.
+        """
+
+        self.ensure_fresh()
+
+        lat = radians(latitude)
+        sin_lat, cos_lat = sin(lat), cos(lat)
+        with self._lock:
+            size = self._size
+            ids = self._ids[:size]
+            lat_sin = self._lat_sin[:size]
+            lat_cos = self._lat_cos[:size]
+            delta_lon = self._lon_rad[:size] - radians(longitude)
+
+            cos_delta_lon = np.cos(delta_lon)
+            distances = np.arctan2(
+                np.hypot(
+                    lat_cos * np.sin(delta_lon),
+                    cos_lat * lat_sin - sin_lat * lat_cos * cos_delta_lon,
+                ),
+                sin_lat * lat_sin + cos_lat * lat_cos * cos_delta_lon,
+            ) * EARTH_RADIUS
+
+            mask = distances <= max_distance + DISTANCE_TOLERANCE
+            if gender is not None:
+                mask &= self._genders[:size] == GENDER_CODES[gender]
+            ids, distances = ids[mask], distances[mask]
+
+        if limit is not None and len(ids) > limit:
+            return None
+        order = np.lexsort((ids, distances))
+        return ids[order].tolist()
+
+    def _get_tree(self, gender: Optional[str]) -> tuple:
+        """
+        Метод получения k-d дерева точек профилей заданного гендера.
+
+        :return: Дерево и id профилей в порядке точек дерева.
+        """
+
+        key = None if gender is None else GENDER_CODES[gender]
+        if key not in self._trees:
+            size = self._size
+            ids = self._ids[:size]
+            lat_sin = self._lat_sin[:size]
+            lat_cos = self._lat_cos[:size]
+            lon_rad = self._lon_rad[:size]
+            if key is not None:
+                mask = self._genders[:size] == key
+                ids, lat_sin, lat_cos, lon_rad = \
+                    ids[mask], lat_sin[mask], lat_cos[mask], lon_rad[mask]
+
+            points = np.column_stack((lat_cos * np.cos(lon_rad),
+                                      lat_cos * np.sin(lon_rad),
+                                      lat_sin))
+            self._trees[key] = cKDTree(points), ids.copy()
+
+        return self._trees[key]
+
+    def find_nearest(self, latitude: float, longitude: float, count: int,
+                     gender: Optional[str] = None,
+                     exclude: Optional[int] = None,
+                     max_distance: Optional[float] = None) -> List[int]:
+        """
+        Метод поиска ближайших профилей.
+
+        Расстояние между точками единичной сферы (длина хорды) растет
+        вместе с расстоянием по поверхности, поэтому ближайшие по хорде
+        профили - ближайшие и по поверхности Земли.
+
+        :param latitude: Широта точки отсчета в градусах.
+        :param longitude: Долгота точки отсчета в градусах.
+        :param count: Количество профилей.
+        :param gender: Гендер, если нужны профили только этого гендера.
+        :param exclude: Id профиля, который не нужно включать в результат.
+        :param max_distance: Максимальное расстояние в километрах.
+        :return: Id профилей, отсортированные по расстоянию.
+        """
+
+        self.ensure_fresh()
+
+        lat, lon = radians(latitude), radians(longitude)
+        point = (cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat))
+        upper_bound = np.inf
+        if max_distance is not None:
+            chord = chord_length(max_distance + DISTANCE_TOLERANCE)
+            if chord is not None:
+                upper_bound = chord
+
+        with self._lock:
+            tree, ids = self._get_tree(gender)
+        if tree.n == 0:
+            return []
+
+        # Исключаемый профиль может оказаться среди ближайших.
+        neighbours = min(count + (exclude is not None), tree.n)
+        distances, indexes = tree.query(point, k=[*range(1, neighbours + 1)],
+                                        distance_upper_bound=upper_bound)
+        found = ids[indexes[np.isfinite(distances)]].tolist()
+        if exclude is not None and exclude in found:
+            found.remove(exclude)
+
+        return found[:count]
+
+
+# Снимок координат текущего процесса.
+snapshot = GeoSnapshot() if np is not None else None
+
+
+def is_enabled() -> bool:
+    """Функция проверки, включен ли поиск по расстоянию в памяти"""
+
+    return snapshot is not None and settings.GEO_ENGINE == 'numpy'
+
+
+def find_profiles_within(latitude: float, longitude: float,
+                         max_distance: float,
+                         gender: Optional[str] = None) -> Optional[List[int]]:
+    """
+    Функция поиска профилей в пределах заданного расстояния.
+
+    :return:
+        Id профилей, отсортированные по расстоянию, или None, если
+        поиск в памяти выключен или найдено слишком много профилей.
+    """
+
+    if not is_enabled():
+        return None
+
+    return snapshot.find_within(latitude, longitude, max_distance,
+                                gender, limit=settings.GEO_ENGINE_MAX_IDS)
+
+
+def find_nearest_profiles(latitude: float, longitude: float, count: int,
+                          gender: Optional[str] = None,
+                          exclude: Optional[int] = None,
+                          max_distance: Optional[float] = None
+                          ) -> Optional[List[int]]:
+    """
+    Функция поиска ближайших профилей.
+
+    :return:
+        Id профилей, отсортированные по расстоянию, или None,
+        если поиск в памяти выключен или не установлен пакет scipy.
+    """
+
+    if not is_enabled() or cKDTree is None:
+        return None
+
+    return snapshot.find_nearest(latitude, longitude, count, gender,
+                                 exclude, max_distance)
+
+
+def profile_saved(profile: Profile,
+                  update_fields: Optional[frozenset] = None) -> None:
+    """Функция обновления снимка после сохранения профиля"""
+
+    if not is_enabled():
+        return
+    if update_fields is not None and not SNAPSHOT_FIELDS & update_fields:
+        return
+
+    snapshot.update(profile)
+
+
+def profile_deleted(profile_pk: int) -> None:
+    """Функция обновления снимка после удаления профиля"""
+
+    if is_enabled():
+        snapshot.remove(profile_pk)
@@ -0,0 +1,94 @@
+import csv
+import json
+from typing import (
+    IO,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+import django
+from django.contrib.auth.hashers import make_password
+
+
+# Поля строки импорта, которые относятся к профилю.
+PROFILE_FIELDS = ('gender', 'latitude', 'longitude')
+
+
+def read_rows(file: IO[str], file_format: str
+              ) -> Iterator[Tuple[Optional[dict], Optional[str]]]:
+    """
+    Генератор строк файла импорта пользователей.
+
+    Файл читается построчно, поэтому потребление памяти
+    не зависит от его размера. Строка, которую не удалось
+    разобрать, не прерывает чтение файла.
+
+    :param file: Открытый текстовый файл.
+    :param file_format: Формат файла: 'csv' или 'jsonl'.
+    :return:
+        Пары (словарь с данными пользователя, None) или
+        (None, причина ошибки) для неразобранных строк.
+    """
+
+    if file_format == 'csv':
+        for row in csv.DictReader(file):
+            yield row, None
+        return
+
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield None, f'Неверный JSON: {error}'
+            continue
+        if not isinstance(row, dict):
+            yield None, 'Ожидается JSON-объект.'
+            continue
+        yield row, None
+
+
+def make_registration_data(row: dict) -> dict:
+    """
+    Функция приведения строки импорта к данным регистрации.
+
+    Поля профиля могут быть переданы как вложенным объектом
+    profile, так и на верхнем уровне строки.
+    """
+
+    data = {name: value for name, value in row.items()
+            if name not in PROFILE_FIELDS and value not in (None, '')}
+    profile = row.get('profile')
+    if profile is None:
+        profile = {}
+    elif not isinstance(profile, dict):
+        # Значение другого типа отклонит сериализатор.
+        data['profile'] = profile
+        return data
+    profile = dict(profile)
+    for name in PROFILE_FIELDS:
+        if name in row:
+            profile[name] = row[name]
+    data['profile'] = profile
+
+    return data
+
+
+def init_hashing_worker() -> None:
+    """
+    Функция инициализации процесса хэширования паролей.
+
+    Нужна, когда процессы запускаются заново, а не копируются
+    из родительского процесса: хэшеры паролей берутся из настроек.
+    """
+
+    django.setup()
+
+
+def hash_password(password: str) -> str:
+    """Функция хэширования пароля в процессе хэширования"""
+
+    return make_password(password)
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from clients.cache import invalidate_user_lists
+from clients.models import Profile
+
+
+class Command(BaseCommand):
+    """Команда пересчета геохешей для уже существующих профилей"""
+
+    help = 'Пересчитывает геохеши в профилях пользователей.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество профилей, обновляемых за один запрос.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать геохеши всех профилей, '
+                 'а не только незаполненные.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        batch_size = options['batch_size']
+
+        queryset = Profile.objects.only('id', 'latitude', 'longitude')
+        if not options['all']:
+            queryset = queryset.filter(geohash_5='')
+
+        # Идем по профилям в порядке первичного ключа, чтобы
+        # каждая пачка обновлялась в отдельной короткой транзакции.
+        count_updated = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)
+                         .order_by('pk')[:batch_size])
+            if not batch:
+                break
+
+            for profile in batch:
+                profile.refresh_spatial_fields()
+            with transaction.atomic():
+                Profile.objects.bulk_update(batch, Profile.SPATIAL_FIELDS)
+
+            last_pk = batch[-1].pk
+            count_updated += len(batch)
+            self.stdout.write(f'Обновлено профилей: {count_updated}')
+
+        # bulk_update не отправляет сигналы, а от геохешей зависят
+        # ключи закэшированных списков, поэтому они сбрасываются вручную.
+        if count_updated:
+            invalidate_user_lists()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Всего обновлено профилей: {count_updated}.'
+        ))
@@ -0,0 +1,138 @@
+import random
+import time
+from typing import Callable
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import (
+    Expression,
+    F,
+)
+from django.db.models.functions import (
+    Sin, Cos, ATan2,
+    Abs, Sqrt, Power,
+    Radians,
+)
+
+from clients.geo import (
+    EARTH_RADIUS,
+    haversine_expression,
+)
+from clients.models import Profile
+
+
+def legacy_haversine_expression(lat: float, lon: float) -> Expression:
+    """
+    Функция построения прежнего выражения для расстояния,
+    в котором все тригонометрические функции считаются по координатам
+    каждой записи. Нужна только для сравнения.
+    """
+
+    return ATan2(
+        Sqrt(
+            Power(
+                Cos(Radians(F('latitude'))) *
+                Sin(Abs(Radians(lon) - Radians(F('longitude')))), 2
+            ) +
+            Power(
+                Cos(Radians(lat)) * Sin(Radians(F('latitude'))) -
+                Sin(Radians(lat)) * Cos(Radians(F('latitude'))) *
+                Cos(Abs(Radians(lon) - Radians(F('longitude')))), 2
+            )
+        ),
+        (
+            Sin(Radians(lat)) * Sin(Radians(F('latitude'))) +
+            Cos(Radians(lat)) * Cos(Radians(F('latitude'))) *
+            Cos(Abs(Radians(lon) - Radians(F('longitude'))))
+        )
+    ) * EARTH_RADIUS
+
+
+class Command(BaseCommand):
+    """Команда сравнения скорости вычисления расстояний в СУБД"""
+
+    help = 'Сравнивает время вычисления расстояния до пользователей ' \
+           'по координатам и по заранее вычисленным функциям координат. ' \
+           'Тестовые профили создаются в транзакции, которая затем ' \
+           'откатывается.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=100000,
+            help='Количество тестовых профилей.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        rows, repeat = options['rows'], options['repeat']
+        with transaction.atomic():
+            self.create_profiles(rows)
+
+            lat, lon = 55.75, 37.6
+            legacy = self.measure(
+                lambda: legacy_haversine_expression(lat, lon), repeat,
+            )
+            precomputed = self.measure(
+                lambda: haversine_expression(lat, lon), repeat,
+            )
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'Строк: {rows}\n'
+            f'По координатам: {legacy * 1e6 / rows:.3f} мкс/строка\n'
+            f'По заранее вычисленным функциям: '
+            f'{precomputed * 1e6 / rows:.3f} мкс/строка\n'
+            f'Ускорение: {legacy / precomputed:.2f}x'
+        )
+
+    @staticmethod
+    def create_profiles(rows: int) -> None:
+        """Метод создания тестовых профилей со случайными координатами"""
+
+        users = User.objects.bulk_create([
+            User(username=f'benchmark_distance_{i}') for i in range(rows)
+        ], batch_size=1000)
+        users = User.objects.filter(
+            username__in=[user.username for user in users],
+        ) if users[0].pk is None else users
+
+        profiles = []
+        for user in users:
+            profile = Profile(
+                user=user,
+                gender=random.choice(Profile.Gender.values),
+                latitude=random.uniform(-90, 90),
+                longitude=random.uniform(-180, 180),
+            )
+            profile.refresh_spatial_fields()
+            profiles.append(profile)
+        Profile.objects.bulk_create(profiles, batch_size=1000)
+
+    @staticmethod
+    def measure(make_expression: Callable[[], Expression],
+                repeat: int) -> float:
+        """
+        Метод замера времени вычисления расстояния для всех профилей.
+
+        :return: Лучшее время среди повторов в секундах.
+        """
+
+        best = float('inf')
+        for _ in range(repeat):
+            queryset = Profile.objects.annotate(
+                distance=make_expression(),
+            ).values_list('distance', flat=True)
+            start = time.perf_counter()
+            list(queryset.iterator(chunk_size=10000))
+            best = min(best, time.perf_counter() - start)
+
+        return best
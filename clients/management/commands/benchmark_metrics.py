@@ -0,0 +1,115 @@
+import json
+import time
+from typing import (
+    Dict,
+    List,
+)
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.test import Client
+from django.test.utils import override_settings
+
+from clients.metrics import (
+    MetricsMiddleware,
+    registry,
+)
+from clients.benchmarks import summarize_latencies
+
+
+METRICS_MIDDLEWARE = f'{MetricsMiddleware.__module__}.{MetricsMiddleware.__name__}'
+
+
+class Command(BaseCommand):
+    """Команда измерения накладных расходов сбора метрик"""
+
+    help = 'Выполняет одни и те же запросы через обработчик Django ' \
+           'со сбором метрик и без него, чередуя варианты, и выводит ' \
+           'в формате JSON время ответа и разницу между вариантами.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--path',
+            default='/api/list/',
+            help='Адрес, на который отправляются запросы.',
+        )
+        parser.add_argument(
+            '--username',
+            help='Пользователь, от имени которого отправляются запросы.',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=1000,
+            help='Количество запросов в каждом варианте.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=50,
+            help='Количество запросов для прогрева перед замером.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        user = None
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {options["username"]} не найден.'
+                )
+
+        middleware = [name for name in settings.MIDDLEWARE
+                      if name != METRICS_MIDDLEWARE]
+        variants = {
+            'without_metrics': middleware,
+            'with_metrics': [METRICS_MIDDLEWARE, *middleware],
+        }
+
+        # Обработчик клиента загружает промежуточные слои при первом
+        # запросе, поэтому каждый клиент прогревается со своим списком.
+        clients: Dict[str, Client] = {}
+        for name, variant in variants.items():
+            with override_settings(MIDDLEWARE=variant,
+                                   ALLOWED_HOSTS=['testserver']):
+                client = clients[name] = Client()
+                if user is not None:
+                    client.force_login(user)
+                for _ in range(options['warmup']):
+                    client.get(options['path'])
+
+        # Варианты чередуются, чтобы фоновые колебания нагрузки
+        # одинаково влияли на оба.
+        latencies: Dict[str, List[float]] = {name: [] for name in clients}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for _ in range(options['requests']):
+                for name, client in clients.items():
+                    start = time.perf_counter()
+                    response = client.get(options['path'])
+                    latency = time.perf_counter() - start
+                    latencies[name].append(
+                        latency if response.status_code < 500 else None
+                    )
+        registry.reset()
+
+        report = {
+            name: summarize_latencies(values, sum(filter(None, values)))
+            for name, values in latencies.items()
+        }
+        # Если все запросы одного из вариантов завершились ошибкой,
+        # среднего времени у него нет.
+        if all('mean_ms' in report[name]
+               for name in ('with_metrics', 'without_metrics')):
+            overhead = report['with_metrics']['mean_ms'] - \
+                report['without_metrics']['mean_ms']
+            report['overhead'] = {
+                'mean_ms': round(overhead, 3),
+                'percent': round(
+                    overhead / report['without_metrics']['mean_ms'] * 100, 2
+                ),
+            }
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
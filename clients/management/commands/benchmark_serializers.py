@@ -0,0 +1,124 @@
+import json
+import random
+import time
+from typing import Callable
+
+from django.contrib.auth.models import User
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import transaction
+from django.db.models import QuerySet
+from rest_framework.renderers import JSONRenderer
+
+from api.clients.serializers import (
+    UserRowSerializer,
+    UserSerializer,
+)
+from clients.geo import haversine_expression
+from clients.models import Profile
+
+
+class Command(BaseCommand):
+    """Команда сравнения скорости сериализаторов списков пользователей"""
+
+    help = 'Сравнивает время построения JSON списка пользователей ' \
+           'через UserSerializer и через UserRowSerializer, включая ' \
+           'запрос к БД. Тестовые пользователи создаются в транзакции, ' \
+           'которая затем откатывается.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[1000, 10000],
+            help='Количества сериализуемых пользователей.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        count_rows = max(options['rows'])
+        report = {}
+        with transaction.atomic():
+            self.create_users(count_rows)
+            for rows in options['rows']:
+                queryset = User.objects.select_related('profile').annotate(
+                    distance_to_user=haversine_expression(55.75, 37.62,
+                                                          'profile__'),
+                ).filter(username__startswith='serializer_benchmark_') \
+                    .order_by('pk')[:rows]
+                report[rows] = self.compare(queryset, options['repeat'])
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def create_users(self, count: int) -> None:
+        """Метод создания тестовых пользователей с профилями"""
+
+        User.objects.bulk_create([
+            User(username=f'serializer_benchmark_{i}',
+                 email=f'serializer_benchmark_{i}@example.com',
+                 first_name=f'Name{i}', last_name=f'Surname{i}')
+            for i in range(count)
+        ], batch_size=5000)
+        profiles = []
+        for i, user in enumerate(User.objects.filter(
+            username__startswith='serializer_benchmark_',
+        ).only('pk')):
+            profile = Profile(
+                user=user,
+                gender=random.choice(Profile.Gender.values),
+                latitude=random.uniform(-90, 90),
+                longitude=random.uniform(-180, 180),
+            )
+            # У части пользователей есть обработанный аватар.
+            if i % 2:
+                profile.avatar = f'user_avatars/photo_{i}.png'
+                profile.avatar_status = Profile.AvatarStatus.READY
+            profile.refresh_spatial_fields()
+            profiles.append(profile)
+        Profile.objects.bulk_create(profiles, batch_size=5000)
+
+    def compare(self, queryset: QuerySet, repeat: int) -> dict:
+        """Метод замера обоих сериализаторов на одном наборе записей"""
+
+        renderer = JSONRenderer()
+
+        def render_serializer() -> bytes:
+            return renderer.render(UserSerializer(queryset.all(),
+                                                  many=True).data)
+
+        def render_rows() -> bytes:
+            serializer = UserRowSerializer()
+            return renderer.render(serializer.serialize(
+                serializer.get_values(queryset.all())
+            ))
+
+        if render_serializer() != render_rows():
+            raise CommandError('Результаты сериализаторов отличаются.')
+
+        serializer_ms = self.measure(render_serializer, repeat)
+        rows_ms = self.measure(render_rows, repeat)
+        return {
+            'user_serializer_ms': serializer_ms,
+            'user_row_serializer_ms': rows_ms,
+            'speedup': round(serializer_ms / rows_ms, 1),
+        }
+
+    @staticmethod
+    def measure(function: Callable[[], bytes], repeat: int) -> float:
+        """Метод получения лучшего времени выполнения функции в мс"""
+
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return round(min(timings) * 1000, 2)
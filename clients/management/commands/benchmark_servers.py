@@ -0,0 +1,182 @@
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from rest_framework_simplejwt.tokens import AccessToken
+
+from clients.benchmarks import summarize_latencies
+
+
+# Команды запуска серверов для сравнения.
+SERVERS = {
+    'wsgi': ('gunicorn', 'date_me_please.wsgi:application'),
+    'asgi': ('gunicorn', 'date_me_please.asgi:application',
+             '-k', 'uvicorn.workers.UvicornWorker'),
+}
+
+
+class Command(BaseCommand):
+    """Команда сравнения WSGI и ASGI серверов под медленными клиентами"""
+
+    help = 'Запускает проект под WSGI (gunicorn) и под ASGI ' \
+           '(gunicorn с uvicorn) и измеряет время ответа при большом ' \
+           'количестве одновременных медленных клиентов.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--path',
+            default='/api/list/',
+            help='Адрес запрашиваемой страницы.',
+        )
+        parser.add_argument(
+            '--username',
+            help='Пользователь, от имени которого отправляются запросы. '
+                 'По умолчанию - первый пользователь в БД.',
+        )
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=100,
+            help='Количество одновременных клиентов.',
+        )
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=0.5,
+            help='Время в секундах, за которое клиент передает запрос.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Количество процессов сервера.',
+        )
+        parser.add_argument(
+            '--servers',
+            nargs='+',
+            choices=tuple(SERVERS),
+            default=tuple(SERVERS),
+            help='Сравниваемые серверы.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        user = User.objects.order_by('pk')
+        if options['username']:
+            user = user.filter(username=options['username'])
+        user = user.first()
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        token = str(AccessToken.for_user(user))
+
+        results = {}
+        for server in options['servers']:
+            port = self.get_free_port()
+            process = self.start_server(server, port, options['workers'])
+            try:
+                # Прогрев: процессы сервера загружают проект
+                # только после открытия порта.
+                asyncio.run(self.run_clients(
+                    port, options['path'], token, options['workers'] * 2, 0,
+                ))
+                latencies, elapsed = asyncio.run(self.run_clients(
+                    port, options['path'], token,
+                    options['clients'], options['client_delay'],
+                ))
+            finally:
+                process.terminate()
+                process.wait()
+            results[server] = summarize_latencies(latencies, elapsed)
+
+        self.stdout.write(json.dumps(results, indent=2))
+
+    @staticmethod
+    def get_free_port() -> int:
+        """Метод получения свободного порта"""
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    @staticmethod
+    def start_server(server: str, port: int,
+                     workers: int) -> subprocess.Popen:
+        """Метод запуска сервера и ожидания его готовности"""
+
+        process = subprocess.Popen(
+            (sys.executable, '-m', *SERVERS[server],
+             '--bind', f'127.0.0.1:{port}', '--workers', str(workers)),
+            cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f'Сервер {server} не запустился.')
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+
+        process.terminate()
+        raise CommandError(f'Сервер {server} не запустился.')
+
+    async def run_clients(self, port: int, path: str, token: str,
+                          clients: int, client_delay: float) -> tuple:
+        """
+        Метод одновременного запуска медленных клиентов.
+
+        :return: Время ответа каждого клиента и общее время в секундах.
+        """
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(
+            self.slow_request(port, path, token, client_delay)
+            for _ in range(clients)
+        ))
+        return latencies, time.perf_counter() - start
+
+    @staticmethod
+    async def slow_request(port: int, path: str, token: str,
+                           client_delay: float) -> Optional[float]:
+        """
+        Метод отправки запроса медленным клиентом.
+
+        Клиент отправляет строку запроса, а заголовки - только через
+        client_delay секунд, как клиент на медленном соединении.
+
+        :return: Время ответа в секундах или None при ошибке.
+        """
+
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET {path} HTTP/1.1\r\n'.encode('ascii'))
+            await writer.drain()
+            await asyncio.sleep(client_delay)
+            writer.write(
+                f'Host: 127.0.0.1:{port}\r\n'
+                f'Authorization: Bearer {token}\r\n'
+                f'Connection: close\r\n\r\n'.encode('ascii')
+            )
+            await writer.drain()
+            status_line = await reader.readline()
+            await reader.read()
+            writer.close()
+        except OSError:
+            return None
+
+        if b' 200 ' not in status_line:
+            return None
+        return time.perf_counter() - start
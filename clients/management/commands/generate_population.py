@@ -0,0 +1,240 @@
+import random
+from typing import (
+    Dict,
+    List,
+)
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import transaction
+
+from clients.feed import mark_feeds_stale
+from clients.models import (
+    Like,
+    Profile,
+)
+
+
+# Центры скоплений пользователей: (широта, долгота, вес).
+CITIES = (
+    (55.75, 37.62, 12),     # Москва
+    (59.94, 30.31, 5),      # Санкт-Петербург
+    (55.03, 82.92, 2),      # Новосибирск
+    (56.84, 60.61, 2),      # Екатеринбург
+    (55.79, 49.12, 2),      # Казань
+    (43.12, 131.89, 1),     # Владивосток
+    (64.73, 177.51, 1),     # Анадырь, у линии смены дат
+    (51.51, -0.13, 3),      # Лондон
+    (40.71, -74.01, 3),     # Нью-Йорк
+    (-33.87, 151.21, 1),    # Сидней
+)
+
+# Разброс координат вокруг центра скопления в градусах.
+CITY_SPREAD = 0.15
+
+# Доля пользователей, разбросанных по всей планете.
+SCATTERED_SHARE = 0.05
+
+
+class Command(BaseCommand):
+    """Команда генерации тестовой популяции пользователей"""
+
+    help = 'Создает пользователей с профилями, скоплениями координат ' \
+           'вокруг городов и графом оценок для нагрузочного тестирования.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=10000,
+            help='Количество создаваемых пользователей.',
+        )
+        parser.add_argument(
+            '--likes-per-user',
+            type=float,
+            default=20,
+            help='Среднее количество оценок, которые ставит пользователь.',
+        )
+        parser.add_argument(
+            '--local-likes-share',
+            type=float,
+            default=0.8,
+            help='Доля оценок пользователям из того же города.',
+        )
+        parser.add_argument(
+            '--male-share',
+            type=float,
+            default=0.5,
+            help='Доля мужчин.',
+        )
+        parser.add_argument(
+            '--password',
+            default='population',
+            help='Пароль всех создаваемых пользователей.',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='population',
+            help='Префикс имен создаваемых пользователей.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество записей, создаваемых за один запрос.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже существуют.'
+            )
+
+        # Пароль хэшируется один раз: хэширование
+        # для каждого пользователя заняло бы часы.
+        password = make_password(options['password'])
+
+        count_users = options['users']
+        profiles_by_city: Dict[int, List[int]] = {}
+        for start in range(0, count_users, self.batch_size):
+            stop = min(start + self.batch_size, count_users)
+            with transaction.atomic():
+                batch = self.create_users(prefix, password, start, stop,
+                                          options['male_share'])
+            for city, profile_pk in batch:
+                profiles_by_city.setdefault(city, []).append(profile_pk)
+            self.stdout.write(f'Создано пользователей: {stop}')
+
+        count_likes = self.create_likes(profiles_by_city,
+                                        options['likes_per_user'],
+                                        options['local_likes_share'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Создано пользователей: {count_users}, '
+            f'оценок: {count_likes}.'
+        ))
+
+    def create_users(self, prefix: str, password: str, start: int,
+                     stop: int, male_share: float) -> List[tuple]:
+        """
+        Метод создания пачки пользователей с профилями.
+
+        :return: Пары (номер города или -1, id профиля).
+        """
+
+        usernames = [f'{prefix}_{i}' for i in range(start, stop)]
+        User.objects.bulk_create([
+            User(username=username, email=f'{username}@example.com',
+                 first_name=f'Name{i}', last_name=f'Surname{i}',
+                 password=password)
+            for i, username in enumerate(usernames, start)
+        ], batch_size=self.batch_size)
+        # Не все СУБД возвращают первичные ключи из bulk_create.
+        user_pks = dict(User.objects.filter(username__in=usernames)
+                        .values_list('username', 'pk'))
+
+        # Пользователи обходятся в порядке имен, а не в порядке выдачи
+        # СУБД, чтобы при одном --seed получались одинаковые данные.
+        cities, profiles = [], []
+        for username in usernames:
+            city, latitude, longitude = self.make_location()
+            profile = Profile(
+                user_id=user_pks[username],
+                gender=Profile.Gender.MALE
+                if self.random.random() < male_share
+                else Profile.Gender.FEMALE,
+                latitude=latitude,
+                longitude=longitude,
+            )
+            profile.refresh_spatial_fields()
+            cities.append(city)
+            profiles.append(profile)
+        Profile.objects.bulk_create(profiles, batch_size=self.batch_size)
+
+        profile_pks = dict(Profile.objects.filter(
+            user__username__in=usernames,
+        ).values_list('user_id', 'pk'))
+        mark_feeds_stale(profile_pks.values())
+        return [(city, profile_pks[profile.user_id])
+                for city, profile in zip(cities, profiles)]
+
+    def make_location(self) -> tuple:
+        """
+        Метод выбора случайного места пользователя.
+
+        :return: Номер города (-1 вне городов), широта и долгота.
+        """
+
+        if self.random.random() < SCATTERED_SHARE:
+            return -1, self.random.uniform(-90, 90), \
+                self.random.uniform(-180, 180)
+
+        city = self.random.choices(range(len(CITIES)),
+                                   weights=[c[2] for c in CITIES])[0]
+        latitude, longitude, _ = CITIES[city]
+        latitude += self.random.gauss(0, CITY_SPREAD)
+        longitude += self.random.gauss(0, CITY_SPREAD)
+        # Координаты у полюсов и линии смены дат
+        # не должны выходить за допустимые пределы.
+        latitude = max(-90.0, min(90.0, latitude))
+        longitude = (longitude + 180) % 360 - 180
+
+        return city, latitude, longitude
+
+    def create_likes(self, profiles_by_city: Dict[int, List[int]],
+                     likes_per_user: float, local_share: float) -> int:
+        """
+        Метод создания графа оценок.
+
+        Большая часть оценок ставится пользователям из того же
+        города, остальные - случайным пользователям.
+
+        :return: Количество созданных оценок.
+        """
+
+        all_profiles = [pk for pks in profiles_by_city.values()
+                        for pk in pks]
+        count_likes = 0
+        likes = []
+        for city, pks in profiles_by_city.items():
+            local = pks if city != -1 else all_profiles
+            for lover in pks:
+                count = min(int(self.random.expovariate(1 / likes_per_user))
+                            if likes_per_user > 0 else 0,
+                            len(all_profiles) - 1)
+                targets = set()
+                for _ in range(count):
+                    source = local if self.random.random() < local_share \
+                        else all_profiles
+                    targets.add(self.random.choice(source))
+                targets.discard(lover)
+                likes.extend(Like(lover_id=lover, beloved_id=beloved)
+                             for beloved in targets)
+
+                if len(likes) >= self.batch_size:
+                    count_likes += self.save_likes(likes)
+                    likes = []
+
+        return count_likes + self.save_likes(likes)
+
+    def save_likes(self, likes: List[Like]) -> int:
+        """Метод сохранения пачки оценок"""
+
+        Like.objects.bulk_create(likes, batch_size=self.batch_size,
+                                 ignore_conflicts=True)
+        if likes:
+            self.stdout.write(f'Создано оценок: +{len(likes)}')
+        return len(likes)
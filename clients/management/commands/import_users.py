@@ -0,0 +1,286 @@
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.contrib.auth.models import User
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import (
+    IntegrityError,
+    transaction,
+)
+from django.db.models.functions import Lower
+from rest_framework.exceptions import ValidationError
+
+from api.clients.serializers import ImportUserSerializer
+from clients.cache import (
+    GEO_SNAPSHOT_VERSION_KEY,
+    increment_version,
+    invalidate_user_lists,
+)
+from clients.feed import mark_feeds_stale
+from clients.importing import (
+    hash_password,
+    init_hashing_worker,
+    make_registration_data,
+    read_rows,
+)
+from clients.models import Profile
+
+
+class Command(BaseCommand):
+    """Команда массового импорта пользователей"""
+
+    help = 'Импортирует пользователей с профилями из файла CSV или JSONL. ' \
+           'Строки проверяются так же, как при регистрации, пароли ' \
+           'хэшируются в нескольких процессах, а записи создаются пачками.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            'path',
+            help='Путь до файла или "-" для чтения из стандартного ввода.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'jsonl'),
+            help='Формат файла. По умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество пользователей, создаваемых в одной транзакции.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов для хэширования паролей. '
+                 'При 0 пароли хэшируются в текущем процессе.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        path = options['path']
+        file_format = options['format']
+        if file_format is None:
+            file_format = 'csv' if path.endswith('.csv') else 'jsonl'
+        self.batch_size = options['batch_size']
+
+        self.pool = None
+        if options['workers'] > 0:
+            self.workers = options['workers']
+            self.pool = ProcessPoolExecutor(max_workers=self.workers,
+                                            initializer=init_hashing_worker)
+
+        file = sys.stdin if path == '-' else \
+            open(path, encoding='utf-8', newline='')
+        self.count_imported = self.count_rejected = 0
+        self.started_at = time.perf_counter()
+        try:
+            self.import_rows(file, file_format)
+        finally:
+            if file is not sys.stdin:
+                file.close()
+            if self.pool is not None:
+                self.pool.shutdown()
+
+            # bulk_create не отправляет сигналы, поэтому кэши
+            # списков и снимки координат сбрасываются вручную.
+            if self.count_imported:
+                invalidate_user_lists()
+                increment_version(GEO_SNAPSHOT_VERSION_KEY)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Импортировано пользователей: {self.count_imported}, '
+            f'отклонено строк: {self.count_rejected}, '
+            f'скорость: {self.get_rate():.0f} строк/с.'
+        ))
+
+    def import_rows(self, file, file_format: str) -> None:
+        """Метод проверки строк файла и импорта их пачками"""
+
+        serializer = ImportUserSerializer()
+        # Имена и почты из уже прочитанных строк файла.
+        seen_usernames, seen_emails = set(), set()
+        batch = []
+        for line_number, (row, error) in enumerate(
+                read_rows(file, file_format), 1):
+            if error is not None:
+                self.reject(line_number, {'non_field_errors': [error]})
+                continue
+            try:
+                data = serializer.run_validation(make_registration_data(row))
+            except ValidationError as error:
+                self.reject(line_number, error.detail)
+                continue
+
+            email = data['email'].lower()
+            if data['username'] in seen_usernames:
+                self.reject(line_number, {'username': 'Имя повторяется.'})
+                continue
+            if email in seen_emails:
+                self.reject(line_number, {'email': 'Почта повторяется.'})
+                continue
+            seen_usernames.add(data['username'])
+            seen_emails.add(email)
+
+            batch.append((line_number, data))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+
+        if batch:
+            self.import_batch(batch)
+
+    def import_batch(self, batch: List[Tuple[int, dict]]) -> None:
+        """Метод импорта пачки проверенных строк"""
+
+        # Уникальность проверяется в БД заранее, но другие процессы
+        # могут успеть создать тех же пользователей. Тогда проверка
+        # повторяется и конфликтующие строки отбрасываются.
+        batch = self.exclude_existing(batch)
+        if not batch:
+            return
+        # Пароли хэшируются один раз и до начала транзакции,
+        # чтобы не держать ее открытой во время хэширования.
+        self.hash_batch_passwords(batch)
+        for attempt in range(2):
+            if attempt:
+                batch = self.exclude_existing(batch)
+                if not batch:
+                    return
+            try:
+                with transaction.atomic():
+                    self.create_users(batch)
+                break
+            except IntegrityError:
+                if attempt:
+                    raise CommandError(
+                        f'Не удалось импортировать пачку, начиная со строки '
+                        f'{batch[0][0]}, из-за конфликта уникальности.'
+                    )
+
+        self.count_imported += len(batch)
+        self.stdout.write(
+            f'Импортировано пользователей: {self.count_imported} '
+            f'({self.get_rate():.0f} строк/с).'
+        )
+
+    def exclude_existing(self, batch: List[Tuple[int, dict]]
+                         ) -> List[Tuple[int, dict]]:
+        """Метод отбрасывания строк с уже занятыми именами и почтами"""
+
+        existing_usernames = set(User.objects.filter(
+            username__in=[data['username'] for _, data in batch],
+        ).values_list('username', flat=True))
+        existing_emails = set(User.objects.annotate(
+            email_lower=Lower('email'),
+        ).filter(
+            email_lower__in=[data['email'].lower() for _, data in batch],
+        ).values_list('email_lower', flat=True))
+
+        remaining = []
+        for line_number, data in batch:
+            if data['username'] in existing_usernames:
+                self.reject(line_number, {'username': 'Имя уже занято.'})
+            elif data['email'].lower() in existing_emails:
+                self.reject(line_number, {'email': 'Почта уже занята.'})
+            else:
+                remaining.append((line_number, data))
+
+        return remaining
+
+    def hash_batch_passwords(self, batch: List[Tuple[int, dict]]) -> None:
+        """
+        Метод хэширования паролей пачки.
+
+        Хэш сохраняется в поле password_hash строки вместо пароля.
+        """
+
+        rows = [data for _, data in batch if data.get('password')]
+        passwords = self.hash_passwords([data.pop('password')
+                                         for data in rows])
+        for data, password_hash in zip(rows, passwords):
+            data['password_hash'] = password_hash
+
+    def create_users(self, batch: List[Tuple[int, dict]]) -> None:
+        """Метод создания пользователей и профилей пачки с хэшами паролей"""
+
+        users = [
+            User(
+                username=data['username'],
+                email=data['email'],
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+                password=data['password_hash'],
+            )
+            for _, data in batch
+        ]
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+
+        # Не все СУБД возвращают первичные ключи из bulk_create.
+        user_pks = dict(User.objects.filter(
+            username__in=[user.username for user in users],
+        ).values_list('username', 'pk'))
+
+        profiles = []
+        for _, data in batch:
+            profile = Profile(
+                user_id=user_pks[data['username']],
+                gender=data['profile']['gender'],
+                latitude=data['profile']['latitude'],
+                longitude=data['profile']['longitude'],
+            )
+            profile.refresh_spatial_fields()
+            profiles.append(profile)
+        Profile.objects.bulk_create(profiles, batch_size=self.batch_size)
+        # Сигналы не отправляются, поэтому ленты новых
+        # пользователей ставятся в очередь вручную.
+        mark_feeds_stale(Profile.objects.filter(
+            user_id__in=user_pks.values(),
+        ).values_list('pk', flat=True))
+
+    def hash_passwords(self, passwords: List[Optional[str]]
+                       ) -> List[Optional[str]]:
+        """
+        Метод хэширования паролей.
+
+        :param passwords: Пароли или None для строк с готовым хэшем.
+        :return: Хэши паролей в том же порядке.
+        """
+
+        indexes = [i for i, password in enumerate(passwords)
+                   if password is not None]
+        plain = [passwords[i] for i in indexes]
+        if self.pool is None:
+            hashed = map(hash_password, plain)
+        else:
+            chunksize = max(len(plain) // (self.workers * 4), 1)
+            hashed = self.pool.map(hash_password, plain, chunksize=chunksize)
+
+        result = [None] * len(passwords)
+        for i, password_hash in zip(indexes, hashed):
+            result[i] = password_hash
+        return result
+
+    def reject(self, line_number: int, detail) -> None:
+        """Метод вывода причины отклонения строки"""
+
+        self.count_rejected += 1
+        self.stderr.write(f'Строка {line_number}: '
+                          f'{json.dumps(detail, ensure_ascii=False)}')
+
+    def get_rate(self) -> float:
+        """Метод подсчета скорости импорта в строках в секунду"""
+
+        elapsed = time.perf_counter() - self.started_at
+        return self.count_imported / elapsed if elapsed > 0 else 0.0
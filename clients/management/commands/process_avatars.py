@@ -0,0 +1,102 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from clients.avatars import process_pending_avatars
+from clients.cache import (
+    invalidate_auth_users,
+    invalidate_user_lists,
+)
+from clients.models import Profile
+
+
+class Command(BaseCommand):
+    """Команда фоновой обработки загруженных аватаров"""
+
+    help = 'Создает миниатюры с водяным знаком для аватаров, ' \
+           'ожидающих обработки.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Максимальное количество аватаров в одной пачке.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов для обработки изображений. '
+                 'При 0 изображения обрабатываются в текущем процессе.',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться после опустошения очереди, '
+                 'а продолжать ее опрашивать.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах между опросами пустой очереди.',
+        )
+        parser.add_argument(
+            '--requeue-processing',
+            action='store_true',
+            help='Вернуть в очередь аватары, обработка которых '
+                 'была прервана. Используйте, только если других '
+                 'обработчиков не запущено.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        if options['requeue_processing']:
+            queryset = Profile.objects.filter(
+                avatar_status=Profile.AvatarStatus.PROCESSING,
+            )
+            user_pks = list(queryset.values_list('user_id', flat=True))
+            count_requeued = queryset.filter(user_id__in=user_pks) \
+                .update(avatar_status=Profile.AvatarStatus.PENDING,
+                        version=F('version') + 1)
+            # update не отправляет сигналы, поэтому кэш списков
+            # и закэшированные для аутентификации пользователи
+            # сбрасываются вручную.
+            if count_requeued:
+                invalidate_user_lists()
+                invalidate_auth_users(user_pks)
+            self.stdout.write(f'Возвращено в очередь: {count_requeued}.')
+
+        pool = None
+        if options['workers'] > 0:
+            pool = ProcessPoolExecutor(max_workers=options['workers'])
+
+        total_ready = total_failed = 0
+        try:
+            while True:
+                count_ready, count_failed = process_pending_avatars(
+                    options['batch_size'], pool,
+                )
+                total_ready += count_ready
+                total_failed += count_failed
+                if count_ready or count_failed:
+                    self.stdout.write(
+                        f'Обработано аватаров: {count_ready}, '
+                        f'с ошибкой: {count_failed}.'
+                    )
+                    continue
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Обработано аватаров: {total_ready}, '
+            f'с ошибкой: {total_failed}.'
+        ))
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+
+class Command(BaseCommand):
+    """Команда удаления истекших JWT-токенов"""
+
+    help = 'Удаляет истекшие выданные токены и токены из черного списка ' \
+           'небольшими пачками, не блокируя таблицы надолго.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество токенов, удаляемых за один запрос.',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Пауза между пачками в секундах.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        batch_size, pause = options['batch_size'], options['pause']
+        now = timezone.now()
+
+        # Каждая пачка удаляется отдельными короткими запросами
+        # по первичным ключам, поэтому блокировки держатся недолго.
+        count_deleted = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                OutstandingToken.objects
+                .filter(pk__gt=last_pk, expires_at__lte=now)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+
+            BlacklistedToken.objects.filter(token_id__in=pks).delete()
+            OutstandingToken.objects.filter(pk__in=pks).delete()
+
+            last_pk = pks[-1]
+            count_deleted += len(pks)
+            self.stdout.write(f'Удалено токенов: {count_deleted}')
+            if pause:
+                time.sleep(pause)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Всего удалено токенов: {count_deleted}.'
+        ))
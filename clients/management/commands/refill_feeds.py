@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from clients.feed import (
+    refill_feeds,
+    refill_stale_feeds,
+)
+
+
+class Command(BaseCommand):
+    """Команда пополнения лент рекомендаций"""
+
+    help = 'Пополняет ленты рекомендаций из очереди ближайшими ' \
+           'профилями, которые пользователи еще не оценили.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Количество лент, обрабатываемых за раз.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перед обработкой очереди пополнить ленты всех '
+                 'пользователей, например после загрузки пользователей '
+                 'в обход сигналов.',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Перед первым проходом по всем профилям удалить '
+                 'неоцененные записи лент. Включает --all.',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться после обработки очереди, '
+                 'а ждать новых лент в ней.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах между проверками очереди.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        total_feeds = total_entries = 0
+        if options['all'] or options['rebuild']:
+            total_feeds, total_entries = refill_feeds(
+                options['batch_size'], options['rebuild'],
+            )
+            self.stdout.write(f'Пополнено лент всех пользователей: '
+                              f'{total_feeds}, добавлено записей: '
+                              f'{total_entries}.')
+
+        while True:
+            count_feeds, count_entries = refill_stale_feeds(
+                options['batch_size'],
+            )
+            total_feeds += count_feeds
+            total_entries += count_entries
+            if count_feeds:
+                self.stdout.write(f'Пополнено лент: {count_feeds}, '
+                                  f'добавлено записей: {count_entries}.')
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пополнено лент: {total_feeds}, '
+            f'добавлено записей: {total_entries}.'
+        ))
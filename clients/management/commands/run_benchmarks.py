@@ -0,0 +1,237 @@
+import json
+import random
+import subprocess
+import time
+from typing import (
+    Callable,
+    List,
+)
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import (
+    connection,
+    transaction,
+)
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import (
+    APIRequestFactory,
+    force_authenticate,
+)
+
+from api.clients import views
+from clients.benchmarks import summarize_latencies
+
+
+# Отдельный кэш в памяти процесса, который используется во время замера.
+# Команда очищает его перед запросами и не должна затрагивать общий кэш
+# с закэшированными списками, черным списком токенов и версиями.
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'run-benchmarks',
+    },
+}
+
+
+class Command(BaseCommand):
+    """Команда измерения производительности эндпоинтов API"""
+
+    help = 'Вызывает контроллеры API в текущем процессе от имени ' \
+           'случайных пользователей и выводит в формате JSON перцентили ' \
+           'времени ответа, пропускную способность и количество запросов ' \
+           'к БД. Все изменения в БД откатываются, а вместо общего кэша ' \
+           'используется отдельный кэш в памяти процесса.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Количество запросов в каждом сценарии.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            help='Количество запросов для прогрева перед замером.',
+        )
+        parser.add_argument(
+            '--scenarios',
+            nargs='+',
+            help='Выполняемые сценарии. По умолчанию - все.',
+        )
+        parser.add_argument(
+            '--distance',
+            type=int,
+            default=50,
+            help='Расстояние в км для сценария фильтрации по расстоянию.',
+        )
+        parser.add_argument(
+            '--cached',
+            action='store_true',
+            help='Не очищать кэш замера перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Файл для сохранения результатов.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        self.random = random.Random(options['seed'])
+        self.factory = APIRequestFactory()
+        self.cached = options['cached']
+        self.user_pks = list(User.objects.filter(profile__isnull=False)
+                             .values_list('pk', flat=True))
+        if len(self.user_pks) < 2:
+            raise CommandError('Нужно хотя бы два пользователя с профилем. '
+                               'Создайте их командой generate_population.')
+
+        scenarios = self.get_scenarios(options['distance'])
+        names = options['scenarios'] or list(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {sorted(unknown)}.')
+
+        report = {
+            'meta': self.get_meta(),
+            'scenarios': {},
+        }
+        # Сценарии оценки изменяют БД, поэтому все изменения откатываются.
+        # Запросы отправляются на хост, который использует APIRequestFactory.
+        # Данные из откатываемой транзакции не должны попасть в общий кэш.
+        with transaction.atomic(), \
+                override_settings(ALLOWED_HOSTS=['testserver'],
+                                  CACHES=BENCHMARK_CACHES):
+            for name in names:
+                report['scenarios'][name] = self.run_scenario(
+                    scenarios[name], options['requests'], options['warmup'],
+                )
+                self.stderr.write(f'Сценарий {name} выполнен.')
+            transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def get_meta(self) -> dict:
+        """Метод получения сведений об окружении замера"""
+
+        try:
+            commit = subprocess.run(
+                ('git', 'rev-parse', 'HEAD'), cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            'commit': commit,
+            'started_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'users': len(self.user_pks),
+            'cached': self.cached,
+        }
+
+    def get_scenarios(self, distance: int) -> dict:
+        """
+        Метод получения сценариев.
+
+        Каждый сценарий - функция, которая выполняет один запрос
+        от имени заданного пользователя и возвращает код ответа.
+        """
+
+        def user_list(user: User, **params) -> int:
+            request = self.factory.get(reverse('api_user_list'), params)
+            force_authenticate(request, user)
+            return views.UserListView.as_view()(request).status_code
+
+        def user_detail(user: User) -> int:
+            pk = self.random.choice(self.user_pks)
+            request = self.factory.get(reverse('api_user_detail',
+                                               args=(pk, )))
+            force_authenticate(request, user)
+            return views.UserDetailView.as_view()(request, pk=pk).status_code
+
+        def lovers(user: User) -> int:
+            request = self.factory.get(reverse('api_lovers'))
+            force_authenticate(request, user)
+            return views.LoverListView.as_view()(request).status_code
+
+        def like(user: User) -> int:
+            pk = self.random.choice(self.user_pks)
+            request = self.factory.post(reverse('api_like_user',
+                                                args=(pk, )))
+            force_authenticate(request, user)
+            return views.LikeUserView.as_view()(request, pk=pk).status_code
+
+        def batch_like(user: User) -> int:
+            pks = self.random.sample(self.user_pks,
+                                     min(20, len(self.user_pks)))
+            request = self.factory.post(reverse('api_like_users'),
+                                        {'ids': pks}, format='json')
+            force_authenticate(request, user)
+            return views.BatchLikeUsersView.as_view()(request).status_code
+
+        return {
+            'user_list': user_list,
+            'user_list_distance': lambda user: user_list(
+                user, distance_to_user=distance,
+            ),
+            'user_list_nearest': lambda user: user_list(user, nearest=20),
+            'user_detail': user_detail,
+            'lovers': lovers,
+            'like': like,
+            'batch_like': batch_like,
+        }
+
+    def run_scenario(self, scenario: Callable[[User], int],
+                     count_requests: int, count_warmup: int) -> dict:
+        """Метод выполнения сценария и подсчета статистики"""
+
+        latencies: List[float] = []
+        queries: List[int] = []
+        elapsed = 0.0
+        for i in range(count_warmup + count_requests):
+            # Пользователь загружается так же, как при аутентификации.
+            user = User.objects.select_related('profile') \
+                .get(pk=self.random.choice(self.user_pks))
+            if not self.cached:
+                cache.clear()
+
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                status_code = scenario(user)
+                latency = time.perf_counter() - start
+            if i < count_warmup:
+                continue
+
+            elapsed += latency
+            latencies.append(latency if status_code < 500 else None)
+            queries.append(len(context.captured_queries))
+
+        summary = summarize_latencies(latencies, elapsed)
+        summary.update({
+            'queries_mean': round(sum(queries) / len(queries), 2)
+            if queries else None,
+            'queries_max': max(queries, default=None),
+        })
+        return summary
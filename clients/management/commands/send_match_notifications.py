@@ -0,0 +1,63 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from clients.notifications import send_pending_notifications
+
+
+class Command(BaseCommand):
+    """Команда отправки писем о взаимной симпатии из очереди"""
+
+    help = 'Отправляет письма о взаимной симпатии, ожидающие в очереди.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Максимальное количество писем в одной пачке.',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Не завершаться после опустошения очереди, '
+                 'а продолжать ее опрашивать.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах между опросами пустой очереди.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        # Бэкенд создается один раз, а соединение с почтовым сервером
+        # открывается заново для каждой пачки, поэтому соединение,
+        # разорванное сервером за время простоя, не используется.
+        mail_connection = get_connection()
+        total_sent = total_failed = 0
+        try:
+            while True:
+                count_sent, count_failed = send_pending_notifications(
+                    options['batch_size'], mail_connection,
+                )
+                total_sent += count_sent
+                total_failed += count_failed
+                if count_sent or count_failed:
+                    self.stdout.write(
+                        f'Отправлено писем: {count_sent}, '
+                        f'не отправлено: {count_failed}.'
+                    )
+                    continue
+
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            mail_connection.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Отправлено писем: {total_sent}, '
+            f'не отправлено: {total_failed}.'
+        ))
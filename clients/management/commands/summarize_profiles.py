@@ -0,0 +1,116 @@
+import glob
+import io
+import json
+import os
+import pstats
+import statistics
+from typing import (
+    Dict,
+    List,
+    Tuple,
+)
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+
+class Command(BaseCommand):
+    """Команда сводки собранных профилей запросов"""
+
+    help = 'Группирует профили запросов из PROFILING_DIR по маршрутам ' \
+           'и для каждого маршрута выводит время ответа, самые долгие ' \
+           'функции по суммарной статистике cProfile и самые долгие ' \
+           'запросы к БД.'
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            '--dir',
+            help='Каталог с профилями. По умолчанию - PROFILING_DIR.',
+        )
+        parser.add_argument(
+            '--route',
+            help='Выводить только маршруты, содержащие эту строку.',
+        )
+        parser.add_argument(
+            '--functions',
+            type=int,
+            default=15,
+            help='Количество выводимых функций для каждого маршрута.',
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=5,
+            help='Количество выводимых запросов к БД для каждого маршрута.',
+        )
+
+    def handle(self, *args, **options) -> None:
+        directory = options['dir'] or settings.PROFILING_DIR
+        if not os.path.isdir(directory):
+            raise CommandError(f'Каталог {directory} не найден.')
+
+        groups: Dict[Tuple[str, str], List[dict]] = {}
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            with open(path, encoding='utf-8') as file:
+                info = json.load(file)
+            if options['route'] and options['route'] not in info['route']:
+                continue
+            info['profile'] = os.path.join(directory, info['profile'])
+            groups.setdefault((info['route'], info['method']), []) \
+                .append(info)
+
+        if not groups:
+            self.stdout.write('Профили не найдены.')
+            return
+
+        # Сначала маршруты, на которые суммарно ушло больше всего времени.
+        for (route, method), infos in sorted(
+            groups.items(),
+            key=lambda item: -sum(info['duration_ms'] for info in item[1]),
+        ):
+            self.write_route(route, method, infos, options['functions'],
+                             options['queries'])
+
+    def write_route(self, route: str, method: str, infos: List[dict],
+                    count_functions: int, count_queries: int) -> None:
+        """Метод вывода сводки по одному маршруту"""
+
+        durations = sorted(info['duration_ms'] for info in infos)
+        queries = [len(info['queries']) for info in infos]
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{method} {route}'))
+        self.stdout.write(
+            f'Профилей: {len(infos)}, '
+            f'время ответа: медиана {statistics.median(durations):.1f} мс, '
+            f'максимум {durations[-1]:.1f} мс, '
+            f'запросов к БД в среднем: {statistics.fmean(queries):.1f}'
+        )
+
+        profiles = [info['profile'] for info in infos
+                    if os.path.exists(info['profile'])]
+        if profiles:
+            buffer = io.StringIO()
+            stats = pstats.Stats(*profiles, stream=buffer)
+            stats.strip_dirs().sort_stats('cumulative') \
+                .print_stats(count_functions)
+            self.stdout.write(buffer.getvalue().strip())
+
+        # Запросы группируются по тексту без параметров.
+        sql_stats: Dict[str, list] = {}
+        for info in infos:
+            for query in info['queries']:
+                item = sql_stats.setdefault(query['sql'], [0, 0.0, None])
+                item[0] += 1
+                item[1] += query['duration_ms']
+                item[2] = item[2] or query.get('explain')
+        if sql_stats:
+            self.stdout.write('Самые долгие запросы к БД:')
+        for sql, (count, total, explain) in sorted(
+            sql_stats.items(), key=lambda item: -item[1][1],
+        )[:count_queries]:
+            self.stdout.write(f'  {total:.1f} мс, выполнен {count} раз: {sql}')
+            for row in explain or ():
+                self.stdout.write(f'    {" ".join(map(str, row))}')
+        self.stdout.write('')
@@ -0,0 +1,157 @@
+from enum import Enum
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Tuple,
+)
+
+from django.contrib.auth.models import User
+from django.db import (
+    connection,
+    transaction,
+)
+from django.db.models import Q
+from django.utils import timezone
+
+from .feed import mark_feeds_stale
+from .models import (
+    FeedEntry,
+    Like,
+    Profile,
+)
+from .notifications import enqueue_matches_notifications
+
+
+class LikeResult(Enum):
+    """Результат оценки пользователя"""
+
+    LIKED = 'liked'
+    ALREADY_LIKED = 'already_liked'
+    MATCH = 'match'
+    NOT_FOUND = 'not_found'
+    SELF = 'self'
+
+
+def like_user(lover: User, beloved: User) -> LikeResult:
+    """
+    Функция оценки одного пользователя другим.
+
+    :param lover: Оценивающий пользователь.
+    :param beloved: Оцениваемый пользователь.
+    :return: Результат оценки.
+    """
+
+    return _like_users(lover, [beloved])[beloved.pk]
+
+
+def like_users(lover: User, beloved_pks: Iterable[int]
+               ) -> Tuple[Dict[int, LikeResult], Dict[int, str]]:
+    """
+    Функция оценки пользователем сразу нескольких пользователей.
+
+    Все пользователи пачки обрабатываются несколькими запросами
+    к наборам записей, а не запросами для каждого пользователя.
+
+    :param lover: Оценивающий пользователь.
+    :param beloved_pks: Первичные ключи оцениваемых пользователей.
+    :return:
+        Результаты оценки и почты пользователей
+        с взаимной симпатией по их первичным ключам.
+    """
+
+    beloved_pks = set(beloved_pks)
+    results = {}
+    if lover.pk in beloved_pks:
+        results[lover.pk] = LikeResult.SELF
+        beloved_pks.remove(lover.pk)
+
+    beloveds = list(User.objects.select_related('profile')
+                    .filter(pk__in=beloved_pks, profile__isnull=False))
+    for pk in beloved_pks - {beloved.pk for beloved in beloveds}:
+        results[pk] = LikeResult.NOT_FOUND
+
+    if beloveds:
+        results.update(_like_users(lover, beloveds))
+
+    # Почты уже загружены вместе с пользователями.
+    emails = {beloved.pk: beloved.email for beloved in beloveds
+              if results[beloved.pk] == LikeResult.MATCH}
+
+    return results, emails
+
+
+def _like_users(lover: User, beloveds: List[User]) -> Dict[int, LikeResult]:
+    """
+    Функция оценки пользователем других пользователей.
+
+    Оценки и проверка взаимной симпатии выполняются в одной транзакции
+    за фиксированное количество запросов, не зависящее ни от размера
+    пачки, ни от того, сколько оценок уже есть у пользователей.
+    Профили блокируются в порядке первичных ключей, поэтому
+    одновременные оценки одних и тех же пользователей
+    выполняются последовательно.
+
+    При взаимной симпатии встречная оценка удаляется,
+    а пользователям ставятся в очередь письма. Записи оцененных
+    профилей в ленте рекомендаций отмечаются оцененными.
+
+    :param lover: Оценивающий пользователь.
+    :param beloveds: Оцениваемые пользователи с загруженными профилями.
+    :return: Результаты оценки по первичным ключам пользователей.
+    """
+
+    lover_profile = lover.profile
+    beloved_profile_pks = [beloved.profile.pk for beloved in beloveds]
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            list(Profile.objects.select_for_update()
+                 .filter(pk__in=[lover_profile.pk, *beloved_profile_pks])
+                 .order_by('pk').values_list('pk', flat=True))
+
+        # Одним запросом по уникальному индексу находим
+        # оценки в обе стороны.
+        liked_pks, lover_pks = set(), set()
+        for like_lover_pk, like_beloved_pk in Like.objects.filter(
+            Q(lover=lover_profile, beloved__in=beloved_profile_pks) |
+            Q(lover__in=beloved_profile_pks, beloved=lover_profile)
+        ).values_list('lover_id', 'beloved_id'):
+            if like_lover_pk == lover_profile.pk:
+                liked_pks.add(like_beloved_pk)
+            else:
+                lover_pks.add(like_lover_pk)
+
+        results = {}
+        new_likes, matches = [], []
+        for beloved in beloveds:
+            if beloved.profile.pk in liked_pks:
+                results[beloved.pk] = LikeResult.ALREADY_LIKED
+            elif beloved.profile.pk in lover_pks:
+                results[beloved.pk] = LikeResult.MATCH
+                matches.append(beloved)
+            else:
+                results[beloved.pk] = LikeResult.LIKED
+                new_likes.append(Like(lover=lover_profile,
+                                      beloved=beloved.profile))
+
+        if matches:
+            Like.objects.filter(
+                lover__in=[beloved.profile.pk for beloved in matches],
+                beloved=lover_profile,
+            ).delete()
+            enqueue_matches_notifications(
+                (lover, beloved) for beloved in matches
+            )
+        if new_likes:
+            Like.objects.bulk_create(new_likes, ignore_conflicts=True)
+
+        # Оцененные профили больше не выдаются в ленте рекомендаций,
+        # а сама лента проверяется на необходимость пополнения.
+        count_liked = FeedEntry.objects.filter(
+            owner=lover_profile, candidate__in=beloved_profile_pks,
+            liked_at__isnull=True,
+        ).update(liked_at=timezone.now())
+        if count_liked:
+            mark_feeds_stale((lover_profile.pk, ))
+
+    return results
@@ -0,0 +1,296 @@
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import (
+    ExitStack,
+    contextmanager,
+)
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Tuple,
+)
+
+from django.conf import settings
+from django.db import connections
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+)
+
+
+# Границы корзин гистограммы времени ответа в секундах.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Границы корзин гистограммы количества запросов к БД за один запрос.
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Маршрут запросов, которые не подошли ни к одному URL. Адреса таких
+# запросов не попадают в метки, иначе количество рядов не ограничено.
+UNMATCHED_ROUTE = '<unmatched>'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """
+    Класс гистограммы в формате Prometheus.
+
+    Для каждого набора меток хранятся количества значений по корзинам,
+    сумма и количество значений. Накопленные по корзинам количества
+    считаются только при выводе.
+    """
+
+    def __init__(self, name: str, description: str,
+                 buckets: Tuple[float, ...]) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        """Метод учета значения. Вызывается под блокировкой реестра"""
+
+        series = self.series.get(labels)
+        if series is None:
+            # Последняя корзина - для значений больше всех границ.
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, label_names: Tuple[str, ...]) -> List[str]:
+        """Метод вывода гистограммы в текстовом формате Prometheus"""
+
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} histogram']
+        bounds = [format_value(bound) for bound in self.buckets] + ['+Inf']
+        for labels, (counts, total) in sorted(self.series.items()):
+            label_pairs = format_labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_pairs},'
+                             f'le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_pairs}}} '
+                         f'{format_value(total)}')
+            lines.append(f'{self.name}_count{{{label_pairs}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Класс счетчика в формате Prometheus"""
+
+    def __init__(self, name: str, description: str) -> None:
+        self.name = name
+        self.description = description
+        self.series: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple, value: float = 1) -> None:
+        """Метод увеличения счетчика. Вызывается под блокировкой реестра"""
+
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self, label_names: Tuple[str, ...]) -> List[str]:
+        """Метод вывода счетчика в текстовом формате Prometheus"""
+
+        lines = [f'# HELP {self.name} {self.description}',
+                 f'# TYPE {self.name} counter']
+        for labels, value in sorted(self.series.items()):
+            lines.append(f'{self.name}{{{format_labels(label_names, labels)}}} '
+                         f'{format_value(value)}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Класс реестра метрик запросов.
+
+    Метрики хранятся в памяти процесса: каждый процесс сервера
+    отдает по адресу метрик только свои значения.
+    """
+
+    LABELS = ('route', 'method')
+    STATUS_LABELS = ('route', 'method', 'status')
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Метод сброса всех метрик"""
+
+        with self.lock:
+            self.latency = Histogram(
+                'http_request_duration_seconds',
+                'Время обработки запроса в секундах.',
+                LATENCY_BUCKETS,
+            )
+            self.responses = Counter(
+                'http_responses_total',
+                'Количество ответов по кодам.',
+            )
+            self.queries = Histogram(
+                'db_queries_per_request',
+                'Количество запросов к БД за один запрос.',
+                QUERY_COUNT_BUCKETS,
+            )
+            self.query_time = Counter(
+                'db_query_duration_seconds_total',
+                'Суммарное время выполнения запросов к БД в секундах.',
+            )
+
+    def record(self, route: str, method: str, status: int,
+               latency: float, count_queries: int,
+               query_time: float) -> None:
+        """Метод учета одного обработанного запроса"""
+
+        labels = (route, method)
+        with self.lock:
+            self.latency.observe(labels, latency)
+            self.responses.inc((route, method, str(status)))
+            self.queries.observe(labels, count_queries)
+            self.query_time.inc(labels, query_time)
+
+    def render(self) -> str:
+        """Метод вывода всех метрик в текстовом формате Prometheus"""
+
+        with self.lock:
+            lines = [
+                *self.latency.render(self.LABELS),
+                *self.responses.render(self.STATUS_LABELS),
+                *self.queries.render(self.LABELS),
+                *self.query_time.render(self.LABELS),
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def format_labels(names: Tuple[str, ...], values: tuple) -> str:
+    """Функция вывода меток ряда с экранированием значений"""
+
+    return ','.join(
+        '{}="{}"'.format(name, value.replace('\\', r'\\')
+                         .replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in zip(names, values)
+    )
+
+
+def format_value(value: float) -> str:
+    """Функция вывода числа в формате Prometheus"""
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class QueryTimer:
+    """
+    Класс обертки выполнения запросов к БД.
+
+    Подключается через connection.execute_wrapper и считает
+    количество и суммарное время запросов одного HTTP-запроса.
+    """
+
+    __slots__ = ('count', 'elapsed')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute: Callable, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.elapsed += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Класс промежуточного слоя сбора метрик запросов.
+
+    Учитывает время обработки запроса, код ответа, количество и время
+    запросов к БД. Метки ряда - шаблон маршрута и метод запроса.
+    Потоковый ответ учитывается после того, как он прочитан целиком.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse],
+                 metrics_registry: MetricsRegistry = registry) -> None:
+        self.get_response = get_response
+        self.registry = metrics_registry
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with count_queries(timer):
+            response = self.get_response(request)
+
+        if response.streaming:
+            # Записи потокового ответа читаются из БД уже после выхода
+            # из контроллера, во время отправки ответа.
+            response.streaming_content = self.iterate_streaming_content(
+                response.streaming_content, request, response, timer, start,
+            )
+        else:
+            self.record(request, response, timer, start)
+        return response
+
+    def iterate_streaming_content(self, content: Iterable[bytes],
+                                  request: HttpRequest,
+                                  response: HttpResponse, timer: QueryTimer,
+                                  start: float) -> Iterator[bytes]:
+        """
+        Генератор частей потокового ответа с учетом запросов к БД.
+
+        Метрики записываются, когда ответ прочитан целиком или
+        соединение с клиентом закрыто.
+        """
+
+        try:
+            with count_queries(timer):
+                yield from content
+        finally:
+            self.record(request, response, timer, start)
+
+    def record(self, request: HttpRequest, response: HttpResponse,
+               timer: QueryTimer, start: float) -> None:
+        """Метод учета обработанного запроса в реестре метрик"""
+
+        latency = time.perf_counter() - start
+        resolver_match = getattr(request, 'resolver_match', None)
+        route = resolver_match.route if resolver_match is not None \
+            else UNMATCHED_ROUTE
+        self.registry.record(route, request.method, response.status_code,
+                             latency, timer.count, timer.elapsed)
+
+
+@contextmanager
+def count_queries(timer: QueryTimer) -> Iterator[None]:
+    """Функция подключения счетчика к соединениям с БД текущего потока"""
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        yield
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Контроллер вывода метрик в текстовом формате Prometheus.
+
+    Если задан METRICS_TOKEN, запрос должен содержать
+    заголовок Authorization: Bearer <METRICS_TOKEN>.
+    """
+
+    token = settings.METRICS_TOKEN
+    if token:
+        authorization = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(authorization.encode(),
+                                   f'Bearer {token}'.encode()):
+            return HttpResponse(status=401)
+
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
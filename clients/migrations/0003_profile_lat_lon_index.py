@@ -0,0 +1,28 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:06
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_alter_profile_avatar'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='latitude',
+            field=models.DecimalField(decimal_places=20, help_text='Восточное направление считается положительным. Западное - отрицательным.', max_digits=30, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='longitude',
+            field=models.DecimalField(decimal_places=20, help_text='Северное направление считается положительным. Южное - отрицательным.', max_digits=30, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Долгота'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['latitude', 'longitude'], name='clients_profile_lat_lon_idx'),
+        ),
+    ]
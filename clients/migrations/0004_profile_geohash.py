@@ -0,0 +1,28 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_profile_lat_lon_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='geohash_3',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=3, verbose_name='Геохеш (ячейка ~156 км)'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='geohash_4',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=4, verbose_name='Геохеш (ячейка ~39 км)'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='geohash_5',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=5, verbose_name='Геохеш (ячейка ~5 км)'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_profile_geohash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient_email', models.EmailField(max_length=254, verbose_name='Эл. почта получателя')),
+                ('subject', models.CharField(max_length=255, verbose_name='Тема')),
+                ('body', models.TextField(verbose_name='Текст')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает отправки'), ('sent', 'Отправлено'), ('failed', 'Не отправлено')], default='pending', max_length=10, verbose_name='Статус')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Количество попыток отправки')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Время следующей попытки')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время создания')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Время отправки')),
+            ],
+            options={
+                'verbose_name': 'Письмо о взаимной симпатии',
+                'verbose_name_plural': 'Письма о взаимной симпатии',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='matchnotification',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='clients_match_notif_due_idx'),
+        ),
+    ]
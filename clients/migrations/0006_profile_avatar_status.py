@@ -0,0 +1,28 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+def mark_existing_avatars_ready(apps, schema_editor):
+    """Аватары, загруженные ранее, уже обработаны при регистрации"""
+
+    Profile = apps.get_model('clients', 'Profile')
+    Profile.objects.exclude(avatar__isnull=True).exclude(avatar='') \
+        .update(avatar_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0005_matchnotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_status',
+            field=models.CharField(choices=[('none', 'Не загружен'), ('pending', 'Ожидает обработки'), ('processing', 'Обрабатывается'), ('ready', 'Готов'), ('failed', 'Ошибка обработки')], db_index=True, default='none', max_length=10, verbose_name='Статус обработки аватара'),
+        ),
+        migrations.RunPython(mark_existing_avatars_ready,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_lovers_to_likes(apps, schema_editor):
+    """Перенос оценок из старой промежуточной таблицы в модель Like"""
+
+    Profile = apps.get_model('clients', 'Profile')
+    Like = apps.get_model('clients', 'Like')
+    OldLovers = Profile.lovers.through
+
+    # В старой таблице from_profile - оцененный пользователь,
+    # to_profile - оценивший.
+    likes = (
+        Like(lover_id=lover_id, beloved_id=beloved_id)
+        for beloved_id, lover_id in OldLovers.objects.values_list(
+            'from_profile_id', 'to_profile_id',
+        ).iterator()
+    )
+    batch = []
+    for like in likes:
+        batch.append(like)
+        if len(batch) >= 1000:
+            Like.objects.bulk_create(batch)
+            batch = []
+    Like.objects.bulk_create(batch)
+
+
+def copy_likes_to_lovers(apps, schema_editor):
+    """Обратный перенос оценок в старую промежуточную таблицу"""
+
+    Profile = apps.get_model('clients', 'Profile')
+    Like = apps.get_model('clients', 'Like')
+    OldLovers = Profile.lovers.through
+
+    OldLovers.objects.bulk_create(
+        OldLovers(from_profile_id=beloved_id, to_profile_id=lover_id)
+        for lover_id, beloved_id in Like.objects.values_list(
+            'lover_id', 'beloved_id',
+        ).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_profile_avatar_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Like',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время оценки')),
+                ('beloved', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='received_likes', to='clients.profile', verbose_name='Оцененный')),
+                ('lover', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='given_likes', to='clients.profile', verbose_name='Оценивший')),
+            ],
+            options={
+                'verbose_name': 'Оценка',
+                'verbose_name_plural': 'Оценки',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('lover', 'beloved'), name='clients_like_unique_pair'),
+        ),
+        migrations.RunPython(copy_lovers_to_likes, copy_likes_to_lovers),
+        migrations.RemoveField(
+            model_name='profile',
+            name='lovers',
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='lovers',
+            field=models.ManyToManyField(blank=True, through='clients.Like', through_fields=('beloved', 'lover'), to='clients.Profile', verbose_name='Оценившие'),
+        ),
+    ]
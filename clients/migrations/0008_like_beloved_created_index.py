@@ -0,0 +1,17 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0007_like'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['beloved', '-created_at', '-id'], name='clients_like_beloved_new_idx'),
+        ),
+    ]
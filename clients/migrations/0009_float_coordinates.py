@@ -0,0 +1,62 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:16
+
+from math import radians, sin, cos
+
+import django.core.validators
+from django.db import migrations, models
+
+
+def fill_trigonometry(apps, schema_editor):
+    """Заполнение тригонометрических функций координат профилей"""
+
+    Profile = apps.get_model('clients', 'Profile')
+    queryset = Profile.objects.only('id', 'latitude', 'longitude') \
+        .order_by('pk')
+
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:1000])
+        if not batch:
+            break
+        for profile in batch:
+            profile.lat_sin = sin(radians(profile.latitude))
+            profile.lat_cos = cos(radians(profile.latitude))
+            profile.lon_rad = radians(profile.longitude)
+        Profile.objects.bulk_update(batch, ('lat_sin', 'lat_cos', 'lon_rad'))
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0008_like_beloved_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='lat_cos',
+            field=models.FloatField(default=1, editable=False, verbose_name='Косинус широты'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='lat_sin',
+            field=models.FloatField(default=0, editable=False, verbose_name='Синус широты'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='lon_rad',
+            field=models.FloatField(default=0, editable=False, verbose_name='Долгота в радианах'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='latitude',
+            field=models.FloatField(help_text='Восточное направление считается положительным. Западное - отрицательным.', validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Широта'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='longitude',
+            field=models.FloatField(help_text='Северное направление считается положительным. Южное - отрицательным.', validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)], verbose_name='Долгота'),
+        ),
+        migrations.RunPython(fill_trigonometry, migrations.RunPython.noop),
+    ]
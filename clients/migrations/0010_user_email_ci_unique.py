@@ -0,0 +1,68 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import Lower
+
+# Сколько конфликтующих почт показывать в сообщении об ошибке.
+DUPLICATE_EMAILS_REPORT_LIMIT = 20
+
+
+def check_duplicate_emails(apps, schema_editor) -> None:
+    """
+    Функция проверки почт, совпадающих без учета регистра.
+
+    Индекс нельзя создать, пока такие почты есть. Вместо ошибки БД
+    миграция перечисляет конфликтующие почты, чтобы их можно было
+    исправить вручную.
+    """
+
+    User = apps.get_model('auth', 'User')
+    duplicates = list(User.objects.using(
+        schema_editor.connection.alias,
+    ).exclude(email='').annotate(
+        email_lower=Lower('email'),
+    ).values('email_lower').annotate(
+        count=Count('id'),
+    ).filter(count__gt=1).order_by('email_lower').values_list(
+        'email_lower', 'count',
+    )[:DUPLICATE_EMAILS_REPORT_LIMIT + 1])
+    if not duplicates:
+        return
+
+    report = '\n'.join(
+        f'  {email}: {count}'
+        for email, count in duplicates[:DUPLICATE_EMAILS_REPORT_LIMIT]
+    )
+    if len(duplicates) > DUPLICATE_EMAILS_REPORT_LIMIT:
+        report += '\n  ...'
+    raise RuntimeError(
+        'Почты пользователей совпадают без учета регистра, уникальный '
+        'индекс создать нельзя. Исправьте почты и повторите миграцию:\n'
+        + report
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Уникальный индекс по почте пользователя без учета регистра.
+
+    Модель пользователя принадлежит приложению auth, поэтому индекс
+    создается SQL-запросом. Пустые почты в индекс не попадают.
+    Перед созданием индекса проверяется, что почты уже уникальны.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('clients', '0009_float_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            check_duplicate_emails,
+            reverse_code=migrations.RunPython.noop,
+        ),
+        migrations.RunSQL(
+            sql='CREATE UNIQUE INDEX auth_user_email_ci_uniq '
+                'ON auth_user (LOWER(email)) WHERE email <> \'\'',
+            reverse_sql='DROP INDEX auth_user_email_ci_uniq',
+        ),
+    ]
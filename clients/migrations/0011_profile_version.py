@@ -0,0 +1,18 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0010_user_email_ci_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Увеличивается при каждом изменении пользователя или профиля. Используется для ETag.', verbose_name='Версия'),
+        ),
+    ]
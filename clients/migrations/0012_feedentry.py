@@ -0,0 +1,37 @@
+# Generated by Django 4.0.2 on 2026-10-18 16:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0011_profile_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance', models.FloatField(verbose_name='Расстояние в км')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время добавления')),
+                ('liked_at', models.DateTimeField(blank=True, null=True, verbose_name='Время оценки')),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clients.profile', verbose_name='Рекомендуемый профиль')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='clients.profile', verbose_name='Владелец ленты')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты рекомендаций',
+                'verbose_name_plural': 'Записи лент рекомендаций',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(condition=models.Q(('liked_at__isnull', True)), fields=['owner', 'distance', 'id'], name='clients_feed_active_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('owner', 'candidate'), name='clients_feed_unique_pair'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.0.2 on 2026-10-18 17:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Количество лент, ставящихся в очередь за раз.
+BATCH_SIZE = 5000
+
+
+def mark_all_feeds_stale(apps, schema_editor) -> None:
+    """
+    Функция постановки всех лент в очередь на пополнение.
+
+    Ленты до этой миграции заполнялись без учета гендера, поэтому
+    обработчик очереди должен дополнить каждую из них.
+    """
+
+    Profile = apps.get_model('clients', 'Profile')
+    StaleFeed = apps.get_model('clients', 'StaleFeed')
+    alias = schema_editor.connection.alias
+    profile_pks = Profile.objects.using(alias).order_by('pk') \
+        .values_list('pk', flat=True)
+    last_pk = 0
+    while True:
+        batch = list(profile_pks.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1]
+        StaleFeed.objects.using(alias).bulk_create(
+            [StaleFeed(owner_id=pk) for pk in batch],
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0012_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleFeed',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='clients.profile', verbose_name='Владелец ленты')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Время постановки в очередь')),
+            ],
+            options={
+                'verbose_name': 'Лента, ожидающая пополнения',
+                'verbose_name_plural': 'Ленты, ожидающие пополнения',
+            },
+        ),
+        migrations.RunPython(
+            mark_all_feeds_stale,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def requeue_ready_avatars(apps, schema_editor) -> None:
+    """
+    Функция возврата обработанных аватаров в очередь.
+
+    Имена файлов миниатюр теперь включают расширение исходного файла,
+    поэтому миниатюры заново создает команда process_avatars.
+    """
+
+    Profile = apps.get_model('clients', 'Profile')
+    Profile.objects.using(schema_editor.connection.alias).filter(
+        avatar_status='ready',
+    ).update(avatar_status='pending', version=F('version') + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0013_stalefeed'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            requeue_ready_avatars,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -1,8 +1,19 @@
+from math import (
+    radians,
+    sin, cos,
+)
+
 from django.db import models
 from django.core import validators
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .geo import (
+    GEOHASH_PRECISIONS,
+    geohash_encode,
+)
+
 
 class Profile(models.Model):
     """
@@ -17,34 +28,89 @@ class Profile(models.Model):
         MALE = 'M', _('Мужской')
         FEMALE = 'F', _('Женский')
 
+    class AvatarStatus(models.TextChoices):
+        """Класс для выбора статуса обработки аватара"""
+
+        NONE = 'none', _('Не загружен')
+        PENDING = 'pending', _('Ожидает обработки')
+        PROCESSING = 'processing', _('Обрабатывается')
+        READY = 'ready', _('Готов')
+        FAILED = 'failed', _('Ошибка обработки')
+
     avatar = models.ImageField(
         upload_to='user_avatars',
         verbose_name=_('Аватар'),
         null=True,
     )
+    avatar_status = models.CharField(
+        max_length=10,
+        choices=AvatarStatus.choices,
+        default=AvatarStatus.NONE,
+        db_index=True,
+        verbose_name=_('Статус обработки аватара'),
+    )
     gender = models.CharField(
         max_length=2,
         choices=Gender.choices,
         verbose_name=_('Пол'),
     )
-    latitude = models.DecimalField(
-        max_digits=30,
-        decimal_places=20,
+    latitude = models.FloatField(
         validators=[validators.MinValueValidator(-180),
                     validators.MaxValueValidator(180)],
         verbose_name=_('Широта'),
         help_text=_('Восточное направление считается положительным. '
                     'Западное - отрицательным.')
     )
-    longitude = models.DecimalField(
-        max_digits=30,
-        decimal_places=20,
+    longitude = models.FloatField(
         validators=[validators.MinValueValidator(-180),
                     validators.MaxValueValidator(180)],
         verbose_name=_('Долгота'),
         help_text=_('Северное направление считается положительным. '
                     'Южное - отрицательным.')
     )
+    lat_sin = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name=_('Синус широты'),
+    )
+    lat_cos = models.FloatField(
+        default=1,
+        editable=False,
+        verbose_name=_('Косинус широты'),
+    )
+    lon_rad = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name=_('Долгота в радианах'),
+    )
+    geohash_3 = models.CharField(
+        max_length=3,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_('Геохеш (ячейка ~156 км)'),
+    )
+    geohash_4 = models.CharField(
+        max_length=4,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_('Геохеш (ячейка ~39 км)'),
+    )
+    geohash_5 = models.CharField(
+        max_length=5,
+        blank=True,
+        db_index=True,
+        editable=False,
+        verbose_name=_('Геохеш (ячейка ~5 км)'),
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_('Версия'),
+        help_text=_('Увеличивается при каждом изменении пользователя '
+                    'или профиля. Используется для ETag.'),
+    )
     user = models.OneToOneField(
         to=User,
         on_delete=models.CASCADE,
@@ -53,6 +119,8 @@ class Profile(models.Model):
     )
     lovers = models.ManyToManyField(
         to='Profile',
+        through='Like',
+        through_fields=('beloved', 'lover'),
         symmetrical=False,
         blank=True,
         verbose_name=_('Оценившие'),
@@ -62,6 +130,303 @@ class Profile(models.Model):
         """Класс настроек модели"""
         verbose_name = _('Профиль пользователя')
         verbose_name_plural = _('Профили пользователей')
+        indexes = [
+            # Индекс для предварительного отбора
+            # пользователей по прямоугольнику координат.
+            models.Index(fields=('latitude', 'longitude'),
+                         name='clients_profile_lat_lon_idx'),
+        ]
+
+    # Поля, значения которых вычисляются из координат.
+    SPATIAL_FIELDS = ('lat_sin', 'lat_cos', 'lon_rad') + tuple(
+        f'geohash_{precision}' for precision in GEOHASH_PRECISIONS
+    )
+    # Поля, от которых зависят записи лент рекомендаций.
+    FEED_FIELDS = ('gender', 'latitude', 'longitude')
 
     def __str__(self) -> str:
         return f'{_("Профиль")} пользователя {self.user}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values) -> 'Profile':
+        """
+        Метод создания профиля из строки БД.
+
+        Запоминает загруженные значения полей лент рекомендаций,
+        чтобы при сохранении узнать, изменились ли они.
+        """
+
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_feed_values = {
+            name: value for name, value in zip(field_names, values)
+            if name in cls.FEED_FIELDS and value is not models.DEFERRED
+        }
+        return instance
+
+    def feed_fields_changed(self) -> bool:
+        """
+        Метод проверки, изменились ли поля лент с момента загрузки.
+
+        Если поле не загружалось из БД, считается, что оно изменилось.
+        """
+
+        loaded = getattr(self, '_loaded_feed_values', {})
+        return any(name not in loaded or loaded[name] != getattr(self, name)
+                   for name in self.FEED_FIELDS)
+
+    def refresh_spatial_fields(self) -> None:
+        """
+        Метод пересчета полей, производных от координат.
+
+        Вызывается при каждом сохранении профиля. Для записей,
+        сохраняемых в обход save (например, через bulk_create),
+        его необходимо вызывать вручную.
+        """
+
+        latitude, longitude = float(self.latitude), float(self.longitude)
+
+        # Тригонометрические функции координат считаются один раз
+        # при сохранении, а не для каждой записи в каждом запросе.
+        self.lat_sin = sin(radians(latitude))
+        self.lat_cos = cos(radians(latitude))
+        self.lon_rad = radians(longitude)
+
+        for precision in GEOHASH_PRECISIONS:
+            setattr(self, f'geohash_{precision}',
+                    geohash_encode(latitude, longitude, precision))
+
+    def save(self, *args, **kwargs) -> None:
+        """
+        Метод сохранения профиля с пересчетом производных полей
+        и увеличением версии
+        """
+
+        # Прежний регион нужен для сброса закэшированных списков.
+        # Если поле не загружено, регион неизвестен.
+        self._previous_geohash_3 = self.__dict__.get('geohash_3')
+        self.refresh_spatial_fields()
+
+        # Если сохраняются только координаты,
+        # производные поля тоже необходимо обновить.
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None \
+                and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = \
+                set(update_fields) | set(self.SPATIAL_FIELDS)
+
+        # Версия увеличивается в БД, чтобы параллельные
+        # сохранения не получили одну и ту же версию.
+        adding = self._state.adding
+        if not adding:
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = \
+                    set(kwargs['update_fields']) | {'version'}
+
+        super().save(*args, **kwargs)
+
+        if not adding:
+            self.refresh_from_db(fields=('version', ))
+        update_fields = kwargs.get('update_fields')
+        self._loaded_feed_values = {
+            **getattr(self, '_loaded_feed_values', {}),
+            **{name: getattr(self, name) for name in self.FEED_FIELDS
+               if update_fields is None or name in update_fields},
+        }
+
+
+class Like(models.Model):
+    """
+    Модель оценки одного пользователя другим.
+
+    Пара (оценивший, оцененный) уникальна, поэтому проверка
+    существования оценки выполняется по индексу.
+    """
+
+    lover = models.ForeignKey(
+        to=Profile,
+        on_delete=models.CASCADE,
+        related_name='given_likes',
+        verbose_name=_('Оценивший'),
+    )
+    beloved = models.ForeignKey(
+        to=Profile,
+        on_delete=models.CASCADE,
+        related_name='received_likes',
+        verbose_name=_('Оцененный'),
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Время оценки'),
+    )
+
+    class Meta:
+        """Класс настроек модели"""
+        verbose_name = _('Оценка')
+        verbose_name_plural = _('Оценки')
+        constraints = [
+            models.UniqueConstraint(fields=('lover', 'beloved'),
+                                    name='clients_like_unique_pair'),
+        ]
+        indexes = [
+            # Индекс для вывода оценивших пользователя от новых к старым.
+            models.Index(fields=('beloved', '-created_at', '-id'),
+                         name='clients_like_beloved_new_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.lover_id} -> {self.beloved_id}'
+
+
+class FeedEntry(models.Model):
+    """
+    Модель записи ленты рекомендаций пользователя.
+
+    Лента - очередь ближайших профилей, которые владелец еще не оценил.
+    Ее заранее заполняет команда refill_feeds, а при оценке профиля
+    запись отмечается оцененной и больше не выдается и не добавляется.
+    Записи заполняются отдельно для каждого гендера рекомендуемых
+    профилей, поэтому фильтр по гендеру не остается пустым.
+    """
+
+    owner = models.ForeignKey(
+        to=Profile,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name=_('Владелец ленты'),
+    )
+    candidate = models.ForeignKey(
+        to=Profile,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('Рекомендуемый профиль'),
+    )
+    distance = models.FloatField(
+        verbose_name=_('Расстояние в км'),
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Время добавления'),
+    )
+    liked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Время оценки'),
+    )
+
+    class Meta:
+        """Класс настроек модели"""
+        verbose_name = _('Запись ленты рекомендаций')
+        verbose_name_plural = _('Записи лент рекомендаций')
+        constraints = [
+            models.UniqueConstraint(fields=('owner', 'candidate'),
+                                    name='clients_feed_unique_pair'),
+        ]
+        indexes = [
+            # Индекс для постраничной выдачи ленты от ближних к дальним.
+            models.Index(fields=('owner', 'distance', 'id'),
+                         condition=models.Q(liked_at__isnull=True),
+                         name='clients_feed_active_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.owner_id}: {self.candidate_id}'
+
+
+class StaleFeed(models.Model):
+    """
+    Модель ленты рекомендаций, ожидающей пополнения.
+
+    Лента попадает в очередь при регистрации владельца, при оценке
+    профиля из ленты и при изменении координат или гендера владельца
+    или рекомендованного ему профиля. Команда refill_feeds пополняет
+    только ленты из очереди, не обходя всех пользователей.
+    """
+
+    owner = models.OneToOneField(
+        to=Profile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name=_('Владелец ленты'),
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name=_('Время постановки в очередь'),
+    )
+
+    class Meta:
+        """Класс настроек модели"""
+        verbose_name = _('Лента, ожидающая пополнения')
+        verbose_name_plural = _('Ленты, ожидающие пополнения')
+
+    def __str__(self) -> str:
+        return str(self.owner_id)
+
+
+class MatchNotification(models.Model):
+    """
+    Модель письма о взаимной симпатии.
+
+    Письма сохраняются в той же транзакции, что и взаимная симпатия,
+    а отправляются отдельным процессом командой send_match_notifications.
+    """
+
+    class Status(models.TextChoices):
+        """Класс для выбора статуса письма"""
+
+        PENDING = 'pending', _('Ожидает отправки')
+        SENT = 'sent', _('Отправлено')
+        FAILED = 'failed', _('Не отправлено')
+
+    recipient_email = models.EmailField(
+        verbose_name=_('Эл. почта получателя'),
+    )
+    subject = models.CharField(
+        max_length=255,
+        verbose_name=_('Тема'),
+    )
+    body = models.TextField(
+        verbose_name=_('Текст'),
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name=_('Статус'),
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_('Количество попыток отправки'),
+    )
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name=_('Время следующей попытки'),
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name=_('Последняя ошибка'),
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Время создания'),
+    )
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('Время отправки'),
+    )
+
+    class Meta:
+        """Класс настроек модели"""
+        verbose_name = _('Письмо о взаимной симпатии')
+        verbose_name_plural = _('Письма о взаимной симпатии')
+        indexes = [
+            # Индекс для выборки писем, готовых к отправке.
+            models.Index(fields=('status', 'next_attempt_at'),
+                         name='clients_match_notif_due_idx'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{_("Письмо")} для {self.recipient_email}'
@@ -0,0 +1,218 @@
+import smtplib
+from datetime import timedelta
+from typing import (
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import (
+    EmailMessage,
+    get_connection,
+)
+from django.db import (
+    connection as db_connection,
+    transaction,
+)
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import MatchNotification
+
+
+def enqueue_match_notifications(first_user: User, second_user: User) -> None:
+    """
+    Функция постановки в очередь писем о взаимной симпатии.
+
+    Каждый из пользователей получает письмо с именем и почтой
+    другого пользователя. Функцию следует вызывать в той же
+    транзакции, в которой фиксируется взаимная симпатия.
+
+    :param first_user: Первый пользователь пары.
+    :param second_user: Второй пользователь пары.
+    """
+
+    enqueue_matches_notifications([(first_user, second_user)])
+
+
+def enqueue_matches_notifications(pairs: Iterable[Tuple[User, User]]
+                                  ) -> None:
+    """
+    Функция постановки в очередь писем о взаимной симпатии
+    для нескольких пар пользователей одним запросом.
+
+    :param pairs: Пары пользователей с взаимной симпатией.
+    """
+
+    subject = render_to_string('clients/subject_template.txt').strip()
+    MatchNotification.objects.bulk_create([
+        MatchNotification(
+            recipient_email=recipient.email,
+            subject=subject,
+            body=render_to_string('clients/message_template.txt', {
+                'username': lover.username,
+                'email': lover.email,
+            }),
+        )
+        for first_user, second_user in pairs
+        for recipient, lover in ((first_user, second_user),
+                                 (second_user, first_user))
+    ])
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    """
+    Функция вычисления задержки перед повторной отправкой письма.
+
+    Задержка растет экспоненциально с каждой неудачной попыткой.
+
+    :param attempts: Количество уже сделанных попыток.
+    :return: Задержка перед следующей попыткой.
+    """
+
+    return timedelta(seconds=settings.MATCH_NOTIFICATION_RETRY_DELAY
+                     * 2 ** (attempts - 1))
+
+
+def claim_notifications(batch_size: int) -> List[MatchNotification]:
+    """
+    Функция захвата пачки писем, готовых к отправке.
+
+    Захват выполняется в короткой транзакции: время следующей попытки
+    захваченных писем переносится на время аренды, поэтому другие
+    обработчики очереди их не берут, а если обработчик завершится
+    аварийно, письма снова станут доступны после окончания аренды.
+
+    :param batch_size: Максимальное количество писем в пачке.
+    :return: Захваченные письма.
+    """
+
+    now = timezone.now()
+    lease_until = now + timedelta(
+        seconds=settings.MATCH_NOTIFICATION_LEASE_TIMEOUT,
+    )
+    with transaction.atomic():
+        queryset = MatchNotification.objects.filter(
+            status=MatchNotification.Status.PENDING,
+            next_attempt_at__lte=now,
+        ).order_by('next_attempt_at', 'pk')
+        if db_connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return []
+        # Условие на время попытки повторяется в обновлении, чтобы
+        # без блокировки строк письмо не захватили два обработчика.
+        MatchNotification.objects.filter(
+            pk__in=pks, next_attempt_at__lte=now,
+        ).update(next_attempt_at=lease_until)
+
+    return list(MatchNotification.objects.filter(
+        pk__in=pks, next_attempt_at=lease_until,
+    ).order_by('pk'))
+
+
+def send_pending_notifications(batch_size: int = 100,
+                               mail_connection=None) -> Tuple[int, int]:
+    """
+    Функция отправки пачки писем, готовых к отправке.
+
+    Все письма пачки отправляются через одно соединение с почтовым
+    сервером, которое открывается перед пачкой и закрывается после нее.
+    Письма, которые не удалось отправить, откладываются
+    с экспоненциальной задержкой, а после исчерпания попыток
+    помечаются как неотправленные. Отправка выполняется вне
+    транзакции, чтобы не держать блокировки во время работы с сетью.
+
+    :param batch_size: Максимальное количество писем в пачке.
+    :param mail_connection:
+        Бэкенд отправки почты. Если не передан, создается бэкенд
+        по умолчанию.
+    :return: Количество отправленных и неотправленных писем.
+    """
+
+    count_sent = count_failed = 0
+    notifications = claim_notifications(batch_size)
+    if not notifications:
+        return count_sent, count_failed
+
+    if mail_connection is None:
+        mail_connection = get_connection()
+    # Если почтовый сервер недоступен, попытка
+    # отправки засчитывается всем письмам пачки.
+    try:
+        mail_connection.open()
+        connection_error = None
+    except (smtplib.SMTPException, OSError) as error:
+        connection_error = f'{type(error).__name__}: {error}'
+    try:
+        for notification in notifications:
+            error = connection_error or \
+                _send_notification(notification, mail_connection)
+            notification.attempts += 1
+            if error is None:
+                notification.status = MatchNotification.Status.SENT
+                notification.sent_at = timezone.now()
+                notification.last_error = ''
+                count_sent += 1
+                continue
+
+            notification.last_error = error
+            count_failed += 1
+            if notification.attempts \
+                    >= settings.MATCH_NOTIFICATION_MAX_ATTEMPTS:
+                notification.status = MatchNotification.Status.FAILED
+            else:
+                notification.next_attempt_at = timezone.now() \
+                    + get_retry_delay(notification.attempts)
+    finally:
+        try:
+            mail_connection.close()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    with transaction.atomic():
+        MatchNotification.objects.bulk_update(notifications, (
+            'status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at',
+        ))
+
+    return count_sent, count_failed
+
+
+def _send_notification(notification: MatchNotification,
+                       mail_connection) -> Optional[str]:
+    """
+    Функция отправки одного письма.
+
+    Любая ошибка записывается в письмо, чтобы она не прервала
+    обработку пачки и попытки остальных писем были учтены.
+
+    :return: Текст ошибки или None, если письмо отправлено.
+    """
+
+    message = EmailMessage(
+        subject=notification.subject,
+        body=notification.body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=(notification.recipient_email, ),
+        connection=mail_connection,
+    )
+    try:
+        message.send()
+    except OSError as error:
+        # После разрыва соединения бэкенд не переподключается сам,
+        # поэтому соединение закрывается и откроется при следующем письме.
+        if isinstance(error, smtplib.SMTPServerDisconnected) \
+                or not isinstance(error, smtplib.SMTPException):
+            try:
+                mail_connection.close()
+            except (smtplib.SMTPException, OSError):
+                pass
+        return f'{type(error).__name__}: {error}'
+    except Exception as error:
+        return f'{type(error).__name__}: {error}'
+
+    return None
@@ -0,0 +1,234 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from contextlib import ExitStack
+from typing import (
+    Callable,
+    List,
+    Optional,
+)
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    connections,
+)
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+)
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from api.clients.authentication import CachedJWTAuthentication
+from .metrics import UNMATCHED_ROUTE
+
+
+logger = logging.getLogger(__name__)
+
+# Заголовок и параметр запроса, по которым сотрудник
+# может запросить профилирование своего запроса.
+PROFILING_HEADER = 'X-Profile'
+PROFILING_QUERY_PARAM = '_profile'
+
+# Сколько различных запросов к БД одного HTTP-запроса объясняется через EXPLAIN.
+MAX_EXPLAINED_QUERIES = 20
+
+
+class QueryRecorder:
+    """
+    Класс обертки выполнения запросов к БД.
+
+    Подключается через connection.execute_wrapper и сохраняет
+    текст, параметры и время выполнения каждого запроса. Параметры
+    нужны только для EXPLAIN и в файл профиля не попадают.
+    """
+
+    def __init__(self, alias: str, queries: List[dict]) -> None:
+        self.alias = alias
+        self.queries = queries
+
+    def __call__(self, execute: Callable, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                'params': params,
+                'many': many,
+                'duration_ms': (time.perf_counter() - start) * 1000,
+            })
+
+
+class ProfilingMiddleware:
+    """
+    Класс промежуточного слоя профилирования запросов.
+
+    Запрос выполняется под cProfile, если сотрудник передал заголовок
+    X-Profile: 1 или параметр _profile=1, а также случайно с вероятностью
+    PROFILING_SAMPLE_RATE. Статистика вызовов, запросы к БД и их планы
+    сохраняются в каталог PROFILING_DIR.
+
+    Пользователь, запросивший профилирование, проверяется до выполнения
+    запроса, поэтому посторонние не могут нагрузить сервер профилированием.
+    """
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]
+                 ) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        trigger = get_trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        queries: List[dict] = []
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    QueryRecorder(connection.alias, queries),
+                ))
+            try:
+                profiler.enable()
+            except ValueError:
+                # В процессе уже работает другой профилировщик.
+                return self.get_response(request)
+            start = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                duration = time.perf_counter() - start
+                profiler.disable()
+
+        try:
+            save_profile(request, response, trigger, profiler,
+                         duration, queries)
+        except OSError:
+            logger.exception('Не удалось сохранить профиль запроса %s',
+                             request.path)
+        return response
+
+
+def get_trigger(request: HttpRequest) -> Optional[str]:
+    """
+    Функция определения, нужно ли профилировать запрос.
+
+    :return: 'request', если профилирование запрошено заголовком
+        или параметром, 'sample', если запрос выбран случайно, иначе None.
+    """
+
+    if (request.headers.get(PROFILING_HEADER) == '1'
+            or request.GET.get(PROFILING_QUERY_PARAM) == '1') \
+            and is_staff_request(request):
+        return 'request'
+    if random.random() < settings.PROFILING_SAMPLE_RATE:
+        return 'sample'
+    return None
+
+
+def is_staff_request(request: HttpRequest) -> bool:
+    """
+    Функция проверки, что запрос отправил сотрудник.
+
+    Пользователь определяется по сессии, а если ее нет - по JWT-токену.
+    Пользователь по токену берется из кэша аутентификации, поэтому
+    проверка обычно не обращается к БД.
+    """
+
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except APIException:
+            return False
+        user = result[0] if result is not None else None
+    return user is not None and user.is_staff
+
+
+def save_profile(request: HttpRequest, response: HttpResponse, trigger: str,
+                 profiler: cProfile.Profile, duration: float,
+                 queries: List[dict]) -> str:
+    """
+    Функция сохранения профиля запроса.
+
+    В каталог PROFILING_DIR записываются два файла с общим именем:
+    .prof со статистикой вызовов для pstats и .json со сведениями
+    о запросе, запросами к БД и их планами.
+
+    :return: Путь до файла со сведениями о запросе.
+    """
+
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = f'{timezone.now():%Y%m%dT%H%M%S}-{os.getpid()}-' \
+           f'{uuid.uuid4().hex[:8]}'
+
+    profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+
+    resolver_match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    explain_queries(queries)
+    # Параметры запросов могут содержать хэши паролей, почты и токены.
+    for query in queries:
+        del query['params']
+    info = {
+        'route': resolver_match.route if resolver_match is not None
+        else UNMATCHED_ROUTE,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'trigger': trigger,
+        'user_id': user.pk if user is not None else None,
+        'finished_at': timezone.now().isoformat(),
+        'duration_ms': duration * 1000,
+        'profile': f'{name}.prof',
+        'queries': queries,
+    }
+    path = os.path.join(directory, f'{name}.json')
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(info, file, ensure_ascii=False, indent=2, default=str)
+
+    return path
+
+
+def explain_queries(queries: List[dict]) -> None:
+    """
+    Функция добавления планов выполнения к запросам на чтение.
+
+    Одинаковые запросы объясняются один раз. План сохраняется
+    в поле explain запроса в виде списка строк результата EXPLAIN.
+    """
+
+    plans = {}
+    for query in queries:
+        if query['many'] or not query['sql'].lstrip().upper() \
+                .startswith('SELECT'):
+            continue
+
+        key = (query['alias'], query['sql'], repr(query['params']))
+        if key not in plans:
+            if len(plans) >= MAX_EXPLAINED_QUERIES:
+                continue
+            plans[key] = explain_query(query['alias'], query['sql'],
+                                       query['params'])
+        query['explain'] = plans[key]
+
+
+def explain_query(alias: str, sql: str, params) -> List[list]:
+    """Функция получения плана выполнения запроса"""
+
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}',
+                           params)
+            return [list(row) for row in cursor.fetchall()]
+    except DatabaseError as error:
+        return [[f'EXPLAIN не выполнен: {error}']]
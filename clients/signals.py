@@ -0,0 +1,161 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+)
+from django.db import transaction
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+from . import geo_engine
+from .cache import (
+    invalidate_auth_user,
+    invalidate_user_lists,
+    remember_blacklisted_token,
+)
+from .feed import (
+    expire_feed_entries,
+    mark_feeds_stale,
+)
+from .models import Profile
+
+
+# Поля пользователя и профиля, которые выдаются в списках пользователей.
+USER_LIST_USER_FIELDS = frozenset(('username', 'first_name',
+                                   'last_name', 'email'))
+USER_LIST_PROFILE_FIELDS = frozenset(('avatar', 'avatar_status', 'gender',
+                                      'latitude', 'longitude'))
+
+
+@receiver(post_save, sender=User)
+def invalidate_lists_on_user_save(sender, instance, created=False,
+                                  update_fields=None, **kwargs) -> None:
+    """Сброс закэшированных списков при изменении пользователя"""
+
+    # Изменение полей, которых нет в списках (например, пароля
+    # или времени входа), не сбрасывает кэш.
+    if update_fields is not None \
+            and not USER_LIST_USER_FIELDS & set(update_fields):
+        return
+
+    # У нового пользователя еще нет профиля, поэтому его
+    # нет в списках с фильтром по расстоянию.
+    if created:
+        invalidate_user_lists(())
+        return
+
+    invalidate_user_lists(Profile.objects.filter(user_id=instance.pk)
+                          .values_list('geohash_3', flat=True))
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_lists_on_profile_save(sender, instance, update_fields=None,
+                                     **kwargs) -> None:
+    """Сброс закэшированных списков при изменении профиля"""
+
+    if update_fields is not None \
+            and not USER_LIST_PROFILE_FIELDS & set(update_fields):
+        return
+
+    # Если профиль переместился, он пропадает из списков прежнего региона.
+    previous_geohash = getattr(instance, '_previous_geohash_3', None)
+    if previous_geohash is None and not kwargs.get('created'):
+        invalidate_user_lists()
+        return
+
+    invalidate_user_lists((instance.geohash_3, previous_geohash))
+
+
+@receiver(post_delete, sender=User)
+def invalidate_lists_on_user_delete(sender, instance, **kwargs) -> None:
+    """Сброс закэшированных списков при удалении пользователя"""
+
+    # Списки регионов сбрасываются при удалении профиля.
+    invalidate_user_lists(())
+
+
+@receiver(post_delete, sender=Profile)
+def invalidate_lists_on_profile_delete(sender, instance, **kwargs) -> None:
+    """Сброс закэшированных списков при удалении профиля"""
+
+    invalidate_user_lists((instance.geohash_3, ))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_auth_user_on_user_change(sender, instance, **kwargs) -> None:
+    """Сброс закэшированного для аутентификации пользователя"""
+
+    invalidate_auth_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_auth_user_on_profile_change(sender, instance,
+                                           **kwargs) -> None:
+    """Сброс закэшированного для аутентификации пользователя"""
+
+    invalidate_auth_user(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def bump_profile_version_on_user_save(sender, instance, created=False,
+                                      update_fields=None, **kwargs) -> None:
+    """Увеличение версии профиля при изменении данных пользователя"""
+
+    # У нового пользователя еще нет профиля, а время входа
+    # не входит в данные пользователя в ответах API.
+    if created or (update_fields is not None
+                   and set(update_fields) == {'last_login'}):
+        return
+
+    Profile.objects.filter(user_id=instance.pk) \
+        .update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Profile)
+def update_geo_snapshot_on_save(sender, instance, update_fields=None,
+                                **kwargs) -> None:
+    """Обновление снимка координат после сохранения профиля"""
+
+    # Снимок должен видеть только зафиксированные изменения.
+    transaction.on_commit(
+        lambda: geo_engine.profile_saved(instance, update_fields),
+    )
+
+
+@receiver(post_delete, sender=Profile)
+def update_geo_snapshot_on_delete(sender, instance, **kwargs) -> None:
+    """Обновление снимка координат после удаления профиля"""
+
+    profile_pk = instance.pk
+    transaction.on_commit(lambda: geo_engine.profile_deleted(profile_pk))
+
+
+@receiver(post_save, sender=Profile)
+def update_feeds_on_profile_save(sender, instance, created=False,
+                                 update_fields=None, **kwargs) -> None:
+    """Обновление лент рекомендаций после сохранения профиля"""
+
+    # Лента нового пользователя заполняется сразу, без полного прохода.
+    if created:
+        mark_feeds_stale((instance.pk, ))
+        return
+
+    if update_fields is not None \
+            and not set(Profile.FEED_FIELDS) & set(update_fields):
+        return
+    # Записи с прежними координатами и гендером больше не верны.
+    if instance.feed_fields_changed():
+        expire_feed_entries(instance)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def cache_blacklisted_token(sender, instance, created=False,
+                            **kwargs) -> None:
+    """Сохранение токена, добавленного в черный список, в кэш"""
+
+    if created:
+        remember_blacklisted_token(instance.token.jti,
+                                   instance.token.expires_at)
@@ -0,0 +1,15 @@
+from io import BytesIO
+
+from PIL import Image
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+
+def make_test_image(name: str = 'avatar.png',
+                    size: tuple = (300, 200)) -> SimpleUploadedFile:
+    """Функция создания тестового изображения для загрузки"""
+
+    buffer = BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/png')
@@ -1,3 +1,610 @@
-from django.test import TestCase
+import json
+import random
+import shutil
+import smtplib
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from math import (
+    cos,
+    radians,
+    sin,
+)
+from unittest import (
+    mock,
+    skipIf,
+)
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import models
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from clients import geo_engine
+from clients.avatars import get_variant_name
+from clients.cache import (
+    GEO_SNAPSHOT_VERSION_KEY,
+    get_auth_user_key,
+    increment_version,
+)
+from clients.geo import (
+    geohash_encode,
+    great_circle_distance,
+    haversine_expression,
+)
+from clients.models import (
+    Like,
+    Profile,
+    MatchNotification,
+)
+from clients.notifications import (
+    claim_notifications,
+    enqueue_match_notifications,
+    send_pending_notifications,
+)
+from clients.testing import make_test_image
+from clients.watermark import load_watermark
+
+
+class ProfileTests(TestCase):
+    """Юнит-тесты для проверки модели профиля"""
+
+    def setUp(self) -> None:
+        """Метод установки тестовых данных"""
+
+        self.user = User.objects.create(username='profile_user')
+        self.profile = Profile.objects.create(
+            user=self.user,
+            gender=Profile.Gender.MALE,
+            latitude=55.75,
+            longitude=37.6,
+        )
+
+    def test_geohash_on_save(self) -> None:
+        """Тест пересчета геохешей при сохранении профиля"""
+
+        self.assertEqual(self.profile.geohash_5, 'ucftp')
+
+        self.profile.latitude = 57.64911
+        self.profile.longitude = 10.40744
+        self.profile.save(update_fields=('latitude', 'longitude'))
+        self.profile.refresh_from_db()
+
+        self.assertEqual(self.profile.geohash_3, 'u4p')
+        self.assertEqual(self.profile.geohash_5, 'u4pru')
+
+    def test_backfill_geohash(self) -> None:
+        """Тест команды заполнения геохешей"""
+
+        Profile.objects.update(geohash_3='', geohash_4='', geohash_5='')
+
+        call_command('backfill_geohash', batch_size=1, stdout=StringIO())
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.geohash_4,
+                         geohash_encode(55.75, 37.6, 4))
+
+    def test_distance_by_precomputed_trigonometry(self) -> None:
+        """Тест расстояния по заранее вычисленным функциям координат"""
+
+        self.profile.latitude = -33.86
+        self.profile.longitude = 151.21
+        self.profile.save(update_fields=('latitude', 'longitude'))
+
+        distance = Profile.objects.annotate(
+            distance=haversine_expression(55.75, 37.6),
+        ).get(pk=self.profile.pk).distance
+
+        self.assertAlmostEqual(
+            distance, great_circle_distance(55.75, 37.6, -33.86, 151.21),
+            places=6,
+        )
+
+
+@skipIf(geo_engine.snapshot is None, 'numpy не установлен')
+@override_settings(GEO_ENGINE='numpy')
+class GeoEngineTests(TestCase):
+    """Юнит-тесты для проверки поиска по расстоянию в памяти"""
+
+    def setUp(self) -> None:
+        """Метод установки тестовых данных"""
+
+        random.seed(0)
+        for i in range(200):
+            Profile.objects.create(
+                user=User.objects.create(username=f'geo_user_{i}'),
+                gender=random.choice(Profile.Gender.values),
+                latitude=random.uniform(-90, 90),
+                longitude=random.uniform(-180, 180),
+            )
+        geo_engine.snapshot.load()
+
+    def find_by_sql(self, latitude: float, longitude: float,
+                    max_distance: float) -> list:
+        """Метод поиска профилей по расстоянию в СУБД"""
+
+        return list(Profile.objects.annotate(
+            distance=haversine_expression(latitude, longitude),
+        ).filter(distance__lte=max_distance).order_by('distance', 'pk')
+            .values_list('pk', flat=True))
+
+    def test_matches_sql(self) -> None:
+        """Тест совпадения результатов с вычислением в СУБД"""
+
+        for latitude, longitude, max_distance in ((55.75, 37.6, 3000),
+                                                  (0, 179.9, 5000),
+                                                  (-89.9, 0, 10000)):
+            with self.subTest(latitude=latitude, longitude=longitude):
+                self.assertEqual(
+                    geo_engine.snapshot.find_within(latitude, longitude,
+                                                    max_distance),
+                    self.find_by_sql(latitude, longitude, max_distance),
+                )
+
+    @skipIf(geo_engine.cKDTree is None, 'scipy не установлен')
+    def test_nearest_matches_sql(self) -> None:
+        """Тест совпадения ближайших профилей с сортировкой в СУБД"""
+
+        expected = self.find_by_sql(55.75, 37.6, 20000)
+        self.assertEqual(geo_engine.snapshot.find_nearest(55.75, 37.6, 10),
+                         expected[:10])
+        self.assertEqual(geo_engine.snapshot.find_nearest(
+            55.75, 37.6, 10, exclude=expected[0],
+        ), expected[1:11])
+        self.assertEqual(geo_engine.snapshot.find_nearest(
+            55.75, 37.6, 10, max_distance=3000,
+        ), self.find_by_sql(55.75, 37.6, 3000)[:10])
+
+    def test_distance_tolerance(self) -> None:
+        """Тест расхождения расстояний с вычисленными в СУБД"""
+
+        profiles = Profile.objects.annotate(
+            distance=haversine_expression(55.75, 37.6),
+        )
+        for profile in profiles:
+            # Профиль на границе отбирается, даже если в памяти
+            # расстояние получилось немного больше, чем в СУБД.
+            found = geo_engine.snapshot.find_within(55.75, 37.6,
+                                                    profile.distance)
+            self.assertIn(profile.pk, found)
+
+    def test_incremental_update(self) -> None:
+        """Тест обновления снимка по сигналам"""
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.create(
+                user=User.objects.create(username='geo_new_user'),
+                gender=Profile.Gender.FEMALE,
+                latitude=10,
+                longitude=10,
+            )
+        with self.assertNumQueries(0):
+            found = geo_engine.find_profiles_within(10, 10, 1)
+        self.assertEqual(found, [profile.pk])
+        self.assertEqual(geo_engine.find_profiles_within(
+            10, 10, 1, gender=Profile.Gender.MALE,
+        ), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.delete()
+        self.assertEqual(geo_engine.find_profiles_within(10, 10, 1), [])
+
+    @override_settings(GEO_ENGINE_REFRESH_INTERVAL=0)
+    def test_reload_on_version_change(self) -> None:
+        """Тест перезагрузки снимка после изменения в другом процессе"""
+
+        # Изменение в другом процессе не вызывает сигналов
+        # в текущем, а только увеличивает версию снимка.
+        Profile.objects.update(latitude=-10, longitude=-10,
+                               lat_sin=sin(radians(-10)),
+                               lat_cos=cos(radians(-10)),
+                               lon_rad=radians(-10))
+        increment_version(GEO_SNAPSHOT_VERSION_KEY)
+
+        self.assertEqual(len(geo_engine.find_profiles_within(-10, -10, 1)),
+                         Profile.objects.count())
+
+
+class PurgeExpiredTokensTests(TestCase):
+    """Юнит-тесты для проверки удаления истекших токенов"""
+
+    def test_purge_expired_tokens(self) -> None:
+        """Тест удаления только истекших токенов"""
+
+        user = User.objects.create(username='token_user')
+        now = timezone.now()
+        for i in range(5):
+            token = OutstandingToken.objects.create(
+                user=user, jti=f'expired_{i}', token='-',
+                expires_at=now - timedelta(days=1),
+            )
+            BlacklistedToken.objects.create(token=token)
+        OutstandingToken.objects.create(
+            user=user, jti='active', token='-',
+            expires_at=now + timedelta(days=1),
+        )
+
+        call_command('purge_expired_tokens', batch_size=2,
+                     stdout=StringIO())
+
+        self.assertEqual(
+            list(OutstandingToken.objects.values_list('jti', flat=True)),
+            ['active'],
+        )
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class BenchmarkTests(TestCase):
+    """Юнит-тесты для проверки генерации популяции и бенчмарков"""
+
+    def test_generate_population(self) -> None:
+        """Тест генерации пользователей, профилей и оценок"""
+
+        call_command('generate_population', users=50, likes_per_user=5,
+                     batch_size=20, stdout=StringIO())
+
+        self.assertEqual(Profile.objects.filter(
+            user__username__startswith='population_',
+        ).count(), 50)
+        self.assertTrue(Like.objects.exists())
+        self.assertFalse(Profile.objects.filter(latitude__gt=90).exists())
+        self.assertFalse(Like.objects.filter(
+            lover=models.F('beloved'),
+        ).exists())
+
+    def test_generate_population_seed(self) -> None:
+        """Тест воспроизводимости популяции при одинаковом --seed"""
+
+        def get_profiles(prefix: str) -> list:
+            call_command('generate_population', users=30, likes_per_user=0,
+                         batch_size=7, seed=42, prefix=prefix,
+                         stdout=StringIO())
+            return sorted(
+                (int(username.rsplit('_', 1)[1]), gender, latitude, longitude)
+                for username, gender, latitude, longitude
+                in Profile.objects.filter(
+                    user__username__startswith=f'{prefix}_',
+                ).values_list('user__username', 'gender',
+                              'latitude', 'longitude')
+            )
+
+        self.assertEqual(get_profiles('first'), get_profiles('second'))
+
+    def test_run_benchmarks(self) -> None:
+        """Тест отчета бенчмарков и отката изменений в БД"""
+
+        call_command('generate_population', users=20, likes_per_user=2,
+                     stdout=StringIO())
+        count_likes = Like.objects.count()
+        cache.set('run_benchmarks_test', True)
+
+        stdout = StringIO()
+        call_command('run_benchmarks', requests=3, warmup=1,
+                     stdout=stdout, stderr=StringIO())
+
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report['meta']['users'], 20)
+        for name, summary in report['scenarios'].items():
+            with self.subTest(scenario=name):
+                self.assertEqual(summary['errors'], 0)
+                self.assertIn('p99_ms', summary)
+                self.assertIn('queries_mean', summary)
+        self.assertEqual(Like.objects.count(), count_likes)
+        # Общий кэш не очищается.
+        self.assertTrue(cache.get('run_benchmarks_test'))
+
+
+class ImportUsersTests(TestCase):
+    """Юнит-тесты для проверки импорта пользователей"""
+
+    def setUp(self) -> None:
+        """Метод установки тестовых данных"""
+
+        user = User(username='existing', email='Taken@user.com')
+        user.set_password('existing_PASS_123')
+        user.save()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_file(self, name: str, content: str) -> str:
+        """Метод записи временного файла импорта"""
+
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_csv(self) -> None:
+        """Тест импорта из CSV с отклонением неверных строк"""
+
+        path = self.write_file('users.csv', (
+            'username,password,email,first_name,last_name,'
+            'gender,latitude,longitude\n'
+            'ivan,safe_PASS_123,ivan@user.com,Ivan,Ivanov,M,55.75,37.6\n'
+            'maria,safe_PASS_123,maria@user.com,Maria,Ivanova,F,59.9,30.3\n'
+            'short,123,short@user.com,Short,Pass,M,0,0\n'
+            'taken,safe_PASS_123,taken@USER.com,Taken,Mail,F,0,0\n'
+            'ivan2,safe_PASS_123,IVAN@user.com,Ivan,Copy,M,0,0\n'
+            'far,safe_PASS_123,far@user.com,Far,Away,F,200,0\n'
+        ))
+        stderr = StringIO()
+
+        call_command('import_users', path, workers=0, batch_size=1,
+                     stdout=StringIO(), stderr=stderr)
+
+        self.assertEqual(
+            set(User.objects.values_list('username', flat=True)),
+            {'existing', 'ivan', 'maria'},
+        )
+        self.assertEqual(stderr.getvalue().count('Строка'), 4)
+        ivan = User.objects.select_related('profile').get(username='ivan')
+        self.assertTrue(ivan.check_password('safe_PASS_123'))
+        self.assertEqual(ivan.profile.geohash_5, 'ucftp')
+
+    def test_import_jsonl_in_pool(self) -> None:
+        """Тест импорта из JSONL с хэшированием в нескольких процессах"""
+
+        existing_hash = User.objects.get(username='existing').password
+        rows = [
+            {'username': f'user_{i}', 'password': f'safe_PASS_{i}00',
+             'email': f'user_{i}@user.com', 'first_name': 'Name',
+             'last_name': 'Surname',
+             'profile': {'gender': 'F', 'latitude': i, 'longitude': i}}
+            for i in range(4)
+        ]
+        rows.append({'username': 'hashed', 'password_hash': existing_hash,
+                     'email': 'hashed@user.com', 'first_name': 'Name',
+                     'last_name': 'Surname', 'gender': 'M',
+                     'latitude': 1, 'longitude': 1})
+        path = self.write_file('users.jsonl', '\n'.join(
+            json.dumps(row) for row in rows
+        ))
+
+        call_command('import_users', path, workers=2, stdout=StringIO(),
+                     stderr=StringIO())
+
+        self.assertEqual(Profile.objects.count(), 5)
+        self.assertTrue(User.objects.get(username='user_3')
+                        .check_password('safe_PASS_300'))
+        self.assertEqual(User.objects.get(username='hashed').password,
+                         existing_hash)
+
+    def test_import_jsonl_invalid_lines(self) -> None:
+        """Тест отклонения строк JSONL, которые не являются объектами"""
+
+        row = {'username': 'valid', 'password': 'safe_PASS_123',
+               'email': 'valid@user.com', 'first_name': 'Name',
+               'last_name': 'Surname', 'gender': 'F',
+               'latitude': 1, 'longitude': 1}
+        path = self.write_file('users.jsonl', '\n'.join([
+            '{"username": "broken"',
+            '[1, 2]',
+            json.dumps({**row, 'username': 'nested', 'profile': [1, 2]}),
+            json.dumps(row),
+        ]))
+        stderr = StringIO()
+
+        call_command('import_users', path, workers=0, stdout=StringIO(),
+                     stderr=stderr)
+
+        self.assertEqual(
+            set(User.objects.values_list('username', flat=True)),
+            {'existing', 'valid'},
+        )
+        self.assertEqual(stderr.getvalue().count('Строка'), 3)
+
+
+class MatchNotificationTests(TestCase):
+    """Юнит-тесты для проверки очереди писем о взаимной симпатии"""
+
+    def setUp(self) -> None:
+        """Метод установки тестовых данных"""
+
+        self.first_user = User.objects.create(username='first',
+                                              email='first@user.com')
+        self.second_user = User.objects.create(username='second',
+                                               email='second@user.com')
+
+    def test_send_notifications(self) -> None:
+        """Тест отправки писем из очереди"""
+
+        enqueue_match_notifications(self.first_user, self.second_user)
+
+        call_command('send_match_notifications', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual({message.to[0] for message in mail.outbox},
+                         {'first@user.com', 'second@user.com'})
+        first_message = next(message for message in mail.outbox
+                             if message.to == ['first@user.com'])
+        self.assertIn('second@user.com', first_message.body)
+        self.assertEqual(MatchNotification.objects.filter(
+            status=MatchNotification.Status.SENT).count(), 2)
+
+    def test_retry_notifications(self) -> None:
+        """Тест откладывания писем при ошибке почтового сервера"""
+
+        enqueue_match_notifications(self.first_user, self.second_user)
+
+        with mock.patch.object(EmailBackend, 'send_messages',
+                               side_effect=smtplib.SMTPException('down')):
+            count_sent, count_failed = send_pending_notifications()
+
+        self.assertEqual((count_sent, count_failed), (0, 2))
+        for notification in MatchNotification.objects.all():
+            self.assertEqual(notification.status,
+                             MatchNotification.Status.PENDING)
+            self.assertEqual(notification.attempts, 1)
+            self.assertGreater(notification.next_attempt_at, timezone.now())
+
+        # Отложенные письма не отправляются раньше времени.
+        self.assertEqual(send_pending_notifications(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_reconnect_after_dropped_connection(self) -> None:
+        """Тест отправки следующей пачки после разрыва соединения"""
+
+        enqueue_match_notifications(self.first_user, self.second_user)
+        mail_connection = get_connection(
+            'django.core.mail.backends.smtp.EmailBackend',
+        )
+
+        with mock.patch('smtplib.SMTP') as smtp:
+            self.assertEqual(
+                send_pending_notifications(1, mail_connection), (1, 0),
+            )
+            # Сервер разорвал соединение, пока обработчик ждал.
+            smtp.return_value.sendmail.side_effect = \
+                smtplib.SMTPServerDisconnected('idle')
+            self.assertEqual(
+                send_pending_notifications(1, mail_connection), (0, 1),
+            )
+            smtp.return_value.sendmail.side_effect = None
+            MatchNotification.objects.update(next_attempt_at=timezone.now())
+            self.assertEqual(
+                send_pending_notifications(1, mail_connection), (1, 0),
+            )
+
+        # Соединение открывается заново для каждой пачки.
+        self.assertEqual(smtp.call_count, 3)
+
+    def test_unexpected_send_error(self) -> None:
+        """Тест учета непредвиденной ошибки отправки одного письма"""
+
+        enqueue_match_notifications(self.first_user, self.second_user)
+
+        with mock.patch.object(EmailBackend, 'send_messages',
+                               side_effect=[ValueError('header'), 1]):
+            count_sent, count_failed = send_pending_notifications()
+
+        self.assertEqual((count_sent, count_failed), (1, 1))
+        failed = MatchNotification.objects.get(attempts=1, sent_at=None)
+        self.assertEqual(failed.last_error, 'ValueError: header')
+        self.assertEqual(MatchNotification.objects.filter(
+            status=MatchNotification.Status.SENT).count(), 1)
+
+    def test_claim_notifications(self) -> None:
+        """Тест захвата писем обработчиком очереди на время аренды"""
+
+        enqueue_match_notifications(self.first_user, self.second_user)
+
+        claimed = claim_notifications(batch_size=10)
+        self.assertEqual(len(claimed), 2)
+        # Захваченные письма не достаются другому обработчику.
+        self.assertEqual(claim_notifications(batch_size=10), [])
+
+        # После окончания аренды письма снова доступны.
+        MatchNotification.objects.update(
+            next_attempt_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(len(claim_notifications(batch_size=10)), 2)
+
+
+class AvatarProcessingTests(TestCase):
+    """Юнит-тесты для проверки фоновой обработки аватаров"""
+
+    def setUp(self) -> None:
+        """Метод установки тестовых данных"""
+
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            AVATAR_WATERMARK_PATH=settings.BASE_DIR
+            / 'clients/static/clients/img/watermark.png',
+        )
+        self.settings_override.enable()
+
+        user = User.objects.create(username='avatar_user')
+        self.profile = Profile.objects.create(
+            user=user,
+            gender=Profile.Gender.FEMALE,
+            latitude=0,
+            longitude=0,
+            avatar=make_test_image(),
+            avatar_status=Profile.AvatarStatus.PENDING,
+        )
+
+    def tearDown(self) -> None:
+        """Метод удаления тестовых файлов"""
+
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def test_process_avatars(self) -> None:
+        """Тест создания миниатюр с водяным знаком фоновой командой"""
+
+        auth_user_key = get_auth_user_key(self.profile.user_id)
+        cache.set(auth_user_key, self.profile.user)
+
+        call_command('process_avatars', workers=0, stdout=StringIO())
+
+        # Статус обновляется в обход сигналов, поэтому закэшированный
+        # для аутентификации пользователь сбрасывается вручную.
+        self.assertIsNone(cache.get(auth_user_key))
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar_status,
+                         Profile.AvatarStatus.READY)
+        # Исходное изображение не перезаписывается.
+        with Image.open(self.profile.avatar.path) as image:
+            self.assertEqual(image.getpixel((0, 0)), (255, 255, 255))
+
+        # Миниатюры квадратные и сохранены в компактном формате.
+        for size in settings.AVATAR_VARIANT_SIZES:
+            variant_name = get_variant_name(self.profile.avatar.name, size)
+            self.assertTrue(variant_name.endswith('.webp'))
+            with Image.open(self.profile.avatar.storage.path(variant_name)) \
+                    as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(image.size, (size, size))
+                self.assertNotEqual(image.convert('RGB').getpixel((0, 0)),
+                                    (255, 255, 255))
+
+    def test_watermark_cache(self) -> None:
+        """Тест загрузки водяного знака один раз для каждого размера"""
+
+        load_watermark.cache_clear()
+        call_command('process_avatars', workers=0, stdout=StringIO())
+
+        cache_info = load_watermark.cache_info()
+        # Один промах на каждый размер миниатюр.
+        self.assertEqual(cache_info.misses,
+                         len(settings.AVATAR_VARIANT_SIZES))
+
+    def test_process_broken_avatar(self) -> None:
+        """Тест обработки поврежденного изображения"""
+
+        with open(self.profile.avatar.path, 'wb') as image_file:
+            image_file.write(b'not an image')
+
+        call_command('process_avatars', workers=0, stdout=StringIO())
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar_status,
+                         Profile.AvatarStatus.FAILED)
+
+    def test_process_avatar_unexpected_error(self) -> None:
+        """Тест обработки аватара с ошибкой другого типа"""
+
+        with mock.patch('clients.avatars.process_avatar',
+                        side_effect=Image.DecompressionBombError):
+            call_command('process_avatars', workers=0, stdout=StringIO())
+
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.avatar_status,
+                         Profile.AvatarStatus.FAILED)
@@ -1,20 +1,77 @@
-from PIL import Image
-from typing import Tuple
+from functools import lru_cache
+from typing import (
+    Dict,
+    Optional,
+)
 
+from PIL import (
+    Image,
+    ImageOps,
+)
 
-def set_watermark(input_image_path: str,
-                  watermark_image_path: str,
-                  position: Tuple[int, int]) -> None:
+
+# Доля стороны миниатюры, которую занимает водяной знак.
+WATERMARK_RELATIVE_SIZE = 0.25
+
+
+@lru_cache(maxsize=32)
+def load_watermark(watermark_image_path: str,
+                   size: Optional[int] = None) -> Image.Image:
+    """
+    Функция загрузки водяного знака.
+
+    Водяной знак читается с диска и приводится к нужному размеру
+    один раз для каждого процесса, дальше используется кэш.
+    Возвращаемое изображение нельзя изменять.
+
+    :param watermark_image_path: Путь до водяного знака.
+    :param size:
+        Сторона квадрата, в который вписывается водяной знак.
+        Если не передана, водяной знак загружается без изменений.
+    :return: Изображение водяного знака в режиме RGBA.
     """
-    Функция для наложения водяного знака.
+
+    with Image.open(watermark_image_path) as watermark:
+        watermark = watermark.convert('RGBA')
+
+    if size is not None:
+        watermark.thumbnail((size, size), Image.LANCZOS)
+
+    return watermark
+
+
+def render_variants(input_image_path: str,
+                    watermark_image_path: str,
+                    output_paths: Dict[int, str],
+                    image_format: str = 'WEBP',
+                    quality: int = 80) -> None:
+    """
+    Функция создания квадратных миниатюр изображения с водяным знаком.
+
+    Исходное изображение декодируется один раз, а каждая следующая
+    миниатюра получается уменьшением предыдущей, большей по размеру.
 
     :param input_image_path: Путь до исходного изображения.
     :param watermark_image_path: Путь до водяного знака.
-    :param position: Координаты левого верхнего угла вотермарки.
+    :param output_paths: Пути для сохранения миниатюр по их размерам.
+    :param image_format: Формат сохраняемых миниатюр.
+    :param quality: Качество сжатия миниатюр.
     """
 
-    base_image = Image.open(input_image_path)
-    watermark = Image.open(watermark_image_path)
+    with Image.open(input_image_path) as image:
+        # Для JPEG сразу декодируем уменьшенное изображение.
+        largest = max(output_paths)
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    for size in sorted(output_paths, reverse=True):
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
 
-    base_image.paste(watermark, position)
-    base_image.save(input_image_path)
+        variant = image.copy()
+        watermark = load_watermark(
+            str(watermark_image_path),
+            max(int(size * WATERMARK_RELATIVE_SIZE), 1),
+        )
+        variant.paste(watermark, (0, 0), watermark)
+        variant.save(output_paths[size], image_format,
+                     quality=quality, optimize=True)
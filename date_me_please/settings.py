@@ -59,6 +59,27 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Сбор метрик запросов и их вывод в формате Prometheus по /api/metrics/.
+METRICS_ENABLED = config('METRICS_ENABLED', default=False, cast=bool)
+# Если задан, адрес метрик требует заголовок Authorization: Bearer <токен>.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+if METRICS_ENABLED:
+    # Первым в списке, чтобы учитывать время всех остальных слоев.
+    MIDDLEWARE.insert(0, 'clients.metrics.MetricsMiddleware')
+
+# Профилирование запросов сотрудников по заголовку X-Profile: 1
+# или параметру _profile=1, а также случайной доли всех запросов.
+PROFILING_ENABLED = config('PROFILING_ENABLED', default=False, cast=bool)
+# Каталог для статистики вызовов и запросов к БД.
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+# Доля запросов, которые профилируются без явного запроса.
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+
+if PROFILING_ENABLED:
+    # Последним в списке, чтобы в профиль попадала обработка контроллером.
+    MIDDLEWARE.append('clients.profiling.ProfilingMiddleware')
+
 ROOT_URLCONF = 'date_me_please.urls'
 
 TEMPLATES = [
@@ -94,6 +115,52 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+#
+# По умолчанию используется кэш в памяти процесса, который вытесняет
+# давно не использованные записи. Он подходит только для разработки:
+# в рабочем окружении (несколько процессов сервера и фоновые команды)
+# необходимо указать общий кэш (например, Redis или Memcached), иначе
+# сброс кэша в одном процессе не будет виден в остальных. Проверка
+# manage.py check --deploy предупреждает о кэше в памяти процесса.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='date-me-please'),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    }
+}
+
+# Время жизни закэшированных списков пользователей в секундах.
+USER_LIST_CACHE_TIMEOUT = config('USER_LIST_CACHE_TIMEOUT', default=60, cast=int)
+# Потоковая выдача списка пользователей (?stream=true). Под ASGI
+# Django 4.0 читает потоковый ответ в цикле событий, где запросы к БД
+# запрещены, поэтому там потоковая выдача не поддерживается и отключается.
+USER_LIST_STREAMING_ENABLED = config('USER_LIST_STREAMING_ENABLED', default=True, cast=bool)
+# Время жизни закэшированного пользователя, найденного по JWT-токену.
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=30, cast=int)
+
+# Движок поиска пользователей по расстоянию:
+# 'sql' - расстояния считаются в СУБД,
+# 'numpy' - в памяти процесса по снимку координат (нужен пакет numpy).
+GEO_ENGINE = config('GEO_ENGINE', default='sql')
+# Интервал в секундах между проверками актуальности снимка координат.
+GEO_ENGINE_REFRESH_INTERVAL = config('GEO_ENGINE_REFRESH_INTERVAL', default=30, cast=int)
+# Если найдено больше профилей, поиск выполняется в СУБД.
+GEO_ENGINE_MAX_IDS = config('GEO_ENGINE_MAX_IDS', default=5000, cast=int)
+
+# Количество неоцененных записей, до которого пополняется лента рекомендаций.
+FEED_SIZE = config('FEED_SIZE', default=100, cast=int)
+# Лента пополняется, когда в ней остается меньше записей.
+FEED_REFILL_THRESHOLD = config('FEED_REFILL_THRESHOLD', default=30, cast=int)
+# Максимальное расстояние в км до профилей в ленте.
+FEED_MAX_DISTANCE = config('FEED_MAX_DISTANCE', default=100, cast=float)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -136,6 +203,14 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Водяной знак, накладываемый на аватары пользователей.
+AVATAR_WATERMARK_PATH = STATIC_ROOT / 'clients/img/watermark.png'
+# Размеры квадратных миниатюр аватаров в пикселях.
+AVATAR_VARIANT_SIZES = (64, 256, 1024)
+# Формат и качество сжатия миниатюр аватаров.
+AVATAR_VARIANT_FORMAT = 'WEBP'
+AVATAR_VARIANT_QUALITY = 80
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -147,9 +222,22 @@ EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 EMAIL_PORT = 587
-EMAIL_USER_TLS = True
+EMAIL_USE_TLS = True
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Настройка очереди писем о взаимной симпатии.
+# Максимальное количество попыток отправки письма.
+MATCH_NOTIFICATION_MAX_ATTEMPTS = config('MATCH_NOTIFICATION_MAX_ATTEMPTS',
+                                         default=5, cast=int)
+# Задержка в секундах перед первой повторной попыткой.
+# Каждая следующая задержка вдвое больше предыдущей.
+MATCH_NOTIFICATION_RETRY_DELAY = config('MATCH_NOTIFICATION_RETRY_DELAY',
+                                        default=60, cast=int)
+# Время в секундах, на которое обработчик очереди захватывает письма.
+# Если он не успеет их отправить, письма возьмет другой обработчик.
+MATCH_NOTIFICATION_LEASE_TIMEOUT = config('MATCH_NOTIFICATION_LEASE_TIMEOUT',
+                                          default=300, cast=int)
+
 
 LOGIN_URL = 'rest_framework:login'
 LOGOUT_URL = 'rest_framework:logout'
@@ -159,14 +247,20 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         # Вход на основе сессий для swagger'a и панели DRF.
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Пользователь загружается вместе с профилем и кэшируется.
+        'api.clients.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
+    # Размер страницы по умолчанию для постраничных списков.
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=20, cast=int),
 }
 
+# Размер страницы задан глобально, а класс пагинации - в контроллерах.
+SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
+
 # Настройки подсистемы аутентификации на основе JWT.
 SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=30),